@@ -3,6 +3,11 @@
 Function align is used by DataView, to expand and re-arrange data in a DataFrame
 according to their available time, which is stored in another DataFrame.
 
+align / align2 use a vectorized as-of engine: announcement dates of all securities are
+sorted once and every (trade date, security) pair is resolved by a single searchsorted call.
+The original per-date implementations are kept as align_loop / align2_loop for reference and
+benchmark purpose, both versions return exactly the same result.
+
 """
 from __future__ import print_function
 import numpy as np
@@ -10,10 +15,54 @@ import pandas as pd
 from jaqs.util import is_numeric
 
 
+# announcement date used for cells where no quarterly data is available
+_NO_ANN_DATE = 99999999
+
+
 def _get_neareast(df_ann, df_value, date):
     """
     Get the value whose ann_date is earlier and nearest to date.
-    
+
+    Parameters
+    ----------
+    df_ann : np.ndarray
+        announcement dates. shape = (n_quarters, n_securities)
+    df_value : np.ndarray
+        announcement values. shape = (n_quarters, n_securities)
+    date : np.ndarray
+        shape = (1,)
+
+    Returns
+    -------
+    res : np.array
+        The value whose ann_date is earlier and nearest to date. shape (n_securities)
+
+    """
+    """
+    df_ann.fillna(99999999, inplace=True)  # IMPORTANT: At cells where no quarterly data is available,
+                                           # we know nothing, thus it will be filled nan in the next step
+    """
+    if is_numeric(df_value):
+        df_value = df_value.astype(float)
+    mask = date[0] >= df_ann
+    # res = np.where(mask, df_value, np.nan)
+    n = df_value.shape[1]
+    res = np.empty(n, dtype=df_value.dtype)
+
+    # for each column, get the last True value
+    for i in range(n):
+        v = df_value[:, i]
+        m = mask[:, i]
+        r = v[m]
+        res[i] = r[-1] if len(r) else np.nan
+
+    return res
+
+
+def _get_neareast2(df_ann, df_value, date):
+    """
+    Get the value whose ann_date is earlier and nearest to date.
+
     Parameters
     ----------
     df_ann : np.ndarray
@@ -39,21 +88,100 @@ def _get_neareast(df_ann, df_value, date):
     # res = np.where(mask, df_value, np.nan)
     n = df_value.shape[1]
     res = np.empty(n, dtype=df_value.dtype)
-    
+
+    newest_idx=0
     # for each column, get the last True value
     for i in range(n):
         v = df_value[:, i]
         m = mask[:, i]
         r = v[m]
+        r_max_idx = len(mask[:, i])-mask[:, i][::-1].argmax()-1
         res[i] = r[-1] if len(r) else np.nan
-    
+        if r_max_idx<newest_idx:
+            res[i] = np.nan
+        else:
+            newest_idx=r_max_idx
+
     return res
-    
+
+
+def _asof_index(ann, date_arr):
+    """
+    For every (date, security) pair, find the row of the last report already announced.
+
+    Parameters
+    ----------
+    ann : np.ndarray
+        announcement dates, NaN filled with _NO_ANN_DATE. shape = (n_quarters, n_securities), dtype = int
+    date_arr : np.ndarray
+        Target dates. shape = (n_days,), dtype = int
+
+    Returns
+    -------
+    idx : np.ndarray
+        shape = (n_days, n_securities), dtype = int
+        Largest row number i with ann[i, j] <= date. -1 if no report is available.
+
+    Notes
+    -----
+    Rows are ordered by report date, which is not necessarily the order of announcement dates
+    (a report may be revised and announced again later). Therefore we sort announcement dates of
+    each security, keep the running maximum of row number along the sorted order, and look up
+    every date with searchsorted. All securities are handled at once by shifting the announcement
+    dates of column j by j * offset, which keeps columns apart in one sorted key array.
+
+    """
+    n_rows, n_cols = ann.shape
+    n_dates = len(date_arr)
+    if n_rows == 0 or n_cols == 0 or n_dates == 0:
+        return np.full((n_dates, n_cols), -1, dtype=np.int64)
+
+    ann = ann.astype(np.int64)
+    date_arr = date_arr.astype(np.int64)
+    lower = min(ann.min(), date_arr.min())
+    offset = max(ann.max(), date_arr.max()) - lower + 1
+
+    # sort rows of each column by announcement date, ties keep the original (report date) order
+    order = np.argsort(ann, axis=0, kind='mergesort')
+    ann_sorted = np.take_along_axis(ann, order, axis=0)
+    latest_row = np.maximum.accumulate(order, axis=0)
+
+    col_shift = np.arange(n_cols, dtype=np.int64) * offset
+    keys = (ann_sorted - lower + col_shift).T.ravel()
+    queries = (date_arr.reshape(-1, 1) - lower) + col_shift
+
+    # number of reports of column j that have been announced on each date
+    count = np.searchsorted(keys, queries, side='right') - np.arange(n_cols) * n_rows
+
+    latest_row_flat = np.concatenate([[-1], latest_row.T.ravel()])
+    pos = np.where(count > 0, np.arange(n_cols) * n_rows + count, 0)
+    return latest_row_flat[pos]
+
+
+def _take_value(value, idx):
+    """Pick value[idx[d, j], j], use NaN where idx is -1. dtype follows _get_neareast."""
+    if is_numeric(value):
+        value = value.astype(float)
+
+    if value.shape[0] == 0:
+        res = np.empty(idx.shape, dtype=value.dtype)
+        res[:] = np.nan
+        return res
+
+    col = np.arange(idx.shape[1])
+    res = value[np.maximum(idx, 0), col]
+    res[idx < 0] = np.nan
+    return res
+
+
+def _prepare_ann(df_ann):
+    return df_ann.fillna(_NO_ANN_DATE).astype(int).values
+
 
 def align(df_value, df_ann, date_arr):
     """
     Expand low frequency DataFrame df_value to frequency of data_arr using announcement date from df_ann.
-    
+
     Parameters
     ----------
     df_ann : pd.DataFrame
@@ -69,21 +197,21 @@ def align(df_value, df_ann, date_arr):
         Expanded DataFrame. shape = (n_days, n_securities)
 
     """
-    df_ann = df_ann.fillna(99999999).astype(int)
-    
     date_arr = np.asarray(date_arr, dtype=int)
-    
-    res = np.apply_along_axis(lambda date: _get_neareast(df_ann.values, df_value.values, date), 1, date_arr.reshape(-1, 1))
+
+    idx = _asof_index(_prepare_ann(df_ann), date_arr)
+    res = _take_value(df_value.values, idx)
 
     df_res = pd.DataFrame(index=date_arr, columns=df_value.columns, data=res)
     return df_res
 
 
-
-def align(df_value, df_ann, date_arr):
+def align2(df_value, df_ann, date_arr):
     """
     Expand low frequency DataFrame df_value to frequency of data_arr using announcement date from df_ann.
-    
+    Different from align, on each date, a security whose latest available report is older than
+    that of any security to its left is set to NaN, so that we never go back to an older report.
+
     Parameters
     ----------
     df_ann : pd.DataFrame
@@ -99,65 +227,57 @@ def align(df_value, df_ann, date_arr):
         Expanded DataFrame. shape = (n_days, n_securities)
 
     """
-    df_ann = df_ann.fillna(99999999).astype(int)
-    
     date_arr = np.asarray(date_arr, dtype=int)
-    
-    res = np.apply_along_axis(lambda date: _get_neareast(df_ann.values, df_value.values, date), 1, date_arr.reshape(-1, 1))
+
+    idx = _asof_index(_prepare_ann(df_ann), date_arr)
+    res = _take_value(df_value.values, idx)
+
+    if idx.shape[1] > 0:
+        # row number of the latest report, as in _get_neareast2 the last row is used if nothing is available.
+        newest = np.where(idx < 0, len(df_ann) - 1, idx)
+        newest_left = np.maximum.accumulate(newest, axis=1)
+        newest_left = np.concatenate([np.zeros((newest.shape[0], 1), dtype=newest.dtype),
+                                      newest_left[:, :-1]], axis=1)
+        res[newest < newest_left] = np.nan
 
     df_res = pd.DataFrame(index=date_arr, columns=df_value.columns, data=res)
     return df_res
 
 
-def _get_neareast2(df_ann, df_value, date):
+def align_loop(df_value, df_ann, date_arr):
     """
-    Get the value whose ann_date is earlier and nearest to date.
+    Original implementation of align, which loops over every date and every security.
+    Only for validation and benchmark, use align instead.
 
     Parameters
     ----------
-    df_ann : np.ndarray
-        announcement dates. shape = (n_quarters, n_securities)
-    df_value : np.ndarray
-        announcement values. shape = (n_quarters, n_securities)
-    date : np.ndarray
-        shape = (1,)
+    df_ann : pd.DataFrame
+        DataFrame of announcement dates. shape = (n_quarters, n_securities)
+    df_value : pd.DataFrame
+        DataFrame of announcement values. shape = (n_quarters, n_securities)
+    date_arr : list or np.array
+        Target date array. dtype = int
 
     Returns
     -------
-    res : np.array
-        The value whose ann_date is earlier and nearest to date. shape (n_securities)
+    df_res : pd.DataFrame
+        Expanded DataFrame. shape = (n_days, n_securities)
 
     """
-    """
-    df_ann.fillna(99999999, inplace=True)  # IMPORTANT: At cells where no quarterly data is available,
-                                           # we know nothing, thus it will be filled nan in the next step
-    """
-    if is_numeric(df_value):
-        df_value = df_value.astype(float)
-    mask = date[0] >= df_ann
-    # res = np.where(mask, df_value, np.nan)
-    n = df_value.shape[1]
-    res = np.empty(n, dtype=df_value.dtype)
+    df_ann = df_ann.fillna(_NO_ANN_DATE).astype(int)
 
-    newest_idx=0
-    # for each column, get the last True value
-    for i in range(n):
-        v = df_value[:, i]
-        m = mask[:, i]
-        r = v[m]
-        r_max_idx = len(mask[:, i])-mask[:, i][::-1].argmax()-1
-        res[i] = r[-1] if len(r) else np.nan
-        if r_max_idx<newest_idx:
-            res[i] = np.nan
-        else:
-            newest_idx=r_max_idx
+    date_arr = np.asarray(date_arr, dtype=int)
 
-    return res
+    res = np.apply_along_axis(lambda date: _get_neareast(df_ann.values, df_value.values, date), 1, date_arr.reshape(-1, 1))
+
+    df_res = pd.DataFrame(index=date_arr, columns=df_value.columns, data=res)
+    return df_res
 
 
-def align2(df_value, df_ann, date_arr):
+def align2_loop(df_value, df_ann, date_arr):
     """
-    Expand low frequency DataFrame df_value to frequency of data_arr using announcement date from df_ann.
+    Original implementation of align2, which loops over every date and every security.
+    Only for validation and benchmark, use align2 instead.
 
     Parameters
     ----------
@@ -174,7 +294,7 @@ def align2(df_value, df_ann, date_arr):
         Expanded DataFrame. shape = (n_days, n_securities)
 
     """
-    df_ann = df_ann.fillna(99999999).astype(int)
+    df_ann = df_ann.fillna(_NO_ANN_DATE).astype(int)
 
     date_arr = np.asarray(date_arr, dtype=int)
 
@@ -0,0 +1,175 @@
+# encoding: utf-8
+"""
+Sources of intraday bars for event-driven backtest, loaded one trade date at a time.
+
+BarSource is the interface: query_trade_dates gives the dates to replay and get_bars
+gives bars of all symbols on one trade date. BarPrefetcher loads the next trade dates
+in a background thread while the current one is being simulated.
+
+"""
+from __future__ import print_function
+
+import abc
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import six
+import numpy as np
+
+
+class BarSource(six.with_metaclass(abc.ABCMeta)):
+    """
+    Provide bars of a list of symbols for each trade date.
+
+    Attributes
+    ----------
+    freq : str
+        {'1M', '5M', '15M'}
+
+    """
+    def __init__(self, freq='1M'):
+        self.freq = freq
+
+    @abc.abstractmethod
+    def query_trade_dates(self, start_date, end_date):
+        """
+        Returns
+        -------
+        np.ndarray
+            Trade dates within [start_date, end_date], dtype = int
+
+        """
+        pass
+
+    @abc.abstractmethod
+    def get_bars(self, symbols, trade_date):
+        """
+        Parameters
+        ----------
+        symbols : str
+            Separated by ','.
+        trade_date : int
+
+        Returns
+        -------
+        pd.DataFrame or None
+            Each row is a bar, columns include symbol, date, time, open, high, low, close, volume.
+
+        """
+        pass
+
+
+class DataViewBarSource(BarSource):
+    """Bars stored in a DataView."""
+    def __init__(self, dataview, freq='1M'):
+        super(DataViewBarSource, self).__init__(freq)
+        self.dataview = dataview
+
+    def query_trade_dates(self, start_date, end_date):
+        dates = np.asarray(self.dataview.dates)
+        return dates[(dates >= start_date) & (dates <= end_date)]
+
+    def get_bars(self, symbols, trade_date):
+        return self.dataview.get(symbol=symbols, start_date=trade_date, end_date=trade_date,
+                                 fields='open,high,low,close,volume,oi,trade_date,date,time',
+                                 data_format='long')
+
+
+class DataApiBarSource(BarSource):
+    """Bars queried from data server using RemoteDataService.bar."""
+    def __init__(self, data_api, freq='1M'):
+        super(DataApiBarSource, self).__init__(freq)
+        self.data_api = data_api
+
+    def query_trade_dates(self, start_date, end_date):
+        return self.data_api.query_trade_dates(start_date, end_date)
+
+    def get_bars(self, symbols, trade_date):
+        df, _ = self.data_api.bar(symbol=symbols, start_time=200000, end_time=160000, trade_date=trade_date,
+                                  freq=self.freq)
+        return df
+
+
+class BarStoreBarSource(BarSource):
+    """Bars read from a local BarStore, for backtest without connection to data server."""
+    def __init__(self, bar_store, freq='1M'):
+        super(BarStoreBarSource, self).__init__(freq)
+        self.bar_store = bar_store
+
+    def query_trade_dates(self, start_date, end_date):
+        return self.bar_store.query_trade_dates(start_date, end_date, freq=self.freq)
+
+    def get_bars(self, symbols, trade_date):
+        return self.bar_store.get(symbols, trade_date, freq=self.freq)
+
+
+class BarPrefetcher(object):
+    """
+    Iterate over (trade_date, bars) of trade dates, bars of the next n_ahead dates
+    are loaded in a background thread.
+
+    Parameters
+    ----------
+    load_func : callable
+        load_func(trade_date) returns bars of that date.
+    trade_dates : list of int
+    n_ahead : int
+        Number of dates loaded in advance. 0 for loading in the calling thread when a date is reached.
+
+    """
+    _DONE = object()
+
+    def __init__(self, load_func, trade_dates, n_ahead=1):
+        self.load_func = load_func
+        self.trade_dates = list(trade_dates)
+        self.n_ahead = n_ahead
+
+    def __iter__(self):
+        if self.n_ahead <= 0:
+            for date in self.trade_dates:
+                yield date, self.load_func(date)
+            return
+
+        buffer = queue.Queue(maxsize=self.n_ahead)
+        stop = threading.Event()
+
+        def put(item):
+            # give up when the consumer stops iterating
+            while not stop.is_set():
+                try:
+                    buffer.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def run():
+            for date in self.trade_dates:
+                try:
+                    item = (date, self.load_func(date), None)
+                except Exception as e:
+                    put((date, None, e))
+                    return
+                if not put(item):
+                    return
+            put(self._DONE)
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        try:
+            while True:
+                item = buffer.get()
+                if item is self._DONE:
+                    break
+                date, bars, error = item
+                if error is not None:
+                    raise error
+                yield date, bars
+        finally:
+            stop.set()
+            thread.join()
@@ -0,0 +1,259 @@
+# encoding: utf-8
+"""
+Local store of intraday data (minute bars, tick quotes).
+
+Data is partitioned by frequency and trade date, each partition is a folder:
+
+    folder/<freq>/<trade_date>/
+        meta.json       symbols, offset of each symbol's first row, column names
+        <column>.npy    one fixed-width array per numeric column (date, time, open, ..., oi)
+
+Rows are sorted by symbol, then in time order. Rows of one symbol are a contiguous range
+of every column, so reading a (symbol, time range) slice is a view of memory-mapped files.
+
+"""
+from __future__ import print_function
+
+import os
+import json
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+import jaqs.util as jutil
+
+
+# atomic on POSIX, also on Windows for Python 3
+_replace = getattr(os, 'replace', os.rename)
+
+
+def _to_int_time(t):
+    """Convert HHMMSS int or 'HH:MM:SS' str to int."""
+    if isinstance(t, str):
+        t = t.replace(':', '')
+    return int(t)
+
+
+def _to_int_date(d):
+    """Convert YYYYmmdd int or 'YYYY-mm-dd' str to int."""
+    if isinstance(d, str):
+        d = d.replace('-', '')
+    return int(d)
+
+
+def _write_atomic(path, write_func):
+    """Write to a temporary file in the same folder, then rename it to path."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write_func(f)
+        _replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def _session_time(time):
+    """Map HHMMSS of a trade date (night session starts at 20:00 of the day before) to increasing values."""
+    time = np.asarray(time)
+    return np.where(time >= 200000, time - 200000, time + 40000)
+
+
+class BarStore(object):
+    """
+    Read and write intraday data of a folder.
+
+    Attributes
+    ----------
+    folder : str
+
+    """
+    META_FILE_NAME = 'meta.json'
+    KEY_COLUMNS = ['symbol', 'code', 'trade_date', 'freq']
+
+    def __init__(self, folder):
+        self.folder = os.path.abspath(folder)
+        self._partitions = dict()
+        self._lock = threading.Lock()
+
+    def _get_partition_path(self, trade_date, freq):
+        return os.path.join(self.folder, freq, str(trade_date))
+
+    def _open(self, trade_date, freq):
+        """Open partition as (meta, dict of memory-mapped arrays), None if not exist."""
+        path = self._get_partition_path(trade_date, freq)
+        with self._lock:
+            if path in self._partitions:
+                return self._partitions[path]
+
+            meta_path = os.path.join(path, self.META_FILE_NAME)
+            if not os.path.exists(meta_path):
+                return None
+            meta = jutil.read_json(meta_path)
+            arrays = {col: np.load(os.path.join(path, col + '.npy'), mmap_mode='r') for col in meta['columns']}
+            meta['pos'] = {s: i for i, s in enumerate(meta['symbols'])}
+
+            self._partitions[path] = (meta, arrays)
+            return meta, arrays
+
+    # -----------------------------------------------------------------------------------
+    # Write
+    def write(self, df, trade_date, freq='1M', symbols=None):
+        """
+        Add data of a trade date to store. Data of symbols that are already stored on that date is replaced.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Each row is a bar (or quote), must contain columns symbol, time.
+            All numeric columns are stored, string columns other than symbol are dropped.
+        trade_date : int or str
+        freq : str
+            '1M', '5M', 'tick', etc.
+        symbols : list of str or None
+            Symbols that df contains all data of. Symbols not in df are stored as having no data
+            (e.g. suspended), so that they are not regarded as missing. Default is symbols in df.
+
+        """
+        trade_date = _to_int_date(trade_date)
+        symbols = set(symbols) if symbols is not None else set()
+        if len(df):
+            symbols |= set(df['symbol'])
+
+        old = self._open(trade_date, freq)
+        if old is not None:
+            meta, arrays = old
+            keep = [s for s in meta['symbols'] if s not in symbols]
+            df_old = self._read_frame(meta, arrays, keep, trade_date, freq)
+            df = pd.concat([df_old, df], axis=0, ignore_index=True) if len(df) else df_old
+            symbols |= set(keep)
+
+        if len(df):
+            df = df.assign(session_time=_session_time(df['time'].values))
+            df = df.sort_values(['symbol', 'session_time'], kind='mergesort')
+            columns = [col for col in df.columns
+                       if col not in self.KEY_COLUMNS and col != 'session_time' and df[col].dtype.kind in 'biuf']
+        else:
+            columns = []
+        symbols = sorted(symbols)
+        offsets = np.searchsorted(df['symbol'].values.astype(str) if len(df) else np.array([], dtype=str),
+                                  symbols, side='left')
+
+        path = self._get_partition_path(trade_date, freq)
+        if not os.path.exists(path):
+            os.makedirs(path)
+        # files may be memory-mapped by readers: never write to them in place, replace them with new files
+        # so that mapped arrays keep data of the old version. meta.json is replaced last.
+        meta = {'symbols': symbols, 'offsets': [int(x) for x in offsets] + [len(df)], 'columns': columns}
+        meta_str = json.dumps(meta, separators=(',\n', ': ')).encode('utf-8')
+        with self._lock:
+            self._partitions.pop(path, None)
+            for col in columns:
+                arr = df[col].values
+                arr = arr.astype(np.float64) if arr.dtype.kind == 'f' else arr.astype(np.int64)
+                _write_atomic(os.path.join(path, col + '.npy'), lambda f: np.save(f, arr))
+            _write_atomic(os.path.join(path, self.META_FILE_NAME), lambda f: f.write(meta_str))
+
+    # -----------------------------------------------------------------------------------
+    # Read
+    def query_trade_dates(self, start_date, end_date, freq='1M'):
+        """Trade dates within [start_date, end_date] which have data in store."""
+        path = os.path.join(self.folder, freq)
+        if not os.path.isdir(path):
+            return np.array([], dtype=int)
+        dates = np.array(sorted(int(d) for d in os.listdir(path) if d.isdigit()), dtype=int)
+        return dates[(dates >= start_date) & (dates <= end_date)]
+
+    def missing_symbols(self, symbols, trade_date, freq='1M'):
+        """Symbols that have no data in store on trade_date."""
+        part = self._open(_to_int_date(trade_date), freq)
+        if part is None:
+            return list(symbols)
+        pos = part[0]['pos']
+        return [s for s in symbols if s not in pos]
+
+    def read(self, symbol, trade_date, freq='1M', start_time=200000, end_time=160000):
+        """
+        Read data of a symbol without copy.
+
+        Parameters
+        ----------
+        symbol : str
+        trade_date : int
+        freq : str
+        start_time : int
+        end_time : int
+
+        Returns
+        -------
+        dict or None
+            Key is column name, value is read-only memory-mapped np.ndarray.
+            None if symbol is not stored. Arrays keep their data if the trade date is written again.
+
+        """
+        part = self._open(_to_int_date(trade_date), freq)
+        if part is None or symbol not in part[0]['pos']:
+            return None
+        meta, arrays = part
+        sl = self._get_slice(meta, arrays, symbol, start_time, end_time)
+        return {col: arr[sl] for col, arr in arrays.items()}
+
+    @staticmethod
+    def _get_slice(meta, arrays, symbol, start_time, end_time):
+        i = meta['pos'][symbol]
+        start, end = meta['offsets'][i], meta['offsets'][i + 1]
+        if start == end:
+            return slice(start, end)
+        session_time = _session_time(arrays['time'][start: end])
+        lo, hi = _session_time([_to_int_time(start_time), _to_int_time(end_time)])
+        return slice(start + np.searchsorted(session_time, lo, side='left'),
+                     start + np.searchsorted(session_time, hi, side='right'))
+
+    def _read_frame(self, meta, arrays, symbols, trade_date, freq, start_time=200000, end_time=160000, fields=None):
+        symbols = [s for s in symbols if s in meta['pos']]
+        slices = [self._get_slice(meta, arrays, s, start_time, end_time) for s in symbols]
+        lengths = [sl.stop - sl.start for sl in slices]
+
+        columns = meta['columns'] if fields is None else [col for col in meta['columns'] if col in fields]
+        dic = dict()
+        symbol_col = np.repeat(np.array(symbols, dtype=object), lengths)
+        dic['symbol'] = symbol_col
+        dic['code'] = np.array([s.split('.')[0] for s in symbol_col], dtype=object)
+        dic['trade_date'] = np.full(len(symbol_col), trade_date, dtype=np.int64)
+        dic['freq'] = np.full(len(symbol_col), freq, dtype=object)
+        for col in columns:
+            arr = arrays[col]
+            dic[col] = np.concatenate([arr[sl] for sl in slices]) if slices else arr[:0].copy()
+        return pd.DataFrame(dic, columns=self.KEY_COLUMNS + columns)
+
+    def get(self, symbol, trade_date, freq='1M', start_time=200000, end_time=160000, fields=""):
+        """
+        Read data of several symbols on a trade date into a DataFrame.
+
+        Parameters
+        ----------
+        symbol : str
+            Separated by ','.
+        trade_date : int or str
+        freq : str
+        start_time : int or str
+        end_time : int or str
+        fields : str
+            Separated by ',', default "" (all stored columns).
+
+        Returns
+        -------
+        pd.DataFrame
+            Same format as RemoteDataService.bar. Stored symbols only.
+
+        """
+        trade_date = _to_int_date(trade_date)
+        part = self._open(trade_date, freq)
+        fields = [f for f in fields.split(',') if f] + ['date', 'time'] if fields else None
+        if part is None:
+            return pd.DataFrame(columns=self.KEY_COLUMNS)
+        meta, arrays = part
+        return self._read_frame(meta, arrays, symbol.split(','), trade_date, freq,
+                                start_time=start_time, end_time=end_time, fields=fields)
@@ -8,6 +8,7 @@ Basic data types:
 - `InstManager`: InstManager query information of instruments from data server and store them.
 - `Bar`: A Bar is a summary of information of price and volume during a certain length of time span.
 - `Quote`: Quote represents a snapshot of price and volume information.
+- `SlotQuote`: Quote stored in a list, updated in place by QuoteDecoder.
 - `Order`: Basic order class.
 - `OrderStatusInd`: OrderStatusInd is a indication of status change of an order.
 - `Task`: Task is a high-level trading target, which may contain many orders.
@@ -2,9 +2,13 @@
 """
 Classes defined in marketdata module represent different market data, including:
 - Bar
+- BarView
+- BarReplay
 - Quote
+- SlotQuote
 
 """
+import numpy as np
 
 
 class Bar(object):
@@ -101,6 +105,101 @@ class Bar(object):
         return self.__repr__()
 
 
+class BarView(Bar):
+    """
+    A Bar which reads its attributes from one row of column arrays when they are accessed.
+    
+    Attributes are all columns of the source, e.g. symbol, open, close, volume, trade_date, time.
+    Attributes of Bar which are not columns of the source (e.g. vwap, oi) have default values of Bar.
+    Assigning an attribute only changes this bar, not the source.
+    
+    """
+    def __init__(self, columns, row):
+        self._columns = columns
+        self._row = row
+    
+    def __getattr__(self, name):
+        # only called when name is not set on the bar itself
+        if name in ('_columns', '_row'):
+            raise AttributeError(name)
+        try:
+            return self._columns[name][self._row]
+        except KeyError:
+            pass
+        try:
+            return _BAR_DEFAULTS[name]
+        except KeyError:
+            raise AttributeError("Bar has no attribute [{}]".format(name))
+    
+    def has_column(self, name):
+        """Whether name is a column of the source, rather than a default value of Bar."""
+        return name in self._columns
+    
+    def to_dict(self):
+        return {k: v[self._row] for k, v in self._columns.items()}
+
+
+# attributes of a new Bar, used by BarView for columns that the source does not have
+_BAR_DEFAULTS = Bar().__dict__
+
+
+class BarReplay(object):
+    """
+    Bars of many symbols stored as column arrays, sorted and grouped by timestamp.
+    
+    Iterating over a BarReplay yields (timestamp, dict of BarView) for each timestamp in order.
+    Bars of a timestamp are only created when that timestamp is reached.
+    
+    Attributes
+    ----------
+    timestamps : list
+        Values of the last key column of each group, e.g. trade date for daily bars, time for minute bars.
+    
+    """
+    def __init__(self, df, keys=('trade_date', )):
+        """
+        
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Each row is a bar, must contain column symbol and keys.
+        keys : tuple of str
+            Columns whose values identify a timestamp, bars are sorted by keys.
+
+        """
+        keys = list(keys)
+        if len(df):
+            df = df.sort_values(keys + ['symbol'], kind='mergesort')
+        self._columns = {col: df[col].values for col in df.columns}
+        
+        n = len(df)
+        change = np.zeros(n, dtype=bool)
+        if n:
+            change[0] = True
+            for key in keys:
+                arr = self._columns[key]
+                change[1:] |= arr[1:] != arr[:-1]
+        self._starts = np.flatnonzero(change)
+        self._ends = np.append(self._starts[1:], n)
+        
+        last_key = self._columns[keys[-1]] if n else np.array([])
+        self.timestamps = list(last_key[self._starts])
+    
+    def __len__(self):
+        return len(self._starts)
+    
+    def __getitem__(self, i):
+        """Return (timestamp, dict of BarView) of the i-th timestamp."""
+        start, end = self._starts[i], self._ends[i]
+        symbols = self._columns['symbol']
+        dic = {symbols[row]: BarView(self._columns, row) for row in range(start, end)}
+        return self.timestamps[i], dic
+    
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
 class Quote(object):
     """
     Quote represents a snapshot of price and volume information.
@@ -201,3 +300,56 @@ class Quote(object):
     def __str__(self):
         return self.__repr__()
 
+
+def _make_quote_defaults():
+    defaults = [('symbol', ''), ('code', ''), ('trade_date', 0), ('date', 0), ('time', 0),
+                ('open', 0.), ('close', 0.), ('high', 0.), ('low', 0.), ('vwap', 0.), ('settle', 0.),
+                ('volume', 0), ('turnover', 0), ('oi', 0), ('preclose', 0.), ('presettle', 0.), ('preoi', 0),
+                ('last', 0.)]
+    for name in ['bidprice', 'askprice', 'bidvolume', 'askvolume']:
+        defaults.extend([('{}{:d}'.format(name, i), 0.) for i in range(1, 6)])
+    defaults.extend([('limit_up', 0.), ('limit_down', 0.)])
+    return defaults
+
+
+class SlotQuote(list):
+    """
+    Quote which is a list of values in the order of the schema of a live subscription,
+    so that a quote message is stored by one slice assignment instead of setting its
+    fields one by one.
+    
+    Classes for a schema are created by QuoteDecoder.get_quote_class, where fields of the schema
+    are properties reading items of the list. Other fields of Quote are 0. Fields sent by server
+    that are not in the schema are kept in extra.
+    
+    Attributes
+    ----------
+    extra : dict
+    
+    """
+    __slots__ = ('extra',)
+    FIELDS = ()
+    
+    def __init__(self, values=()):
+        super(SlotQuote, self).__init__(values)
+        self.extra = {}
+    
+    def copy(self):
+        quote = self.__class__(self)
+        quote.extra = dict(self.extra)
+        return quote
+    
+    def to_dict(self):
+        dic = dict(zip(self.FIELDS, self))
+        dic.update(self.extra)
+        return dic
+    
+    def __repr__(self):
+        return Quote.__dict__['__repr__'](self)
+    
+    def __str__(self):
+        return self.__repr__()
+
+
+for _name, _value in _make_quote_defaults():
+    setattr(SlotQuote, _name, _value)
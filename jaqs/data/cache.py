@@ -0,0 +1,258 @@
+# encoding: utf-8
+"""
+Local cache of query results of RemoteDataService.
+
+Results of one query API with the same parameters (fields, adjust mode, etc.) are stored in one
+Pickle file, together with which date ranges of which symbols have been fetched. A later query
+only asks the server for the date ranges / symbols that are missing or no longer fresh.
+
+Data of the last `refresh_days` calendar days before the day it was fetched may still change
+(e.g. bars of today, revised indicators), so it is not trusted on later days and fetched again.
+In offline mode the server is never queried and everything ever fetched is used.
+
+"""
+from __future__ import print_function
+
+import os
+import datetime
+import hashlib
+import threading
+
+import numpy as np
+import pandas as pd
+
+import jaqs.util as jutil
+from jaqs.data.dataservice import QueryDataError
+
+
+def _shift_days(date, n):
+    dt = jutil.convert_int_to_datetime(date) + pd.Timedelta(days=n)
+    return jutil.convert_datetime_to_int(dt)
+
+
+def _to_dates(ser):
+    """Dates as float, missing dates (e.g. ann_date not announced yet) are NaN instead of garbage integers."""
+    return pd.to_numeric(ser, errors='coerce').values.astype(np.float64)
+
+
+def _is_success(err_msg):
+    splited = err_msg.split(',')
+    return bool(splited) and splited[0] == '0'
+
+
+class QueryCache(object):
+    """
+    Cache of query results, stored in folder.
+
+    Attributes
+    ----------
+    folder : str
+    refresh_days : int
+        Data of dates within refresh_days before the day it was fetched is fetched again
+        on a later day. Results of queries without date range expire refresh_days after fetched.
+    offline : bool
+        If True, never query the server, raise QueryDataError if data is not cached.
+
+    """
+    ALL_DATES = (0, 99999999)
+
+    def __init__(self, folder, refresh_days=3, offline=False):
+        self.folder = folder
+        self.refresh_days = refresh_days
+        self.offline = offline
+        self.today = None
+
+        self._entries = dict()
+        self._lock = threading.RLock()
+
+    def _get_today(self):
+        if self.today is not None:
+            return self.today
+        return jutil.convert_datetime_to_int(datetime.date.today())
+
+    def _get_path(self, api, params):
+        key = repr(sorted((k, str(v)) for k, v in params.items())).encode('utf-8')
+        return os.path.join(self.folder, api, hashlib.md5(key).hexdigest() + '.pkl')
+
+    def _get_entry(self, path):
+        entry = self._entries.get(path, None)
+        if entry is None:
+            entry = jutil.load_pickle(path)
+            if entry is None:
+                entry = {'df': None, 'coverage': dict()}
+            self._entries[path] = entry
+        return entry
+
+    def clear(self):
+        """Remove all cached results from memory. Files are kept."""
+        with self._lock:
+            self._entries = dict()
+
+    # -----------------------------------------------------------------------------------
+    # Coverage
+    def _valid_ranges(self, records, today):
+        """Date ranges of records which can be trusted today, sorted and merged."""
+        ranges = []
+        for start, end, fetched_on in records:
+            if self.offline or fetched_on >= today:
+                valid_end = end
+            else:
+                valid_end = min(end, _shift_days(fetched_on, -self.refresh_days))
+            if valid_end >= start:
+                ranges.append((start, valid_end))
+        ranges.sort()
+
+        merged = []
+        for start, end in ranges:
+            if merged and start <= _shift_days(merged[-1][1], 1):
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    def _missing_ranges(self, records, start_date, end_date, today, dated):
+        """Date ranges within [start_date, end_date] which have to be fetched."""
+        if not dated:
+            fresh = [fetched_on for _, _, fetched_on in records
+                     if self.offline or _shift_days(fetched_on, self.refresh_days) >= today]
+            return () if fresh else (self.ALL_DATES, )
+
+        res = []
+        pos = start_date
+        for start, end in self._valid_ranges(records, today):
+            if end < pos or start > end_date:
+                continue
+            if start > pos:
+                res.append((pos, _shift_days(start, -1)))
+            pos = _shift_days(end, 1)
+            if pos > end_date:
+                break
+        if pos <= end_date:
+            res.append((pos, end_date))
+        return tuple(res)
+
+    @staticmethod
+    def _add_record(records, start_date, end_date, today):
+        """Add a fetched range, remove records which are completely replaced."""
+        records = [(s, e, f) for s, e, f in records if not (s >= start_date and e <= end_date)]
+        records.append((start_date, end_date, today))
+        return records
+
+    # -----------------------------------------------------------------------------------
+    # Query
+    def query(self, api, fetch, symbol, start_date=None, end_date=None, date_col=None, symbol_col='symbol',
+              params=None):
+        """
+        Query data, only fetch what is not in cache.
+
+        Parameters
+        ----------
+        api : str
+            Name of the query, also the name of sub-folder of its files.
+        fetch : callable
+            Query the server. Called as fetch(symbol, start_date, end_date) if date_col is not None,
+            else fetch(symbol). Return (df, err_msg), df must have symbol_col (and date_col) columns.
+        symbol : str
+            Separated by ','.
+        start_date : int or None
+        end_date : int or None
+        date_col : str or None
+            Column of date which start_date and end_date apply to. None for queries without date range.
+        symbol_col : str
+        params : dict or None
+            Other parameters of the query. Results of different params are stored separately.
+
+        Returns
+        -------
+        df : pd.DataFrame
+        err_msg : str
+
+        """
+        dated = date_col is not None
+        if not dated:
+            start_date, end_date = self.ALL_DATES
+        start_date, end_date = int(start_date), int(end_date)
+        symbols = list(pd.unique(np.array(symbol.split(','))))
+        today = self._get_today()
+
+        path = self._get_path(api, params or dict())
+        with self._lock:
+            entry = self._get_entry(path)
+            groups = dict()
+            for sec in symbols:
+                missing = self._missing_ranges(entry['coverage'].get(sec, []), start_date, end_date, today, dated)
+                if missing:
+                    groups.setdefault(missing, []).append(sec)
+
+        if groups and self.offline:
+            missing_symbols = sorted(sec for l in groups.values() for sec in l)
+            raise QueryDataError("{} of {} in [{}, {}] is not cached, can not query offline.".format(
+                                 api, ','.join(missing_symbols[:5]), start_date, end_date))
+
+        # all fetched chunks are merged into the cached frame and saved once, also when a fetch fails
+        chunks = []
+        try:
+            for missing, group in groups.items():
+                for start, end in missing:
+                    if dated:
+                        df, err_msg = fetch(','.join(group), start, end)
+                    else:
+                        df, err_msg = fetch(','.join(group))
+                    if not _is_success(err_msg):
+                        raise QueryDataError(err_msg)
+                    chunks.append((df, group, start, end))
+        finally:
+            if chunks:
+                with self._lock:
+                    self._merge(entry, chunks, today, date_col, symbol_col)
+                    jutil.save_pickle(entry, path)
+
+        with self._lock:
+            df = entry['df']
+            if df is None:
+                return pd.DataFrame(), '0,'
+            mask = df[symbol_col].isin(symbols).values
+            if dated:
+                dates = _to_dates(df[date_col])
+                mask &= (dates >= start_date) & (dates <= end_date)
+            res = df.loc[mask].reset_index(drop=True)
+        return res, '0,'
+
+    def _merge(self, entry, chunks, today, date_col, symbol_col):
+        """
+        Replace cached rows with fetched data.
+
+        Parameters
+        ----------
+        chunks : list of tuple
+            (df, symbols, start_date, end_date), df replaces rows of symbols in [start_date, end_date].
+
+        """
+        old = entry['df']
+        mask = np.zeros(0 if old is None else len(old), dtype=bool)
+        if len(mask):
+            old_symbols = old[symbol_col]
+            old_dates = _to_dates(old[date_col]) if date_col is not None else None
+
+        dfs = []
+        coverage = entry['coverage']
+        for df, symbols, start_date, end_date in chunks:
+            if len(mask):
+                mask_chunk = old_symbols.isin(symbols).values
+                if date_col is not None:
+                    mask_chunk &= (old_dates >= start_date) & (old_dates <= end_date)
+                mask |= mask_chunk
+            if len(df):
+                if date_col is not None:
+                    # rows without date can not be returned by any query of a date range
+                    df = df.loc[~np.isnan(_to_dates(df[date_col]))]
+                dfs.append(df)
+            for sec in symbols:
+                coverage[sec] = self._add_record(coverage.get(sec, []), start_date, end_date, today)
+
+        if old is not None and len(old):
+            dfs.insert(0, old.loc[~mask])
+        if dfs:
+            entry['df'] = pd.concat(dfs, axis=0, ignore_index=True)
+        elif old is not None:
+            entry['df'] = old.iloc[:0]
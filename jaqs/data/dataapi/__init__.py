@@ -8,6 +8,13 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import sys
+
 from .data_api import DataApi
 
 __all__ = ['DataApi']
+
+# asyncio clients need Python 3.5+
+if sys.version_info >= (3, 5):
+    from .async_data_api import AsyncDataApi
+    __all__.append('AsyncDataApi')
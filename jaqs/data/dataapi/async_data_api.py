@@ -0,0 +1,294 @@
+# encoding: utf-8
+"""
+DataApi for asyncio programs (Python 3.5+).
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import asyncio
+
+import numpy as np
+
+from . import utils
+from .data_api import _str2bytes, _to_int
+from .jrpc_asyncio import AsyncJRpcClient
+from .quote_decoder import QuoteDecoder
+
+
+class AsyncDataApi(object):
+    """
+    Same queries as DataApi, as coroutines returning (result, msg). Quotes of subscribed
+    symbols are read from an async iterator instead of a callback.
+
+    The connection is opened by login, which must be awaited in the event loop that runs
+    all other calls. After a reconnection, login and subscription are done again.
+
+    Examples
+    --------
+    api = AsyncDataApi("tcp://data.tushare.org:8910")
+    await api.login(username, password)
+    df, msg = await api.daily("600030.SH", start_date=20170103, end_date=20170708)
+    await api.subscribe("600030.SH,000002.SZ")
+    async for quote in api.quotes():
+        print(quote['symbol'], quote['last'])
+
+    """
+    def __init__(self, addr="tcp://data.tushare.org:8910"):
+        self._addr = addr
+        self._remote = AsyncJRpcClient()
+        self._remote.on_connected = self._on_connected
+        self._remote.on_rpc_callback = self._on_rpc_callback
+
+        self._loggined = False
+        self._username = ""
+        self._password = ""
+        self._data_format = "default"
+        self._schema = []
+        self._schema_id = 0
+        self._quote_decoder = None
+        self._sub_hash = ""
+        self._subscribed_set = set()
+        self._timeout = 20
+
+        # login in progress, shared by login and reconnection so that auth.login is not sent twice at a time
+        self._login_task = None
+        # references of tasks started from callbacks, so that they are not garbage-collected while running
+        self._tasks = set()
+
+    async def login(self, username, password):
+        """
+        Connect if not connected yet, then login.
+
+        Returns
+        -------
+        tuple
+            (user info or None, msg), the same as DataApi.login.
+
+        """
+        # set before connecting, so that login started by on_connected of the new connection is ours
+        self._username = username
+        self._password = password
+        task_before = self._login_task
+        if self._remote._sock is None:
+            self._remote.connect(self._addr)
+        if not await self._remote.wait_connected(timeout=3):
+            return (None, "-1,no connection")
+
+        task = self._login_task
+        if task is not None and task is not task_before:
+            return await task
+        return await self._login()
+
+    async def logout(self):
+        self._loggined = None
+        cr = await self._remote.call("auth.logout", {})
+        return utils.extract_result(cr)
+
+    def close(self):
+        self._remote.close()
+
+    def set_timeout(self, timeout):
+        self._timeout = timeout
+
+    def set_data_format(self, format):
+        self._data_format = format
+
+    def set_heartbeat(self, interval, timeout):
+        self._remote.set_heartbeat_options(interval, timeout)
+
+    async def quote(self, symbol, fields="", data_format="", **kwargs):
+        return await self._call_rpc("jsq.query", self._get_format(data_format, "pandas"), "Quote",
+                                    _index_column="symbol", symbol=_str2bytes(symbol), fields=fields, **kwargs)
+
+    async def bar(self, symbol, start_time=200000, end_time=160000,
+                  trade_date=0, freq="1M", fields="", data_format="", **kwargs):
+        """See DataApi.bar."""
+        return await self._call_bar("jsi.query", "Bar", symbol, start_time, end_time, trade_date, freq, fields,
+                                    data_format, **kwargs)
+
+    async def bar_quote(self, symbol, start_time=200000, end_time=160000,
+                        trade_date=0, freq="1M", fields="", data_format="", **kwargs):
+        """See DataApi.bar_quote."""
+        return await self._call_bar("jsi.bar_view", "BarQuote", symbol, start_time, end_time, trade_date, freq,
+                                    fields, data_format, **kwargs)
+
+    async def _call_bar(self, method, data_class, symbol, start_time, end_time, trade_date, freq, fields,
+                        data_format, **kwargs):
+        begin_time = utils.to_time_int(start_time)
+        if (begin_time == -1):
+            return (-1, "Begin time format error")
+        end_time = utils.to_time_int(end_time)
+        if (end_time == -1):
+            return (-1, "End time format error")
+        trade_date = utils.to_date_int(trade_date)
+        if (trade_date == -1):
+            return (-1, "Trade date format error")
+
+        return await self._call_rpc(method, self._get_format(data_format, "pandas"), data_class,
+                                    symbol=_str2bytes(symbol), fields=fields, freq=freq,
+                                    trade_date=_to_int(trade_date), begin_time=_to_int(begin_time),
+                                    end_time=_to_int(end_time), **kwargs)
+
+    async def daily(self, symbol, start_date, end_date,
+                    adjust_mode=None, freq="1d", fields="",
+                    data_format="", **kwargs):
+        """See DataApi.daily."""
+        if adjust_mode is None:
+            adjust_mode = "none"
+
+        begin_date = utils.to_date_int(start_date)
+        if (begin_date == -1):
+            return (-1, "Begin date format error")
+        end_date = utils.to_date_int(end_date)
+        if (end_date == -1):
+            return (-1, "End date format error")
+
+        return await self._call_rpc("jsd.query", self._get_format(data_format, "pandas"), "Daily",
+                                    symbol=_str2bytes(symbol), fields=fields, begin_date=_to_int(begin_date),
+                                    end_date=_to_int(end_date), adjust_mode=adjust_mode, freq=freq, **kwargs)
+
+    async def query(self, view, filter="", fields="", data_format="", **kwargs):
+        """See DataApi.query."""
+        return await self._call_rpc("jset.query", self._get_format(data_format, "pandas"), "JSetData",
+                                    view=view, fields=fields, filter=filter, **kwargs)
+
+    async def subscribe(self, symbol, fields=""):
+        """
+        Add symbols to the subscription, quotes are read from quotes().
+
+        Returns
+        -------
+        tuple
+            (list of subscribed symbols, msg)
+
+        """
+        r, msg = await self._check_session()
+        if not r:
+            return (r, msg)
+
+        cr = await self._remote.call("jsq.subscribe", {"symbol": symbol, "fields": fields})
+        rsp, msg = utils.extract_result(cr, data_format="", class_name="SubRsp")
+        if not rsp:
+            return (rsp, msg)
+
+        new_codes = [x.strip() for x in symbol.split(',') if x]
+        self._subscribed_set = self._subscribed_set.union(set(new_codes))
+        self._set_schema(rsp)
+        return (rsp['symbols'], msg)
+
+    def quotes(self, maxsize=0):
+        """
+        Async iterator of quotes (dict) of subscribed symbols.
+
+        Parameters
+        ----------
+        maxsize : int
+            Max number of waiting quotes, older ones are dropped when the consumer falls behind.
+            0 for no limit.
+
+        Returns
+        -------
+        RpcStream
+            Call its close() to stop receiving.
+
+        """
+        return self._remote.stream(["jsq.quote_ind"], maxsize=maxsize,
+                                   convert=lambda method, data: self._convert_quote_ind(data))
+
+    def _get_format(self, format, default_format):
+        if format:
+            return format
+        elif self._data_format != "default":
+            return self._data_format
+        else:
+            return default_format
+
+    async def _check_session(self):
+        if not self._remote.connected:
+            return (False, "no connection")
+        elif self._loggined:
+            return (True, "")
+        elif self._username and self._password:
+            return await self._login()
+        else:
+            return (False, "no login session")
+
+    async def _call_rpc(self, method, data_format, data_class, **kwargs):
+        r, msg = await self._check_session()
+        if not r:
+            return (r, msg)
+
+        index_column = None
+        rpc_params = {}
+        for key, value in kwargs.items():
+            if key == '_index_column':
+                index_column = value
+            else:
+                if isinstance(value, (int, np.integer)):
+                    value = int(value)
+                rpc_params[key] = value
+
+        cr = await self._remote.call(method, rpc_params, timeout=self._timeout)
+        return utils.extract_result(cr, data_format=data_format, index_column=index_column, class_name=data_class)
+
+    def _login(self):
+        """Return the login in progress, or start one."""
+        task = self._login_task
+        if task is None or task.done():
+            task = self._login_task = self._start_task(self._do_login())
+        return task
+
+    def _start_task(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _do_login(self):
+        if self._username and self._password:
+            rpc_params = {"username": self._username,
+                          "password": self._password}
+            cr = await self._remote.call("auth.login", rpc_params)
+            r, msg = utils.extract_result(cr, data_format="", class_name="UserInfo")
+            self._loggined = r
+            return (r, msg)
+        else:
+            self._loggined = None
+            return (False, "-1,empty username or password")
+
+    async def _do_subscribe(self):
+        """Subscribe again when reconnected or hash_code is not same"""
+        if not self._subscribed_set:
+            return
+
+        rpc_params = {"symbol": ",".join(sorted(self._subscribed_set)),
+                      "fields": ""}
+        cr = await self._remote.call("jsq.subscribe", rpc_params)
+        rsp, msg = utils.extract_result(cr, data_format="", class_name="SubRsp")
+        if rsp:
+            self._set_schema(rsp)
+
+    async def _on_connected(self):
+        await self._login()
+        await self._do_subscribe()
+
+    def _on_rpc_callback(self, method, data):
+        if method == ".sys.heartbeat" and 'sub_hash' in data:
+            if self._sub_hash and self._sub_hash != data['sub_hash']:
+                print("sub_hash is not same", self._sub_hash, data['sub_hash'])
+                self._start_task(self._do_subscribe())
+
+    def _set_schema(self, rsp):
+        self._schema_id = rsp['schema_id']
+        self._schema = rsp['schema']
+        self._sub_hash = rsp['sub_hash']
+        self._quote_decoder = QuoteDecoder(self._schema_id, self._schema)
+
+    def _convert_quote_ind(self, quote_ind):
+        """Quote dict from quote_ind, see DataApi._convert_quote_ind."""
+        if self._quote_decoder is None:
+            return None
+        return self._quote_decoder.decode(quote_ind)
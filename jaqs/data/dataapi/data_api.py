@@ -4,12 +4,14 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import time
+import threading
 
 import numpy as np
 
 from . import jrpc_py
 # import jrpc
 from . import utils
+from .quote_decoder import QuoteDecoder
 
 
 # def set_log_dir(log_dir):
@@ -28,6 +30,10 @@ def _to_int(x):
     return int(x)
 
 
+# returned by DataApi._call_rpc when the request is collected by call_many
+_PENDING = object()
+
+
 class DataApiCallback(object):
     """DataApi Callback
 
@@ -94,9 +100,13 @@ class DataApi(object):
         self._schema = []
         self._schema_id = 0
         self._schema_map = {}
+        self._quote_decoder = None
+        self._quote_book = None
         self._sub_hash = ""
         self._subscribed_set = set()
         self._timeout = 20
+        # requests collected by call_many in current thread
+        self._local = threading.local()
     
     def login(self, username, password):
         
@@ -397,13 +407,18 @@ class DataApi(object):
                               filter=filter,
                               **kwargs)
     
-    def subscribe(self, symbol, func=None, fields=""):
+    def subscribe(self, symbol, func=None, fields="", quote_book=None):
         """Subscribe securites
       
         This function adds new securities to subscribed list on the server. If
         success, return subscribed codes.
       
         If securities is empty, return current subscribed codes.
+        
+        By default func("quote", quote) is called with a dict for every quote.
+        If quote_book (jaqs.data.quotebook.QuoteBook) is given, quotes are written
+        into it instead, and func("quote_book", quote_book) is called only when a
+        symbol is queued in it, the consumer takes quotes by quote_book.pop().
         """
         r, msg = self._check_session()
         if not r:
@@ -411,6 +426,8 @@ class DataApi(object):
         
         if func:
             self._on_jsq_callback = func
+        if quote_book is not None:
+            self._quote_book = quote_book
         
         rpc_params = {"symbol": symbol,
                       "fields": fields}
@@ -484,23 +501,9 @@ class DataApi(object):
         
         The original quote_ind contains field index instead of field name!
         """
-        
-        if quote_ind['schema_id'] != self._schema_id:
+        if self._quote_decoder is None:
             return None
-        
-        indicators = quote_ind['indicators']
-        values = quote_ind['values']
-        
-        max_index = len(self._schema)
-        
-        quote = {}
-        for i in range(len(indicators)):
-            if indicators[i] < max_index:
-                quote[self._schema_map[indicators[i]]['name']] = values[i]
-            else:
-                quote[str(indicators[i])] = values[i]
-        
-        return quote
+        return self._quote_decoder.decode(quote_ind)
     
     def _on_rpc_callback(self, method, data):
         # print "_on_rpc_callback:", method, data
@@ -508,9 +511,14 @@ class DataApi(object):
         try:
             if method == "jsq.quote_ind":
                 if self._on_jsq_callback:
-                    q = self._convert_quote_ind(data)
-                    if q:
-                        self._on_jsq_callback("quote", q)
+                    if self._quote_book is not None:
+                        if (self._quote_decoder is not None
+                                and self._quote_book.update(self._quote_decoder, data)):
+                            self._on_jsq_callback("quote_book", self._quote_book)
+                    else:
+                        q = self._convert_quote_ind(data)
+                        if q:
+                            self._on_jsq_callback("quote", q)
             
             elif method == ".sys.heartbeat":
                 if 'sub_hash' in data:
@@ -519,7 +527,7 @@ class DataApi(object):
                         self._do_subscribe()
         
         except Exception as e:
-            print("Can't load jrpc", e.message)
+            print("_on_rpc_callback:", e)
     
     def _call_rpc(self, method, data_format, data_class, **kwargs):
         
@@ -537,14 +545,58 @@ class DataApi(object):
                     value = int(value)
                 rpc_params[key] = value
         
+        pending = getattr(self._local, 'pending', None)
+        if pending is not None:
+            pending.append((method, rpc_params, data_format, index_column, data_class))
+            return (None, _PENDING)
+        
         cr = self._remote.call(method, rpc_params, timeout=self._timeout)
         
         return utils.extract_result(cr, data_format=data_format, index_column=index_column, class_name=data_class)
     
+    def call_many(self, requests):
+        """
+        Send many queries at once before waiting for any of them.
+        
+        Parameters
+        ----------
+        requests : list of tuple
+            [(name of query method, dict of its arguments)], methods are quote, bar, bar_quote, daily and query.
+        
+        Returns
+        -------
+        list of tuple
+            (result, msg) of each request, the same as calling the methods one by one.
+        
+        Examples
+        --------
+        res = api.call_many([('daily', {'symbol': '600030.SH', 'start_date': 20170103, 'end_date': 20170708}),
+                             ('query', {'view': 'jz.instrumentInfo', 'fields': 'symbol,name',
+                                        'filter': 'inst_type=1&status=1'})])
+        
+        """
+        self._local.pending = pending = []
+        try:
+            results = [getattr(self, name)(**kwargs) for name, kwargs in requests]
+        finally:
+            self._local.pending = None
+        
+        crs = iter(self._remote.call_many([(method, rpc_params) for method, rpc_params, _, _, _ in pending],
+                                          timeout=self._timeout))
+        calls = iter(pending)
+        for i, res in enumerate(results):
+            # requests with invalid arguments are not sent
+            if res[1] is _PENDING:
+                _, _, data_format, index_column, data_class = next(calls)
+                results[i] = utils.extract_result(next(crs), data_format=data_format, index_column=index_column,
+                                                  class_name=data_class)
+        return results
+    
     def _make_schema_map(self):
         self._schema_map = {}
         for schema in self._schema:
             self._schema_map[schema['id']] = schema
+        self._quote_decoder = QuoteDecoder(self._schema_id, self._schema)
     
     def _do_login(self):
         # Shouldn't check connected flag here. ZMQ is a mesageq queue!
@@ -0,0 +1,307 @@
+# encoding: utf-8
+"""
+JsonRpc client running in an asyncio event loop, built on zmq.asyncio (Python 3.5+).
+
+AsyncJRpcClient speaks the same protocol as JRpcClient: requests are sent on a DEALER socket,
+the connection is considered up while heartbeats are answered, and zmq reconnects the socket
+by itself when the server comes back. Calls, heartbeats and notifications are all handled
+by tasks of the event loop, no thread or queue.Queue is involved.
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import asyncio
+import random
+import time
+
+import zmq
+import zmq.asyncio
+
+from . import jrpc_py
+
+
+_FORMATS = {'msgpack_snappy': (jrpc_py._pack_msgpack_snappy, jrpc_py._unpack_msgpack_snappy),
+            'msgpack': (jrpc_py._pack_msgpack, jrpc_py._unpack_msgpack),
+            'json': (jrpc_py._pack_json, jrpc_py._unpack_json)}
+
+
+class RpcStream(object):
+    """
+    Async iterator of notifications pushed by server, e.g. jsq.quote_ind, oms.trade_ind.
+
+    Parameters
+    ----------
+    methods : list of str or None
+        Notification methods to receive, None for all.
+    maxsize : int
+        Max number of waiting notifications, the oldest one is dropped when it is full.
+        0 for no limit.
+    convert : callable, optional
+        convert(method, result) gives the item to yield, items converted to None are skipped.
+        Called when the item is taken, so dropped notifications are never converted.
+
+    Attributes
+    ----------
+    n_dropped : int
+        Number of notifications dropped because the consumer fell behind.
+
+    """
+    _CLOSED = object()
+
+    def __init__(self, methods=None, maxsize=0, convert=None, on_close=None):
+        self.methods = set(methods) if methods is not None else None
+        self.n_dropped = 0
+        self._convert = convert
+        self._on_close = on_close
+        self._queue = asyncio.Queue(maxsize)
+
+    def accept(self, method):
+        return self.methods is None or method in self.methods
+
+    def put(self, method, result):
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.n_dropped += 1
+        self._queue.put_nowait((method, result))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while True:
+            item = await self._queue.get()
+            if item is self._CLOSED:
+                raise StopAsyncIteration
+            if self._convert is None:
+                return item
+            item = self._convert(*item)
+            if item is not None:
+                return item
+
+    def close(self):
+        """Stop receiving, iteration ends after waiting notifications."""
+        if self._on_close is not None:
+            self._on_close(self)
+            self._on_close = None
+            if self._queue.full():
+                self._queue.get_nowait()
+            self._queue.put_nowait(self._CLOSED)
+
+
+class AsyncJRpcClient(object):
+    """
+    Attributes
+    ----------
+    on_connected : callable
+    on_disconnected : callable
+    on_rpc_callback : callable
+        on_rpc_callback(method, result) for every notification and heartbeat result.
+        Callbacks may be plain functions or coroutine functions.
+
+    """
+    def __init__(self, data_format="msgpack"):
+        assert data_format in _FORMATS, "unknown data_format " + data_format
+        self._pack, self._unpack = _FORMATS[data_format]
+
+        self._ctx = zmq.asyncio.Context()
+        self._sock = None
+        self._addr = None
+        self._tasks = []
+        self._callback_tasks = set()
+
+        self._waiter_map = {}
+        self._streams = []
+        self._next_callid = 0
+
+        self._connected = False
+        self._last_heartbeat_rsp_time = 0
+        self._heartbeat_interval = 1
+        self._heartbeat_timeout = 3
+
+        self.on_connected = None
+        self.on_disconnected = None
+        self.on_rpc_callback = None
+
+    @property
+    def connected(self):
+        return self._connected
+
+    def set_heartbeat_options(self, interval, timeout):
+        self._heartbeat_interval = interval
+        self._heartbeat_timeout = timeout
+
+    def next_callid(self):
+        self._next_callid += 1
+        return self._next_callid
+
+    def connect(self, addr):
+        """Connect to addr and start receiving, must be called with a running event loop."""
+        self._stop()
+        self._addr = addr
+        self._sock = self._do_connect()
+        loop = asyncio.get_event_loop()
+        self._tasks = [loop.create_task(self._recv_run(self._sock)),
+                       loop.create_task(self._heartbeat_run())]
+
+    async def wait_connected(self, timeout=3):
+        """Wait until the first heartbeat is answered, return whether connected."""
+        t0 = time.time()
+        while not self._connected and time.time() - t0 < timeout:
+            await asyncio.sleep(0.01)
+        return self._connected
+
+    def _do_connect(self):
+        client_id = str(random.randint(1000000, 100000000))
+
+        socket = self._ctx.socket(zmq.DEALER)
+        identity = (client_id) + '$' + str(random.randint(1000000, 1000000000))
+        socket.setsockopt(zmq.IDENTITY, identity.encode('utf-8'))
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(self._addr)
+        return socket
+
+    def _stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self._sock is not None:
+            self._sock.close(linger=0)
+            self._sock = None
+        self._connected = False
+
+    def close(self):
+        self._stop()
+        for stream in list(self._streams):
+            stream.close()
+        for future in self._waiter_map.values():
+            future.cancel()
+        self._waiter_map = {}
+        if not self._ctx.closed:
+            self._ctx.destroy(linger=0)
+
+    async def _recv_run(self, sock):
+        while True:
+            try:
+                data = await sock.recv()
+                if data:
+                    self._on_data_arrived(data)
+            except asyncio.CancelledError:
+                raise
+            except zmq.error.ZMQError as e:
+                if sock.closed:
+                    return
+                print("_recv_run:", e)
+            except Exception as e:
+                print("_recv_run:", e)
+
+    async def _heartbeat_run(self):
+        while True:
+            if self._connected and time.time() - self._last_heartbeat_rsp_time > self._heartbeat_timeout:
+                self._connected = False
+                self._invoke(self.on_disconnected)
+
+            try:
+                msg = {'jsonrpc': '2.0',
+                       'method': '.sys.heartbeat',
+                       'params': {'time': time.time()},
+                       'id': str(self.next_callid())}
+                await self._sock.send(self._pack(msg))
+            except zmq.error.ZMQError as e:
+                print("_heartbeat_run:", e)
+            await asyncio.sleep(self._heartbeat_interval)
+
+    def _invoke(self, func, *args):
+        if func is None:
+            return
+        res = func(*args)
+        if asyncio.iscoroutine(res):
+            task = asyncio.ensure_future(res)
+            self._callback_tasks.add(task)
+            task.add_done_callback(self._callback_tasks.discard)
+
+    def _notify(self, method, result):
+        self._invoke(self.on_rpc_callback, method, result)
+        for stream in self._streams:
+            if stream.accept(method):
+                stream.put(method, result)
+
+    def _on_data_arrived(self, data):
+        msg = self._unpack(data)
+        if not msg:
+            print("wrong message format")
+            return
+
+        if msg.get('method', None) == '.sys.heartbeat':
+            self._last_heartbeat_rsp_time = time.time()
+            if not self._connected:
+                self._connected = True
+                self._invoke(self.on_connected)
+            if 'result' in msg:
+                self._notify(msg['method'], msg['result'])
+
+        elif 'id' in msg and msg['id']:
+            future = self._waiter_map.pop(int(msg['id']), None)
+            if future is not None and not future.done():
+                ret = {}
+                if 'result' in msg:
+                    ret['result'] = msg['result']
+                if 'error' in msg:
+                    ret['error'] = msg['error']
+                future.set_result(ret if ret else jrpc_py._timeout_response())
+
+        elif 'method' in msg and 'result' in msg:
+            self._notify(msg['method'], msg['result'])
+
+    async def call(self, method, params, timeout=6):
+        """
+        Returns
+        -------
+        dict
+            Same as JRpcClient.call.
+
+        """
+        callid = self.next_callid()
+        msg = {'jsonrpc': '2.0',
+               'method': method,
+               'params': params,
+               'id': str(callid)}
+        request = self._pack(msg)
+        if not timeout:
+            await self._sock.send(request)
+            return {'result': True}
+
+        future = asyncio.get_event_loop().create_future()
+        self._waiter_map[callid] = future
+        try:
+            await self._sock.send(request)
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return jrpc_py._timeout_response()
+        finally:
+            self._waiter_map.pop(callid, None)
+
+    async def call_many(self, calls, timeout=6):
+        """Send all calls, then wait for all responses, see JRpcClient.call_many."""
+        return list(await asyncio.gather(*[self.call(method, params, timeout=timeout)
+                                           for method, params in calls]))
+
+    def stream(self, methods=None, maxsize=0, convert=None):
+        """
+        Parameters
+        ----------
+        methods : list of str or None
+        maxsize : int
+        convert : callable, optional
+            See RpcStream.
+
+        Returns
+        -------
+        RpcStream
+
+        """
+        stream = RpcStream(methods=methods, maxsize=maxsize, convert=convert, on_close=self._streams.remove)
+        self._streams.append(stream)
+        return stream
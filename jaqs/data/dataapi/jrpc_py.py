@@ -16,18 +16,64 @@ except ImportError:
 import threading
 import msgpack
 import snappy
+import numpy as np
 import copy
 
 qEmpty = copy.copy(queue.Empty)
 
 
+# msgpack ext type of a typed column: 8 bytes of numpy dtype string (padded with '\0') followed by raw data
+EXT_TYPE_NDARRAY = 16
+_NDARRAY_HEADER_LEN = 8
+
+if msgpack.version >= (1, 0, 0):
+    _LOADS_KWARGS = {'raw': False, 'strict_map_key': False}
+elif msgpack.version >= (0, 5, 2):
+    _LOADS_KWARGS = {'raw': False}
+else:
+    _LOADS_KWARGS = {'encoding': 'utf-8'}
+
+
+def pack_ndarray(arr):
+    """
+    Pack a 1-d numeric np.ndarray as msgpack ext type, so that it is decoded by unpack_ext without
+    building a Python object for each element.
+
+    Returns
+    -------
+    msgpack.ExtType
+
+    """
+    arr = np.ascontiguousarray(arr)
+    header = arr.dtype.str.encode('ascii').ljust(_NDARRAY_HEADER_LEN, b'\0')
+    return msgpack.ExtType(EXT_TYPE_NDARRAY, header + arr.tobytes())
+
+
+def unpack_ext(code, data):
+    """ext_hook of msgpack, columns packed by pack_ndarray become np.ndarray."""
+    if code == EXT_TYPE_NDARRAY:
+        dtype = np.dtype(data[:_NDARRAY_HEADER_LEN].rstrip(b'\0').decode('ascii'))
+        # one copy of the column into a bytearray, so that the array (and DataFrame built on it) is writable
+        return np.frombuffer(bytearray(data[_NDARRAY_HEADER_LEN:]), dtype=dtype)
+    return msgpack.ExtType(code, data)
+
+
+def _msgpack_loads(data):
+    return msgpack.loads(data, ext_hook=unpack_ext, **_LOADS_KWARGS)
+
+
+def _msgpack_dumps(obj):
+    # strings are packed as raw, the same as encoding='utf-8' of msgpack < 1.0
+    return msgpack.dumps(obj, use_bin_type=False)
+
+
 def _unpack_msgpack_snappy(str):
     if str.startswith(b'S'):
         tmp = snappy.uncompress(str[1:])
         # print "SNAPPY: ", len(str), len(tmp)
-        obj = msgpack.loads(tmp, encoding='utf-8')
+        obj = _msgpack_loads(tmp)
     elif str.startswith(b'\0'):
-        obj = msgpack.loads(str[1:], encoding='utf-8')
+        obj = _msgpack_loads(str[1:])
     else:
         return None
     
@@ -36,7 +82,7 @@ def _unpack_msgpack_snappy(str):
 
 def _pack_msgpack_snappy(obj):
     # print "pack", obj
-    tmp = msgpack.dumps(obj, encoding='utf-8')
+    tmp = _msgpack_dumps(obj)
     if len(tmp) > 1000:
         return b'S' + snappy.compress(tmp)
     else:
@@ -44,11 +90,11 @@ def _pack_msgpack_snappy(obj):
 
 
 def _unpack_msgpack(str):
-    return msgpack.loads(str, encoding='utf-8')
+    return _msgpack_loads(str)
 
 
 def _pack_msgpack(obj):
-    return msgpack.dumps(obj, encoding='utf-8')
+    return _msgpack_dumps(obj)
 
 
 def _unpack_json(str):
@@ -59,6 +105,60 @@ def _pack_json(obj):
     return json.dumps(obj, encoding='utf-8')
 
 
+def _timeout_response():
+    return {'error': {'error': -1, 'message': "timeout"}}
+
+
+class RpcFuture(object):
+    """
+    Response of a call sent by JRpcClient.call_async, set by the receiving thread when it arrives.
+
+    Attributes
+    ----------
+    callid : int
+
+    """
+    def __init__(self, callid, discard_func, callback=None):
+        self.callid = callid
+        self.callback = callback
+        self._discard = discard_func
+        self._event = threading.Event()
+        self._response = None
+
+    def done(self):
+        return self._event.is_set()
+
+    def set_response(self, msg):
+        ret = {}
+        if 'result' in msg:
+            ret['result'] = msg['result']
+        if 'error' in msg:
+            ret['error'] = msg['error']
+        self._response = ret if ret else _timeout_response()
+        self._event.set()
+
+    def result(self, timeout=None):
+        """
+        Wait for the response.
+
+        Parameters
+        ----------
+        timeout : float or None
+            Seconds to wait, None for waiting until the response arrives.
+
+        Returns
+        -------
+        dict
+            Same as JRpcClient.call, {'error': {'error': -1, 'message': "timeout"}} if timeout.
+
+        """
+        if not self._event.wait(timeout) and not self._event.is_set():
+            # a late response is dropped by the receiving thread
+            self._discard(self.callid)
+            return _timeout_response()
+        return self._response
+
+
 class JRpcClient(object):
     def __init__(self, data_format="msgpack"):
         self._waiter_lock = threading.Lock()
@@ -72,10 +172,10 @@ class JRpcClient(object):
         self._last_heartbeat_rsp_time = 0
         self._connected = False
 
+        self.on_connected = None
         self.on_disconnected = None
         self.on_rpc_callback = None
         self._callback_queue = queue.Queue()
-        self._call_wait_queue = queue.Queue()
 
         self._ctx = zmq.Context()
         self._pull_sock = self._ctx.socket(zmq.PULL)
@@ -147,31 +247,33 @@ class JRpcClient(object):
                     self._send_hearbeat()
                     heartbeat_time = time.time()
 
-                socks = dict(poller.poll(500))
-                if self._pull_sock in socks and socks[self._pull_sock] == zmq.POLLIN:
-                    cmd = self._pull_sock.recv()
-                    if cmd == b"CONNECT":
-                        # print time.ctime(), "CONNECT " + self._addr
-                        if remote_sock:
-                            poller.unregister(remote_sock)
-                            remote_sock.close()
-                            remote_sock = None
-
-                        remote_sock = self._do_connect()
-
-                        if remote_sock:
-                            poller.register(remote_sock, zmq.POLLIN)
-
-                    elif cmd.startswith(b"SEND:") and remote_sock:
-                        # print time.ctime(), "SEND " + cmd[5:]
-                        remote_sock.send(cmd[5:])
-
-                if remote_sock and remote_sock in socks and socks[remote_sock] == zmq.POLLIN:
-                    data = remote_sock.recv()
-                    if data:
-                        # if not data.find("heartbeat"):
-                        #    print time.ctime(), "RECV", data
-                        self._on_data_arrived(data)
+                socks = dict(poller.poll(min(500, int(self._heartbeat_interval * 1000))))
+                if socks.get(self._pull_sock) == zmq.POLLIN:
+                    # forward all queued requests, frames are passed to remote socket without copying
+                    for frames in self._recv_all(self._pull_sock, copy=False):
+                        cmd = frames[0].bytes
+                        if cmd == b"CONNECT":
+                            # print time.ctime(), "CONNECT " + self._addr
+                            if remote_sock:
+                                poller.unregister(remote_sock)
+                                remote_sock.close()
+                                remote_sock = None
+
+                            remote_sock = self._do_connect()
+
+                            if remote_sock:
+                                poller.register(remote_sock, zmq.POLLIN)
+
+                        elif cmd == b"SEND" and remote_sock:
+                            remote_sock.send(frames[1], copy=False)
+
+                if remote_sock and socks.get(remote_sock) == zmq.POLLIN:
+                    for frames in self._recv_all(remote_sock):
+                        data = frames[0]
+                        if data:
+                            # if not data.find("heartbeat"):
+                            #    print time.ctime(), "RECV", data
+                            self._on_data_arrived(data)
 
             except zmq.error.Again as e:
                 # print "RECV timeout: ", e
@@ -179,6 +281,16 @@ class JRpcClient(object):
             except Exception as e:
                 print("_recv_run:", e)
 
+    @staticmethod
+    def _recv_all(sock, copy=True):
+        """Receive messages which are ready without blocking."""
+        messages = []
+        while True:
+            try:
+                messages.append(sock.recv_multipart(zmq.NOBLOCK, copy=copy))
+            except zmq.error.Again:
+                return messages
+
     def _callback_run(self):
         while not self._should_close:
             try:
@@ -198,18 +310,16 @@ class JRpcClient(object):
     def _async_call(self, func):
         self._callback_queue.put(func)
 
-    def _send_request(self, json):
-
-        try:
-            self._send_lock.acquire()
-            self._push_sock.send(b"SEND:" + json)
-
-        finally:
-            self._send_lock.release()
+    def _send_request(self, *msgs):
+        # packed messages are not copied, they are sent as the second frame
+        with self._send_lock:
+            for msg in msgs:
+                self._push_sock.send_multipart([b"SEND", msg], copy=False)
 
     def connect(self, addr):
         self._addr = addr
-        self._push_sock.send_string('CONNECT', encoding='utf-8')
+        with self._send_lock:
+            self._push_sock.send_string('CONNECT', encoding='utf-8')
 
     def _do_connect(self):
 
@@ -230,6 +340,9 @@ class JRpcClient(object):
         self._should_close = True
         self._callback_thread.join()
         self._recv_thread.join()
+        # sockets are not used after threads stopped, pending requests are dropped
+        if not self._ctx.closed:
+            self._ctx.destroy(linger=0)
 
     def _on_data_arrived(self, str):
         try:
@@ -256,11 +369,12 @@ class JRpcClient(object):
                 # Call result
                 id = int(msg['id'])
                 
-                if self._waiter_lock.acquire():
-                    if id in self._waiter_map:
-                        q = self._waiter_map[id]
-                        if q: q.put(msg)
-                    self._waiter_lock.release()
+                with self._waiter_lock:
+                    future = self._waiter_map.pop(id, None)
+                if future is not None:
+                    future.set_response(msg)
+                    if future.callback:
+                        self._async_call(lambda: future.callback(future.result()))
             else:
                 # Notification message
                 if 'method' in msg and 'result' in msg and self.on_rpc_callback:
@@ -278,63 +392,75 @@ class JRpcClient(object):
         json_str = self._pack(msg)
         self._send_request(json_str)
 
-    def _alloc_wait_queue(self):
-        self._waiter_lock.acquire()
-        if self._call_wait_queue:
-            q = self._call_wait_queue
-            self._call_wait_queue = None
-        else:
-            q = queue.Queue()
-        self._waiter_lock.release()
-        return q
-
-    def _free_wait_queue(self, q):
-        self._waiter_lock.acquire()
-        if not self._call_wait_queue:
-            self._call_wait_queue = q
-        else:
-            del q
-        self._waiter_lock.release()
-
-    def call(self, method, params, timeout=6):
-        # print "call", method, params, timeout
-        callid = self.next_callid()
-        if timeout:
-            q = self._alloc_wait_queue()
+    def _discard_waiter(self, callid):
+        with self._waiter_lock:
+            self._waiter_map.pop(callid, None)
 
-            self._waiter_lock.acquire()
-            self._waiter_map[callid] = q
-            self._waiter_lock.release()
-        
+    def _make_request(self, method, params, callid):
         msg = {'jsonrpc': '2.0',
                'method': method,
                'params': params,
                'id': str(callid)}
+        return self._pack(msg)
 
-        # print "SEND", msg
-        json_str = self._pack(msg)
-        self._send_request(json_str)
-        
-        if timeout:
-            ret = {}
-            try:
-                r = q.get(timeout=timeout)
-                q.task_done()
-            except qEmpty:
-                r = None
-
-            self._waiter_lock.acquire()
-            self._waiter_map[callid] = None
-            self._waiter_lock.release()
-            self._free_wait_queue(q)
-
-            if r:
-                if 'result' in r:
-                    ret['result'] = r['result']
-
-                if 'error' in r:
-                    ret['error'] = r['error']
+    def _register_call(self, method, params, callback=None):
+        callid = self.next_callid()
+        future = RpcFuture(callid, self._discard_waiter, callback=callback)
+        with self._waiter_lock:
+            self._waiter_map[callid] = future
+        return future, self._make_request(method, params, callid)
+
+    def call_async(self, method, params, callback=None):
+        """
+        Send a call without waiting for its response.
+
+        Parameters
+        ----------
+        method : str
+        params : dict
+        callback : callable, optional
+            callback(response) is called in the callback thread when the response arrives.
+
+        Returns
+        -------
+        RpcFuture
+
+        """
+        future, request = self._register_call(method, params, callback=callback)
+        self._send_request(request)
+        return future
+
+    def call_many(self, calls, timeout=6):
+        """
+        Send all calls at once, then wait for all responses.
+
+        Parameters
+        ----------
+        calls : list of tuple
+            [(method, params)]
+        timeout : float
+            Seconds to wait for all of the responses.
+
+        Returns
+        -------
+        list of dict
+            Response of each call, same as call.
+
+        """
+        futures, requests = [], []
+        for method, params in calls:
+            future, request = self._register_call(method, params)
+            futures.append(future)
+            requests.append(request)
+        self._send_request(*requests)
+
+        deadline = time.time() + timeout
+        return [future.result(max(deadline - time.time(), 0)) for future in futures]
 
-            return ret if ret else {'error': {'error': -1, 'message': "timeout"}}
+    def call(self, method, params, timeout=6):
+        # print "call", method, params, timeout
+        if timeout:
+            return self.call_async(method, params).result(timeout)
         else:
+            self._send_request(self._make_request(method, params, self.next_callid()))
             return {'result': True}
@@ -0,0 +1,138 @@
+# encoding: utf-8
+"""
+Decoding of jsq.quote_ind messages.
+
+A quote_ind message has the schema_id of the subscription, a list of indicator indexes and
+a list of values. QuoteDecoder compiles the schema of a subscription once. Indexes are mapped
+to field names for dict output, and to positions of a quote class which is a list, whose
+fields are properties reading its items. When a message has all fields of the schema in
+order, which is the usual case, it is stored by one slice assignment.
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from operator import itemgetter
+
+
+class _FieldNames(dict):
+    """index -> field name, indexes not in schema are named by str(index)."""
+    def __missing__(self, key):
+        return str(key)
+
+
+def _make_property(pos):
+    def fset(self, value):
+        self[pos] = value
+    return property(itemgetter(pos), fset)
+
+
+class QuoteDecoder(object):
+    """
+    Parameters
+    ----------
+    schema_id : int
+    schema : list of dict
+        [{'id': index, 'name': field name, ...}], returned by jsq.subscribe.
+
+    Attributes
+    ----------
+    fields : list of str
+        Name of each index of the schema.
+
+    """
+    def __init__(self, schema_id, schema):
+        self.schema_id = schema_id
+        schema_map = {s['id']: s['name'] for s in schema}
+        n = len(schema)
+        # the same as before: only indexes smaller than the size of schema have names
+        self.names = _FieldNames((i, name) for i, name in schema_map.items() if i < n)
+        self.fields = [self.names[i] for i in range(n)]
+        self._get_name = self.names.__getitem__
+        self._all_indexes = list(range(n))
+
+        self.symbol_index = self.fields.index('symbol') if 'symbol' in self.fields else None
+        self._quote_classes = {}
+
+    def decode(self, quote_ind):
+        """
+        Returns
+        -------
+        dict or None
+            {field name: value}, None if quote_ind is of another schema.
+
+        """
+        if quote_ind['schema_id'] != self.schema_id:
+            return None
+        indicators = quote_ind['indicators']
+        if indicators == self._all_indexes:
+            return dict(zip(self.fields, quote_ind['values']))
+        return dict(zip(map(self._get_name, indicators), quote_ind['values']))
+
+    def get_symbol(self, quote_ind):
+        """Symbol of quote_ind, None if quote_ind is of another schema or has no symbol."""
+        if quote_ind['schema_id'] != self.schema_id or self.symbol_index is None:
+            return None
+        indicators = quote_ind['indicators']
+        if indicators == self._all_indexes:
+            return quote_ind['values'][self.symbol_index]
+        try:
+            return quote_ind['values'][indicators.index(self.symbol_index)]
+        except ValueError:
+            return None
+
+    def get_quote_class(self, base):
+        """
+        Parameters
+        ----------
+        base : type
+            Subclass of list with attribute extra, e.g. jaqs.data.basic.SlotQuote.
+
+        Returns
+        -------
+        type
+            Subclass of base, every field of the schema is a property of its position in the list.
+
+        """
+        cls = self._quote_classes.get(base, None)
+        if cls is None:
+            attrs = {'__slots__': (), 'FIELDS': tuple(self.fields), 'DECODER': self}
+            for pos, name in enumerate(self.fields):
+                attrs[str(name)] = _make_property(pos)
+            cls = type(str('{}_{}'.format(base.__name__, self.schema_id)), (base,), attrs)
+            self._quote_classes[base] = cls
+        return cls
+
+    def new_quote(self, base):
+        """Quote of class get_quote_class(base), fields are defaults of base until decoded into."""
+        cls = self.get_quote_class(base)
+        return cls([getattr(base, name, None) for name in self.fields])
+
+    def decode_into(self, quote_ind, quote):
+        """
+        Write values of quote_ind into quote created by new_quote, indexes not in schema go to quote.extra.
+
+        Returns
+        -------
+        bool
+            False if quote_ind is of another schema.
+
+        """
+        if quote_ind['schema_id'] != self.schema_id:
+            return False
+
+        indicators = quote_ind['indicators']
+        values = quote_ind['values']
+        if indicators == self._all_indexes:
+            quote[:] = values
+            return True
+
+        n = len(quote)
+        for i, value in zip(indicators, values):
+            if i < n:
+                quote[i] = value
+            else:
+                quote.extra[self._get_name(i)] = value
+        return True
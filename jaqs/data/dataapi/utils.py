@@ -7,7 +7,8 @@ try:
     basestring
 except NameError:
     basestring = str
-from collections import namedtuple
+import numbers
+from collections import namedtuple, OrderedDict
 import datetime  as dt
 import pandas    as pd
 import numpy     as np
@@ -28,28 +29,88 @@ def to_nan(x):
         return x
 
 
-def _to_date(row):
-    date = int(row['DATE'])
-    return pd.datetime(year=date // 10000, month=date // 100 % 100, day=date % 100)
+def _to_datetime64(date, time=None):
+    """
+    Vectorized conversion of int dates (and times) to datetime64[ns].
+
+    Parameters
+    ----------
+    date : array-like of int
+        %Y%m%d
+    time : array-like of int, optional
+        %H%M%S%f, in milliseconds.
+
+    Returns
+    -------
+    np.ndarray
+
+    """
+    date = np.asarray(date, dtype=np.int64)
+    res = ((date // 10000 - 1970).astype('M8[Y]')
+           + (date // 100 % 100 - 1).astype('m8[M]')).astype('M8[D]') + (date % 100 - 1).astype('m8[D]')
+    if time is not None:
+        time = np.asarray(time, dtype=np.int64) // 1000
+        seconds = time // 10000 * 3600 + time // 100 % 100 * 60 + time % 100
+        res = res + seconds.astype('m8[s]')
+    return res.astype('M8[ns]')
+
+
+def _to_date(df):
+    return pd.DatetimeIndex(_to_datetime64(df['DATE']))
+
+
+def _to_datetime(df):
+    return pd.DatetimeIndex(_to_datetime64(df['DATE'], df['TIME']))
 
 
-def _to_datetime(row):
-    date = int(row['DATE'])
-    time = int(row['TIME']) // 1000
-    return pd.datetime(year=date // 10000, month=date // 100 % 100, day=date % 100,
-                       hour=time // 10000, minute=time // 100 % 100, second=time % 100)
+def _to_array(values):
+    """
+    Convert a column of result to a typed np.ndarray, long_nan in int64 column is replaced by NaN.
+
+    Columns sent as msgpack ext type are already writable np.ndarray (see jrpc_py.unpack_ext),
+    they are not copied again unless NaN has to be filled.
+
+    """
+    if isinstance(values, np.ndarray):
+        arr = values
+    elif len(values) and isinstance(values[0], numbers.Number):
+        arr = np.asarray(values)
+        if arr.dtype.kind not in 'biuf':
+            # mixed with strings or None
+            arr = np.empty(len(values), dtype=object)
+            arr[:] = values
+    else:
+        arr = np.empty(len(values), dtype=object)
+        arr[:] = values
+    
+    if arr.dtype == np.int64:
+        mask = arr == long_nan
+        if mask.any():
+            arr = arr.astype(np.float64)
+            arr[mask] = np.nan
+    return arr
 
 
 def _to_dataframe(cloumset, index_func=None, index_column=None):
-    df = pd.DataFrame(cloumset)
-    for col in df.columns:
-        if df.dtypes.loc[col] == np.int64:
-            df.loc[:, col] = df.loc[:, col].apply(to_nan)
+    """
+    Parameters
+    ----------
+    cloumset : dict
+        {column name: list or np.ndarray}
+    index_func : callable, optional
+        index_func(df) returns the index for the whole DataFrame, e.g. _to_date, _to_datetime.
+    index_column : str, optional
+
+    """
+    data = OrderedDict()
+    for col, values in cloumset.items():
+        data[col] = _to_array(values)
+    df = pd.DataFrame(data, copy=False)
     if index_func:
-        df.index = df.apply(index_func, axis=1)
+        df.index = index_func(df)
     elif index_column:
         df.index = df[index_column]
-        del df.index.name
+        df.index.name = None
     
     return df
 
@@ -11,6 +11,8 @@ query data more natural and easy.
 from __future__ import print_function
 from __future__ import unicode_literals
 from builtins import str
+import copy
+import datetime
 from abc import abstractmethod
 from six import with_metaclass
 
@@ -25,6 +27,7 @@ import pandas as pd
 from jaqs.trade.event import EVENT_TYPE, Event
 from jaqs.data import DataApi
 from jaqs.data import align
+from jaqs.data.quotebook import QuoteBook
 import jaqs.util as jutil
 
 
@@ -264,6 +267,10 @@ class RemoteDataService(with_metaclass(Singleton, DataService)):
         self._password = ""
         self._timeout = 60
         self._trade_dates_df = None
+        self._connection_pool = []
+        self.cache = None
+        self.bar_store = None
+        self.quote_book = None
         
         self._REPORT_DATE_FIELD_NAME = 'report_date'
         
@@ -286,6 +293,14 @@ class RemoteDataService(with_metaclass(Singleton, DataService)):
         {"remote.data.address": "tcp://Address:Port",
         "remote.data.username": "your username",
         "remote.data.password": "your password"}
+        
+        Optional cache configurations, see enable_cache:
+        {"cache.folder": "path/to/cache",
+        "cache.refresh_days": 3,
+        "cache.offline": False}
+        
+        Optional local store of minute bars, see enable_bar_store:
+        {"bar_store.folder": "path/to/bars"}
 
         """
 
@@ -306,6 +321,18 @@ class RemoteDataService(with_metaclass(Singleton, DataService)):
         username = get_from_list_of_dict(dic_list, "remote.data.username", "")
         password = get_from_list_of_dict(dic_list, "remote.data.password", "")
         time_out = get_from_list_of_dict(dic_list, "timeout", 60)
+        
+        cache_folder = get_from_list_of_dict(dic_list, "cache.folder", "")
+        if cache_folder:
+            self.enable_cache(cache_folder,
+                              refresh_days=get_from_list_of_dict(dic_list, "cache.refresh_days", 3),
+                              offline=get_from_list_of_dict(dic_list, "cache.offline", False))
+        bar_store_folder = get_from_list_of_dict(dic_list, "bar_store.folder", "")
+        if bar_store_folder:
+            self.enable_bar_store(bar_store_folder)
+        if self._is_offline():
+            print("\nDataApi offline, use cache in {}".format(cache_folder))
+            return '0,'
 
         print("\nBegin: DataApi login {}@{}".format(username, address))
         INDENT = ' ' * 4
@@ -320,6 +347,9 @@ class RemoteDataService(with_metaclass(Singleton, DataService)):
             else:
                 self.data_api.close()
                 self.data_api = None
+                for service in self._connection_pool:
+                    service.data_api.close()
+                self._connection_pool = []
 
         self._address = address
         self._username = username
@@ -343,6 +373,94 @@ class RemoteDataService(with_metaclass(Singleton, DataService)):
 
         return err_msg
         
+    def enable_cache(self, folder, refresh_days=3, offline=False):
+        """
+        Keep results of daily, query_lb_dailyindicator, query_lb_fin_stat, query_index_weights_range
+        and query_industry_raw in folder, so that later queries only fetch missing date ranges / symbols.
+        
+        Parameters
+        ----------
+        folder : str
+        refresh_days : int
+            Data of the last refresh_days days before the day it was fetched will be fetched again on a later day.
+            Results of query_industry_raw expire refresh_days days after fetched.
+        offline : bool
+            If True, never query the server and use all cached data. Raise QueryDataError if data is not cached.
+
+        """
+        from jaqs.data.cache import QueryCache
+        self.cache = QueryCache(folder, refresh_days=refresh_days, offline=offline)
+    
+    def enable_bar_store(self, folder):
+        """
+        Keep minute bars queried by bar in folder, so that later queries of the same symbols and trade date
+        are read from local files. Bars of today or later are always queried from server.
+        In offline mode (see enable_cache), bars are only read from folder.
+        
+        Parameters
+        ----------
+        folder : str
+
+        """
+        from jaqs.data.barstore import BarStore
+        self.bar_store = BarStore(folder)
+    
+    def _cached_query(self, api, func, symbol, start_date=None, end_date=None, date_col=None, symbol_col='symbol',
+                      **kwargs):
+        """
+        Call func(symbol, start_date, end_date, **kwargs), or func(symbol, **kwargs) if date_col is None, through cache.
+        
+        """
+        fields = kwargs.get('fields', "")
+        if fields:
+            # cache needs symbol and date column to know what is fetched
+            required = [col for col in [symbol_col, date_col] if col is not None]
+            kwargs['fields'] = ','.join(sorted(set(fields.split(',')) | set(required)))
+        
+        if date_col is None:
+            fetch = lambda sec: func(sec, **kwargs)
+        else:
+            fetch = lambda sec, start, end: func(sec, start, end, **kwargs)
+        return self.cache.query(api, fetch, symbol, start_date=start_date, end_date=end_date,
+                                date_col=date_col, symbol_col=symbol_col, params=kwargs)
+    
+    def connection_pool(self, size):
+        """
+        Return data services which work the same as self, but each has its own DataApi connection,
+        so that they can be used in different threads at the same time.
+        
+        Parameters
+        ----------
+        size : int
+            Number of data services wanted.
+
+        Returns
+        -------
+        list of RemoteDataService
+            self is the first one. Extra connections are created at the first call and kept for later calls.
+            Fewer services are returned if new connections can not login.
+            Only self is returned in offline mode.
+
+        """
+        if self.cache is not None and self.cache.offline:
+            return [self]
+        self._raise_error_if_no_data_api()
+        
+        while len(self._connection_pool) < size - 1:
+            data_api = DataApi(self._address, use_jrpc=False)
+            data_api.set_timeout(timeout=self._timeout)
+            r, err_msg = data_api.login(username=self._username, password=self._password)
+            if not r:
+                data_api.close()
+                break
+            
+            service = copy.copy(self)
+            service.data_api = data_api
+            service._connection_pool = []
+            self._connection_pool.append(service)
+        
+        return [self] + self._connection_pool[:max(size - 1, 0)]
+    
     @property
     def data_api_loginned(self):
         return (self.data_api is not None) and (self.data_api._loggined) and (self.data_api._connected)
@@ -395,6 +513,13 @@ class RemoteDataService(with_metaclass(Singleton, DataService)):
                             fields="open,high,low,last,volume", fq=None, skip_suspended=True)
 
         """
+        # forward adjusted prices change whenever there is a new dividend, so they are never cached
+        if self.cache is not None and adjust_mode != 'pre':
+            return self._cached_query('daily', self._daily, symbol, start_date, end_date, date_col='trade_date',
+                                      fields=fields, adjust_mode=adjust_mode)
+        return self._daily(symbol, start_date, end_date, fields=fields, adjust_mode=adjust_mode)
+    
+    def _daily(self, symbol, start_date, end_date, fields="", adjust_mode=None):
         self._raise_error_if_no_data_api()
         
         df, err_msg = self.data_api.daily(symbol=symbol, start_date=start_date, end_date=end_date,
@@ -441,6 +566,11 @@ class RemoteDataService(with_metaclass(Singleton, DataService)):
                           trade_date="20170823", fields="open,high,low,last,volume", freq="5m")
 
         """
+        if self.bar_store is not None and trade_date:
+            trade_date = int(str(trade_date).replace('-', ''))
+            if self._is_offline() or trade_date < jutil.convert_datetime_to_int(datetime.date.today()):
+                return self._bar_from_store(symbol, start_time, end_time, trade_date, freq, fields)
+        
         self._raise_error_if_no_data_api()
         
         df, err_msg = self.data_api.bar(symbol=symbol, fields=fields,
@@ -450,6 +580,27 @@ class RemoteDataService(with_metaclass(Singleton, DataService)):
         self._raise_error_if_msg(err_msg)
         return df, err_msg
     
+    def _bar_from_store(self, symbol, start_time, end_time, trade_date, freq, fields):
+        """Read bars from bar_store, query whole-day bars of symbols not stored yet and store them first."""
+        missing = self.bar_store.missing_symbols(symbol.split(','), trade_date, freq)
+        if missing:
+            if self._is_offline():
+                raise QueryDataError("bar of {} on {} is not stored, can not query offline.".format(
+                                     ','.join(missing[:5]), trade_date))
+            self._raise_error_if_no_data_api()
+            df, err_msg = self.data_api.bar(symbol=','.join(missing), fields="",
+                                            start_time=200000, end_time=160000, trade_date=trade_date,
+                                            freq=freq, data_format="")
+            self._raise_error_if_msg(err_msg)
+            self.bar_store.write(df, trade_date, freq=freq, symbols=missing)
+        
+        df = self.bar_store.get(symbol, trade_date, freq=freq, start_time=start_time, end_time=end_time,
+                                fields=fields)
+        return df, '0,'
+    
+    def _is_offline(self):
+        return self.cache is not None and self.cache.offline
+    
     def quote(self, symbol, fields=""):
         """
         Query latest market data in DataFrame.
@@ -598,6 +749,19 @@ class RemoteDataService(with_metaclass(Singleton, DataService)):
         err_msg : str
 
         """
+        if self.cache is not None:
+            res, err_msg = self._cached_query('lb_fin_stat', self._query_lb_fin_stat, symbol, start_date, end_date,
+                                              date_col='ann_date', type_=type_, fields=fields)
+        else:
+            res, err_msg = self._query_lb_fin_stat(symbol, start_date, end_date, type_=type_, fields=fields)
+        
+        if drop_dup_cols is not None:
+            res = res.sort_values(by=drop_dup_cols, axis=0)
+            res = res.drop_duplicates(subset=drop_dup_cols, keep='first')
+        
+        return res, err_msg
+    
+    def _query_lb_fin_stat(self, symbol, start_date, end_date, type_, fields=""):
         view_map = {'income': 'lb.income', 'cash_flow': 'lb.cashFlow', 'balance_sheet': 'lb.balanceSheet',
                     'fin_indicator': 'lb.finIndicator'}
         view_name = view_map.get(type_, None)
@@ -630,10 +794,6 @@ class RemoteDataService(with_metaclass(Singleton, DataService)):
         except:
             pass
         
-        if drop_dup_cols is not None:
-            res = res.sort_values(by=drop_dup_cols, axis=0)
-            res = res.drop_duplicates(subset=drop_dup_cols, keep='first')
-        
         return res, err_msg
 
     def query_lb_dailyindicator(self, symbol, start_date, end_date, fields=""):
@@ -656,6 +816,12 @@ class RemoteDataService(with_metaclass(Singleton, DataService)):
         err_msg : str
         
         """
+        if self.cache is not None:
+            return self._cached_query('lb_dailyindicator', self._query_lb_dailyindicator, symbol, start_date, end_date,
+                                      date_col='trade_date', fields=fields)
+        return self._query_lb_dailyindicator(symbol, start_date, end_date, fields=fields)
+    
+    def _query_lb_dailyindicator(self, symbol, start_date, end_date, fields=""):
         filter_argument = self._dic2url({'symbol': symbol,
                                          'start_date': start_date,
                                          'end_date': end_date})
@@ -711,7 +877,18 @@ class RemoteDataService(with_metaclass(Singleton, DataService)):
         """
         if index == '000300.SH':
             index = '399300.SZ'
-    
+        
+        if self.cache is not None:
+            df_io, msg = self._cached_query('index_weights_range', self._query_index_weights_range, index,
+                                            start_date, end_date, date_col='trade_date', symbol_col='index_code')
+        else:
+            df_io, msg = self._query_index_weights_range(index, start_date, end_date)
+        
+        df_io = df_io.pivot(index='trade_date', columns='symbol', values='weight')
+        df_io = df_io.fillna(0.0)
+        return df_io
+
+    def _query_index_weights_range(self, index, start_date, end_date):
         filter_argument = self._dic2url({'index_code': index,
                                          'start_date': start_date,
                                          'end_date': end_date})
@@ -723,9 +900,8 @@ class RemoteDataService(with_metaclass(Singleton, DataService)):
         # df_io = df_io.set_index('symbol')
         df_io = df_io.astype({'weight': float, 'trade_date': np.integer})
         df_io.loc[:, 'weight'] = df_io['weight'] / 100.
-        df_io = df_io.pivot(index='trade_date', columns='symbol', values='weight')
-        df_io = df_io.fillna(0.0)
-        return df_io
+        df_io.loc[:, 'index_code'] = index
+        return df_io, msg
 
     def query_index_weights_daily(self, index, start_date, end_date):
         """
@@ -932,6 +1108,13 @@ class RemoteDataService(with_metaclass(Singleton, DataService)):
         else:
             raise ValueError("type_ must be one of SW of ZZ")
         
+        if self.cache is not None:
+            df_raw, err_msg = self._cached_query('industry_raw', self._query_industry_raw, symbol, src=src, level=level)
+        else:
+            df_raw, err_msg = self._query_industry_raw(symbol, src=src, level=level)
+        return df_raw
+    
+    def _query_industry_raw(self, symbol, src, level):
         filter_argument = self._dic2url({'symbol': symbol,
                                          'industry_src': src})
         fields_list = ['symbol', 'industry{:d}_code'.format(level), 'industry{:d}_name'.format(level)]
@@ -943,7 +1126,7 @@ class RemoteDataService(with_metaclass(Singleton, DataService)):
         df_raw = df_raw.astype(dtype={'in_date': np.integer,
                                       # 'out_date': np.integer
                                      })
-        return df_raw.drop_duplicates()
+        return df_raw.drop_duplicates(), err_msg
 
     def query_adj_factor_daily(self, symbol, start_date, end_date, div=False):
         """
@@ -1073,21 +1256,33 @@ class RemoteDataService(with_metaclass(Singleton, DataService)):
     
     # -----------------------------------------------------------------------------------
     # subscribe for real time trading
-    def subscribe(self, symbols):
+    def subscribe(self, symbols, coalesce=False):
         """
         
         Parameters
         ----------
         symbols : str
             Separated by ,
+        coalesce : bool
+            If True, quotes are kept in self.quote_book and a MARKET_DATA event is put only
+            when a symbol has no quote waiting, so a slow consumer gets the latest quote of
+            each symbol instead of every quote.
 
         """
-        self.data_api.subscribe(symbols, func=self.mkt_data_callback)
+        if coalesce:
+            if self.quote_book is None:
+                self.quote_book = QuoteBook()
+            self.data_api.subscribe(symbols, func=self.mkt_data_callback, quote_book=self.quote_book)
+        else:
+            self.data_api.subscribe(symbols, func=self.mkt_data_callback)
 
     def mkt_data_callback(self, key, quote):
         e = Event(EVENT_TYPE.MARKET_DATA)
         # print quote
-        e.dic = {'quote': quote}
+        if key == 'quote_book':
+            e.dic = {'quote_book': quote}
+        else:
+            e.dic = {'quote': quote}
         if (self.ctx is not None) and (self.ctx.instance is not None):
             self.ctx.instance.put(e)
     
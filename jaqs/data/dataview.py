@@ -16,7 +16,10 @@ import pandas as pd
 
 import jaqs.util as jutil
 from jaqs.data.align import align
-from jaqs.data.py_expression_eval import Parser
+from jaqs.data.panel import ColumnarPanel, BlockFrame, SnapshotIndex
+from jaqs.data.py_expression_eval import Parser, ExpressionCache
+from jaqs.data import parallel
+from jaqs.data.fetch import BulkFetcher
 
 
 class FactorDef:
@@ -88,11 +91,30 @@ class DataView(object):
     data_q : pd.DataFrame
         All quarterly frequency data will be merged and stored here.
         index is date, columns is symbol-field MultiIndex
+    columnar : bool
+        If True, daily data is stored only in a ColumnarPanel (one array per field). data_d is
+        materialized from the panel when it is accessed and kept until daily data is changed,
+        so avoid accessing it on large data. Do not modify data_d in place in this mode.
+    expr_cache : ExpressionCache or None
+        Intermediate results of formulas, shared by all add_formula calls. It is cleared whenever
+        data is replaced or a field is removed. Set to None to disable.
+    fetch_workers, fetch_retries : int
+        Number of connections used and times a failed chunk is retried by distributed_query.
+    progress_callback : callable or None
+        Called as progress_callback(n_done, n_total) when distributed_query finishes a chunk.
 
     """
 
-    def __init__(self):
+    def __init__(self, columnar=False):
         self.data_api = None
+        self.columnar = columnar
+        self.expr_cache = ExpressionCache()
+        self.fetch_workers = 4
+        self.fetch_retries = 3
+        self.progress_callback = None
+        self._panel = None
+        self._daily = BlockFrame()
+        self._quarterly = BlockFrame()
         self._factor_df = pd.DataFrame()
         self._import_factors = {}
         self.universe = ""
@@ -370,10 +392,44 @@ class DataView(object):
 
     @data_benchmark.setter
     def data_benchmark(self, df_new):
-        if self.data_d is not None and df_new.shape[0] != self.data_d.shape[0]:
+        if self._has_data_d() and df_new.shape[0] != len(self.dates):
             raise ValueError("You must provide a DataFrame with the same shape of data_benchmark.")
         self._data_benchmark = df_new
 
+    @property
+    def data_d(self):
+        # in columnar mode the frame is materialized from the panel on access
+        if self._panel is not None and self._daily.is_empty:
+            self._daily = BlockFrame(self._panel.to_frame())
+        return self._daily.frame
+
+    @data_d.setter
+    def data_d(self, df_new):
+        self._clear_expr_cache()
+        self._snapshot = None
+        if self.columnar and df_new is not None:
+            self._panel = ColumnarPanel.from_frame(df_new)
+            self._daily = BlockFrame()
+        else:
+            self._panel = None
+            self._daily = BlockFrame(df_new)
+
+    @property
+    def data_q(self):
+        return self._quarterly.frame
+
+    @data_q.setter
+    def data_q(self, df_new):
+        self._clear_expr_cache()
+        self._quarterly = BlockFrame(df_new)
+
+    def _clear_expr_cache(self):
+        if self.expr_cache is not None:
+            self.expr_cache.clear()
+
+    def _has_data_d(self):
+        return self._panel is not None or not self._daily.is_empty
+
     @property
     def dates(self):
         """
@@ -385,8 +441,10 @@ class DataView(object):
             dtype: int
 
         """
-        if self.data_d is not None:
-            res = self.data_d.index.values
+        if self._panel is not None:
+            res = self._panel.dates
+        elif not self._daily.is_empty:
+            res = self._daily.base.index.values
         elif self.data_api is not None:
             res = self.data_api.query_trade_dates(self.extended_start_date_d, self.end_date)
         else:
@@ -549,6 +607,8 @@ class DataView(object):
         self.end_date = props['end_date']
         self.all_price = props.get('all_price', True)
         self.freq = props.get('freq', 1)
+        self.fetch_workers = props.get('fetch_workers', self.fetch_workers)
+        self.fetch_retries = props.get('fetch_retries', self.fetch_retries)
 
         # get and filter fields
         fields = props.get('fields', [])
@@ -663,35 +723,42 @@ class DataView(object):
                 self.fields.append(dep)
 
     def distributed_query(self, query_func_name, symbol, start_date, end_date, limit=100000, **kwargs):
-        n_symbols = len(symbol.split(','))
+        """
+        Query data of many symbols over a long period in chunks, see jaqs.data.fetch.
+
+        Chunks are sent over self.fetch_workers connections of data_api at the same time,
+        failed chunks are re-sent at most self.fetch_retries times, and self.progress_callback
+        (if not None) is called as progress_callback(n_done, n_total) when a chunk finishes.
+
+        Parameters
+        ----------
+        query_func_name : str
+            Name of method of data_api.
+        symbol : str
+            Separated by ','.
+        start_date : int
+        end_date : int
+        limit : int
+            Max number of rows of one query.
+        kwargs
+            Passed to query method.
+
+        Returns
+        -------
+        df : pd.DataFrame
+        msg : str
+
+        """
+        symbols = symbol.split(',')
         dates = self.data_api.query_trade_dates(start_date, end_date)
-        n_days = len(dates)
-
-        if n_symbols * n_days > limit:
-            n = limit // n_symbols
-
-            df_list = []
-            i = 0
-            pos1, pos2 = n * i, n * (i + 1) - 1
-            while pos2 < n_days:
-                print(pos2)
-                df, msg = getattr(self.data_api, query_func_name)(symbol=symbol,
-                                                                  start_date=dates[pos1], end_date=dates[pos2],
-                                                                  **kwargs)
-                df_list.append(df)
-                i += 1
-                pos1, pos2 = n * i, n * (i + 1) - 1
-            if pos1 < n_days:
-                df, msg = getattr(self.data_api, query_func_name)(symbol=symbol,
-                                                                  start_date=dates[pos1], end_date=dates[-1],
-                                                                  **kwargs)
-                df_list.append(df)
-            df = pd.concat(df_list, axis=0)
+
+        if hasattr(self.data_api, 'connection_pool'):
+            services = self.data_api.connection_pool(self.fetch_workers)
         else:
-            df, msg = getattr(self.data_api, query_func_name)(symbol,
-                                                              start_date=start_date, end_date=end_date,
-                                                              **kwargs)
-        return df, msg
+            services = [self.data_api]
+
+        fetcher = BulkFetcher(services, max_retries=self.fetch_retries, progress_callback=self.progress_callback)
+        return fetcher.fetch(query_func_name, symbols, start_date, end_date, dates, limit=limit, **kwargs)
 
     def prepare_data(self):
         """Prepare data for the FIRST time."""
@@ -1261,7 +1328,7 @@ class DataView(object):
 
     def add_formula(self, field_name, formula, is_quarterly, overwrite=True,
                     formula_func_name_style='camel', data_api=None,
-                    within_index=True):
+                    within_index=True, n_jobs=1):
         """
         Add a new field, which is calculated using existing fields.
 
@@ -1279,34 +1346,114 @@ class DataView(object):
         data_api : RemoteDataService, optional
         within_index : bool
             When do cross-section operatioins, whether just do within index components.
+        n_jobs : int or None, optional
+            Number of processes. If not 1, a formula which only uses time series and element-wise functions
+            is evaluated on blocks of symbols in parallel. None for number of CPUs.
 
         Notes
         -----
         Time cost of this function:
-            For a simple formula (like 'a + 1'), almost all time is consumed by append_df;
-            For a complex formula (like 'GroupRank'), half of time is consumed by evaluation and half by append_df.
+            Almost all time is consumed by loading variables and evaluation. append_df only stores the result
+            as a separate block, which is merged into data_d when the whole DataFrame is needed.
         """
-        if data_api is not None:
-            self.data_api = data_api
+        self.add_formulas({field_name: formula}, is_quarterly=is_quarterly, overwrite=overwrite,
+                          formula_func_name_style=formula_func_name_style, data_api=data_api,
+                          within_index=within_index, n_jobs=n_jobs)
 
-        if field_name in self.fields:
-            if overwrite:
-                self.remove_field(field_name)
-                print("Field [{:s}] is overwritten.".format(field_name))
-            else:
-                raise ValueError("Add formula failed: name [{:s}] exist. Try another name.".format(field_name))
-        elif self._is_predefined_field(field_name):
-            raise ValueError("[{:s}] is alread a pre-defined field. Please use another name.".format(field_name))
+    @staticmethod
+    def _sort_formulas(dependencies):
+        """
+        Sort formulas so that every formula comes after the formulas it uses.
 
-        parser = self._create_parser(formula_func_name_style)
-        expr = parser.parse(formula)
+        Parameters
+        ----------
+        dependencies : dict
+            Key is field name, value is list of field names (in the same dict) it depends on.
 
-        var_df_dic = dict()
-        var_list = expr.variables()
+        Returns
+        -------
+        list of str
+
+        """
+        res = []
+        visited = dict()  # 1: visiting, 2: done
+
+        def visit(name):
+            state = visited.get(name, 0)
+            if state == 2:
+                return
+            if state == 1:
+                raise ValueError("Add formulas failed: circular dependency on [{:s}].".format(name))
+            visited[name] = 1
+            for dep in dependencies[name]:
+                visit(dep)
+            visited[name] = 2
+            res.append(name)
+
+        for name in dependencies:
+            visit(name)
+        return res
+
+    def add_formulas(self, formulas, is_quarterly=False, overwrite=True,
+                     formula_func_name_style='camel', data_api=None,
+                     within_index=True, n_jobs=1):
+        """
+        Add several new fields in one pass. A formula may use fields defined by other formulas in formulas.
+
+        Parameters
+        ----------
+        formulas : dict
+            Key is field name, value is formula.
+        is_quarterly : bool
+            Whether results are quarterly data (like quarterly financial statement) or daily data.
+        overwrite : bool, optional
+            Whether overwrite existing field. True by default.
+        formula_func_name_style : {'upper', 'lower'}, optional
+        data_api : RemoteDataService, optional
+        within_index : bool
+            When do cross-section operatioins, whether just do within index components.
+        n_jobs : int or None, optional
+            Number of processes. 1 (default) evaluates all formulas in this process, None for number of CPUs.
+            Otherwise formulas which do not use each other are evaluated in a process pool,
+            see jaqs.data.parallel. Results are the same as serial evaluation.
+
+        Notes
+        -----
+        Formulas are evaluated in dependency order with one parser. Every variable, index_member and
+        announcement dates are loaded only once, and all results are appended together at the end.
+
+        """
+        if data_api is not None:
+            self.data_api = data_api
 
-        factors = [var for var in var_list if var in self._import_factors]
+        for field_name in formulas:
+            if field_name in self.fields:
+                if overwrite:
+                    self.remove_field(field_name)
+                    print("Field [{:s}] is overwritten.".format(field_name))
+                else:
+                    raise ValueError("Add formula failed: name [{:s}] exist. Try another name.".format(field_name))
+            elif self._is_predefined_field(field_name):
+                raise ValueError("[{:s}] is alread a pre-defined field. Please use another name.".format(field_name))
 
-        var_list = [var for var in var_list if var not in expr.functions]
+        parser = self._create_parser(formula_func_name_style)
+        exprs = {field_name: parser.parse(formula) for field_name, formula in formulas.items()}
+
+        var_list = []
+        factors = []
+        dependencies = dict()
+        for field_name, expr in exprs.items():
+            expr_vars = expr.variables()
+            dependencies[field_name] = [var for var in expr_vars if var in formulas and var != field_name]
+            for var in expr_vars:
+                if var in formulas and var != field_name:
+                    continue
+                if var in self._import_factors:
+                    if var not in factors:
+                        factors.append(var)
+                elif var not in expr.functions and var not in var_list:
+                    var_list.append(var)
+        formula_order = self._sort_formulas(dependencies)
 
         # TODO: users do not need to prepare data before add_formula
         if not self.fields:
@@ -1321,6 +1468,7 @@ class DataView(object):
                     if not success:
                         return
 
+        var_df_dic = dict()
         for var in var_list:
             if self._is_quarter_field(var):
                 df_var = self.get_ts_quarter(var, start_date=self.extended_start_date_q)
@@ -1346,22 +1494,61 @@ class DataView(object):
 
         # TODO: send ann_date into expr.evaluate. We assume that ann_date of all fields of a symbol is the same
         df_ann = self._get_ann_df()
+        df_index_member = None
         if within_index:
             df_index_member = self.get_ts('index_member', start_date=self.extended_start_date_d, end_date=self.end_date)
-            df_eval = parser.evaluate(var_df_dic, ann_dts=df_ann, trade_dts=self.dates, index_member=df_index_member)
-        else:
-            df_eval = parser.evaluate(var_df_dic, ann_dts=df_ann, trade_dts=self.dates)
+
+        # formulas of the same level do not use each other
+        level = dict()
+        for field_name in formula_order:
+            level[field_name] = max([level[dep] + 1 for dep in dependencies[field_name]] or [0])
+        n_levels = max(level.values()) + 1 if level else 0
+
+        res = dict()
+        for i in range(n_levels):
+            level_names = [field_name for field_name in formula_order if level[field_name] == i]
+
+            res_parallel = dict()
+            if n_jobs != 1:
+                # registered factors are only available in this process
+                names_parallel = [field_name for field_name in level_names
+                                  if not any(var in self._import_factors for var in exprs[field_name].variables())]
+                vars_parallel = set()
+                for field_name in names_parallel:
+                    vars_parallel.update(var for var in exprs[field_name].variables() if var in var_df_dic)
+                res_parallel = parallel.evaluate_formulas({field_name: formulas[field_name]
+                                                           for field_name in names_parallel},
+                                                          {var: var_df_dic[var] for var in vars_parallel},
+                                                          ann_dts=df_ann, trade_dts=self.dates,
+                                                          index_member=df_index_member,
+                                                          formula_func_name_style=formula_func_name_style,
+                                                          n_jobs=n_jobs)
+
+            for field_name in level_names:
+                if field_name in res_parallel:
+                    df_eval = res_parallel[field_name]
+                else:
+                    # some functions modify their arguments in place, so every formula gets its own copy of inputs
+                    expr_vars = {var: var_df_dic[var].copy() for var in exprs[field_name].variables()
+                                 if var in var_df_dic}
+                    parser.tokens = exprs[field_name].tokens
+                    df_eval = parser.evaluate(expr_vars, ann_dts=df_ann, trade_dts=self.dates,
+                                              index_member=df_index_member, cache=self.expr_cache)
+                res[field_name] = df_eval
+                # later formulas see this field as a variable
+                var_df_dic[field_name] = df_eval.astype(float)
 
         # FIXME: When field_name is factor's id, the factor may be added before!
-        if field_name in self.fields:
-            self.remove_field(field_name)
+        for field_name in formula_order:
+            if field_name in self.fields:
+                self.remove_field(field_name)
 
-        self.append_df(df_eval, field_name, is_quarterly=is_quarterly)
+        self.append_many(res, is_quarterly=is_quarterly)
 
         if is_quarterly:
             df_ann = self._get_ann_df()
-            df_expanded = align(df_eval, df_ann, self.dates)
-            self.append_df(df_expanded, field_name, is_quarterly=False)
+            self.append_many({field_name: align(df_eval, df_ann, self.dates) for field_name, df_eval in res.items()},
+                             is_quarterly=False)
 
     def append_df(self, df, field_name, is_quarterly=False):
         """
@@ -1378,6 +1565,8 @@ class DataView(object):
         -----
         append_df does not support overwrite. To overwrite a field, you must first do self.remove_fields(),
         then append_df() again.
+        The new field is stored as a separate block and merged into data_d / data_q (with a single sort)
+        only when the whole DataFrame is needed, so the cost of append_df does not grow with the DataView.
 
         """
         df = df.copy()
@@ -1389,36 +1578,30 @@ class DataView(object):
             raise ValueError("Data to be appended must be pandas format. But we have {}".format(type(df)))
 
         if is_quarterly:
-            the_data = self.data_q
+            self._quarterly.add(field_name, df)
+        elif self._panel is not None:
+            self._panel.set_field(field_name, df)
+            self._daily = BlockFrame()
+            self._snapshot = None
         else:
-            the_data = self.data_d
+            self._daily.add(field_name, df)
+            self._snapshot = None
+        self._add_field(field_name, is_quarterly)
 
-        # Copy exists symbols and set multi index
-        df = df.loc[:, the_data.columns.levels[0]]
-        multi_idx = pd.MultiIndex.from_product([[field_name], df.columns])
-        df.columns = multi_idx
-        df = df.sort_index(axis=1)
+    def append_many(self, dic, is_quarterly=False):
+        """
+        Append several DataFrames at once.
 
-        the_data.columns = the_data.columns.swaplevel()
-        the_data = the_data.sort_index(axis=1)
-        
-        new_cols = the_data.columns.append(df.columns)
-        the_data = the_data.reindex(columns=new_cols)
-        the_data[field_name] = df[field_name]
-        the_data.columns = the_data.columns.swaplevel()
-        the_data = the_data.sort_index(axis=1)
-        #the_data = apply_in_subprocess(pd.merge, args=(the_data, df),
-        #                            kwargs={'left_index': True, 'right_index': True, 'how': 'left'})  # runs in *only* one process
-        #the_data = pd.merge(the_data, df, left_index=True, right_index=True, how='left')
-        #the_data = the_data.sort_index(axis=1)
-        #merge = the_data.join(df, how='left')  # left: keep index of existing data unchanged
-        #sort_columns(the_data)
-    
-        if is_quarterly:
-            self.data_q = the_data
-        else:
-            self.data_d = the_data
-        self._add_field(field_name, is_quarterly)
+        Parameters
+        ----------
+        dic : dict
+            Key is field name, value is pd.DataFrame or pd.Series (index is date, column is symbol).
+        is_quarterly : bool
+            Whether data is quarterly data (like quarterly financial statement) or daily data.
+
+        """
+        for field_name, df in dic.items():
+            self.append_df(df, field_name, is_quarterly=is_quarterly)
 
     def remove_field(self, field_names):
         """
@@ -1455,11 +1638,16 @@ class DataView(object):
                 print("Field name [{}] is a pre-defined field, ignore.".format(field_name))
                 return
 
-            # remove field data
-
-            self.data_d = self.data_d.drop(field_name, axis=1, level=1)
+            # remove field data, actual removal of data_d / data_q is delayed until they are needed
+            self._clear_expr_cache()
+            self._snapshot = None
+            if self._panel is not None:
+                self._panel.remove_field(field_name)
+                self._daily = BlockFrame()
+            else:
+                self._daily.remove(field_name)
             if is_quarterly:
-                self.data_q = self.data_q.drop(field_name, axis=1, level=1)
+                self._quarterly.remove(field_name)
 
             # remove fields name from list
             self.fields.remove(field_name)
@@ -1510,7 +1698,15 @@ class DataView(object):
         if not end_date:
             end_date = self.end_date
 
-        res = self.data_d.loc[pd.IndexSlice[start_date: end_date], pd.IndexSlice[symbol, fields]]
+        if self._panel is not None:
+            res = self._panel.get(fields=None if isinstance(fields, slice) else fields,
+                                  symbols=None if isinstance(symbol, slice) else symbol,
+                                  start_date=start_date, end_date=end_date)
+            return res
+
+        # fields without pending changes can be read without merging newly appended fields
+        data_d = self._daily.base if self._daily.is_clean(fields) else self.data_d
+        res = data_d.loc[pd.IndexSlice[start_date: end_date], pd.IndexSlice[symbol, fields]]
         return res
 
     def get_snapshot(self, snapshot_date, symbol="", fields=""):
@@ -1528,30 +1724,66 @@ class DataView(object):
 
         Returns
         -------
-        res : pd.DataFrame
-            symbol as index, field as columns
+        res : pd.DataFrame or None
+            symbol as index, field as columns. None if snapshot_date is not a date of data.
+            A copy, modifying it does not change data of DataView.
+
+        Notes
+        -----
+        Snapshots are read from a SnapshotIndex, which is built at the first call after data is changed.
+        The index holds views of data_d (or of ColumnarPanel), only fields whose data can not be viewed
+        as a (date, symbol, field) array, e.g. a field with different dtypes among symbols, are copied.
 
         """
+        res = self._get_snapshot_index().get(snapshot_date,
+                                             fields=fields.split(',') if fields else None,
+                                             symbols=symbol.split(',') if symbol else None)
+        if res is None:
+            print("No data. for date={}, fields={}, symbol={}".format(snapshot_date, fields, symbol))
+        return res
 
-        if self._snapshot is not None:
-            if snapshot_date not in self._snapshot:
-                return
+    def iter_snapshots(self, start_date=0, end_date=0, symbol="", fields=""):
+        """
+        Iterate over snapshots of consecutive trade dates, faster than calling get_snapshot for each date.
 
-            df = self._snapshot[snapshot_date]
-            if fields:
-                return df[fields.split(',')]
-            else:
-                return df
+        Parameters
+        ----------
+        start_date : int, optional
+            Default 0 (self.start_date).
+        end_date : int, optional
+            Default 0 (self.end_date).
+        symbol : str, optional
+            Separated by ',' default "" (all securities).
+        fields : str, optional
+            Separated by ',' default "" (all fields).
 
-        res = self.get(symbol=symbol, start_date=snapshot_date, end_date=snapshot_date, fields=fields)
-        if res is None:
-            print("No data. for date={}, fields={}, symbol={}".format(snapshot_date, fields, symbol))
-            return
+        Yields
+        ------
+        date : int
+        res : pd.DataFrame
+            Same as get_snapshot(date, symbol, fields).
 
-        res = res.stack(level='symbol', dropna=False)
-        res.index = res.index.droplevel(level=self.TRADE_DATE_FIELD_NAME)
+        Notes
+        -----
+        Same SnapshotIndex as get_snapshot is used.
 
-        return res
+        """
+        if not start_date:
+            start_date = self.start_date
+        if not end_date:
+            end_date = self.end_date
+        return self._get_snapshot_index().iter_dates(start_date, end_date,
+                                                     fields=fields.split(',') if fields else None,
+                                                     symbols=symbol.split(',') if symbol else None)
+
+    def _get_snapshot_index(self):
+        """Build SnapshotIndex of daily data when it is first needed after data is changed."""
+        if self._snapshot is None:
+            if self._panel is not None:
+                self._snapshot = SnapshotIndex.from_panel(self._panel)
+            else:
+                self._snapshot = SnapshotIndex.from_frame(self.data_d)
+        return self._snapshot
 
     def _get_ann_df(self):
         """
@@ -1564,9 +1796,10 @@ class DataView(object):
             If no quarterly data available, return None.
 
         """
-        if self.data_q is None:
+        if self._quarterly.is_empty:
             return None
-        df_ann = self.data_q.loc[:, pd.IndexSlice[:, self.ANN_DATE_FIELD_NAME]]
+        data_q = self._quarterly.base if self._quarterly.is_clean([self.ANN_DATE_FIELD_NAME]) else self.data_q
+        df_ann = data_q.loc[:, pd.IndexSlice[:, self.ANN_DATE_FIELD_NAME]]
         df_ann.columns = df_ann.columns.droplevel(level='field')
 
         return df_ann
@@ -1599,7 +1832,8 @@ class DataView(object):
         # if not end_date:
         #     end_date = self.end_date
 
-        df_ref_quarterly = self.data_q.loc[:, pd.IndexSlice[symbols, fields]]
+        data_q = self._quarterly.base if self._quarterly.is_clean(fields) else self.data_q
+        df_ref_quarterly = data_q.loc[:, pd.IndexSlice[symbols, fields]]
         df_ref_quarterly.columns = df_ref_quarterly.columns.droplevel(level='field')
 
         return df_ref_quarterly
@@ -1625,6 +1859,26 @@ class DataView(object):
             Index is int date, column is symbol.
 
         """
+        if self._panel is not None and not keep_level and field in self._panel:
+            if not start_date:
+                start_date = self.start_date
+            if not end_date:
+                end_date = self.end_date
+            return self._panel.get_ts(field, symbols=symbol.split(',') if symbol else None,
+                                      start_date=start_date, end_date=end_date)
+
+        block = self._daily.get_block(field)
+        if block is not None and not keep_level:
+            # newly appended field, read from its own block
+            if not start_date:
+                start_date = self.start_date
+            if not end_date:
+                end_date = self.end_date
+            res = block.loc[start_date: end_date]
+            if symbol:
+                res = res.loc[:, symbol.split(',')]
+            return res.copy()
+
         res = self.get(symbol, start_date=start_date, end_date=end_date, fields=field)
         if res is None:
             print("No data. for start_date={}, end_date={}, field={}, symbol={}".format(start_date,
@@ -1707,20 +1961,14 @@ class DataView(object):
             limit = np.abs((open - preclose) / preclose)
             self.append_df(limit, "_limit", is_quarterly=False)
 
-        # Snapshot dict may use large memory.
-
+        # build snapshot index in advance instead of at the first get_snapshot call
         if large_memory:
             self.update_snapshot()
 
     def update_snapshot(self):
-        dates = self.data_d.index.values
-        df = self.data_d.T.unstack()
-        self._snapshot = {}
-        for date in dates:
-            tmp = df[date].copy()
-            del tmp.index.name
-            del tmp.columns.name
-            self._snapshot[date] = tmp
+        """Build SnapshotIndex of daily data now instead of at the next get_snapshot call."""
+        self._snapshot = None
+        self._get_snapshot_index()
 
     def load_dataview(self, folder_path='.', large_memory=True):
         """
@@ -1861,7 +2109,7 @@ class DataView(object):
         elif isinstance(symbols, (list, tuple)):
             pass
 
-        dv2 = DataView()
+        dv2 = DataView(columnar=self.columnar)
         dv2.data_benchmark = self.data_benchmark.loc[pd.IndexSlice[extended_start_date_d: end_date]]
         if self.data_d is not None:
             dv2.data_d = self.data_d.loc[pd.IndexSlice[extended_start_date_d: end_date], pd.IndexSlice[symbols, fields]]
@@ -1929,11 +2177,18 @@ class EventDataView(object):
     data_q : pd.DataFrame
         All quarterly frequency data will be merged and stored here.
         index is date, columns is symbol-field MultiIndex
+    fetch_workers, fetch_retries : int
+        Number of connections used and times a failed chunk is retried by distributed_query.
+    progress_callback : callable or None
+        Called as progress_callback(n_done, n_total) when distributed_query finishes a chunk.
 
     """
 
     def __init__(self):
         self.data_api = None
+        self.fetch_workers = 4
+        self.fetch_retries = 3
+        self.progress_callback = None
 
         self.universe = ""
         self.symbol = []
@@ -2157,6 +2412,8 @@ class EventDataView(object):
         self.extended_start_date_q = jutil.shift(self.start_date, n_weeks=-130)
         self.end_date = props['end_date']
         self.all_price = props.get('all_price', True)
+        self.fetch_workers = props.get('fetch_workers', self.fetch_workers)
+        self.fetch_retries = props.get('fetch_retries', self.fetch_retries)
         self.freq = props.get('freq', 1)
 
         # get and filter fields
@@ -2208,35 +2465,25 @@ class EventDataView(object):
         print("Initialize config success.")
 
     def distributed_query(self, query_func_name, symbol, start_date, end_date, limit=100000, **kwargs):
-        n_symbols = len(symbol.split(','))
+        """
+        Query data of many symbols over a long period in chunks, same as DataView.distributed_query.
+
+        Returns
+        -------
+        df : pd.DataFrame
+        msg : str
+
+        """
+        symbols = symbol.split(',')
         dates = self.data_api.query_trade_dates(start_date, end_date)
-        n_days = len(dates)
-
-        if n_symbols * n_days > limit:
-            n = limit // n_symbols
-
-            df_list = []
-            i = 0
-            pos1, pos2 = n * i, n * (i + 1) - 1
-            while pos2 < n_days:
-                print(pos2)
-                df, msg = getattr(self.data_api, query_func_name)(symbol=symbol,
-                                                                  start_date=dates[pos1], end_date=dates[pos2],
-                                                                  **kwargs)
-                df_list.append(df)
-                i += 1
-                pos1, pos2 = n * i, n * (i + 1) - 1
-            if pos1 < n_days:
-                df, msg = getattr(self.data_api, query_func_name)(symbol=symbol,
-                                                                  start_date=dates[pos1], end_date=dates[-1],
-                                                                  **kwargs)
-                df_list.append(df)
-            df = pd.concat(df_list, axis=0)
+
+        if hasattr(self.data_api, 'connection_pool'):
+            services = self.data_api.connection_pool(self.fetch_workers)
         else:
-            df, msg = getattr(self.data_api, query_func_name)(symbol,
-                                                              start_date=start_date, end_date=end_date,
-                                                              **kwargs)
-        return df, msg
+            services = [self.data_api]
+
+        fetcher = BulkFetcher(services, max_retries=self.fetch_retries, progress_callback=self.progress_callback)
+        return fetcher.fetch(query_func_name, symbols, start_date, end_date, dates, limit=limit, **kwargs)
 
     def prepare_data(self):
         """Prepare data for the FIRST time."""
@@ -0,0 +1,194 @@
+# encoding: utf-8
+"""
+Fetch large amount of data from a data service in chunks.
+
+A request of many symbols over a long period is split along both symbols and trade dates,
+so that every chunk returns no more than `limit` rows. Chunks are sent at the same time
+over a pool of data services (each holding its own DataApi connection), failed chunks are
+retried with exponential backoff, and results are concatenated in chunk order.
+
+"""
+from __future__ import print_function
+
+import time
+from multiprocessing.pool import ThreadPool
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import numpy as np
+import pandas as pd
+
+from jaqs.data.dataservice import QueryDataError
+
+
+def _is_success(err_msg):
+    splited = err_msg.split(',')
+    return bool(splited) and splited[0] == '0'
+
+
+def split_chunks(symbols, start_date, end_date, dates, limit, max_symbols=None):
+    """
+    Split a query into chunks of symbols and date ranges.
+
+    Parameters
+    ----------
+    symbols : list of str
+    start_date : int
+    end_date : int
+    dates : np.ndarray
+        Trade dates within [start_date, end_date].
+    limit : int
+        Max number of rows (symbol x date) of one chunk.
+    max_symbols : int or None
+        Max number of symbols of one chunk. None for no limit other than `limit`.
+
+    Returns
+    -------
+    chunks : list of tuple
+        (symbol_list, start_date, end_date). The first chunk of dates starts at start_date
+        and the last one ends at end_date, so chunks cover exactly the queried range.
+
+    """
+    n_symbols = len(symbols)
+    n_days = len(dates)
+
+    symbols_per_chunk = min(n_symbols, max(1, limit))
+    if max_symbols is not None:
+        symbols_per_chunk = min(symbols_per_chunk, max_symbols)
+    symbols_per_chunk = max(symbols_per_chunk, 1)
+
+    if n_days == 0 or symbols_per_chunk * n_days <= limit:
+        date_ranges = [(start_date, end_date)]
+    else:
+        days_per_chunk = max(1, limit // symbols_per_chunk)
+        starts = np.arange(0, n_days, days_per_chunk)
+        ends = np.append(starts[1:], n_days) - 1
+        date_ranges = [(dates[i], dates[j]) for i, j in zip(starts, ends)]
+        date_ranges[0] = (start_date, date_ranges[0][1])
+        date_ranges[-1] = (date_ranges[-1][0], end_date)
+
+    chunks = []
+    for pos in range(0, max(n_symbols, 1), symbols_per_chunk):
+        symbol_list = symbols[pos: pos + symbols_per_chunk]
+        for start, end in date_ranges:
+            chunks.append((symbol_list, start, end))
+    return chunks
+
+
+class BulkFetcher(object):
+    """
+    Send chunks of a query concurrently over a pool of data services.
+
+    Attributes
+    ----------
+    n_workers : int
+        Number of chunks in flight, equal to number of data services.
+    max_retries : int
+        Times a failed chunk is re-sent before QueryDataError is raised.
+    backoff : float
+        Seconds to wait before the first retry, doubled for every following retry.
+    progress_callback : callable or None
+        Called as progress_callback(n_done, n_total) in the calling thread
+        every time a chunk is finished.
+
+    """
+    def __init__(self, services, max_retries=3, backoff=1.0, progress_callback=None):
+        if not services:
+            raise ValueError("At least one data service is needed.")
+        self.n_workers = len(services)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.progress_callback = progress_callback
+
+        self._services = queue.Queue()
+        for service in services:
+            self._services.put(service)
+
+    def _query_chunk(self, args):
+        """Query one chunk using any idle data service, retry if it fails."""
+        query_func_name, chunk, kwargs = args
+        symbol_list, start_date, end_date = chunk
+
+        err_msg = ""
+        for i in range(self.max_retries + 1):
+            if i > 0:
+                time.sleep(self.backoff * 2 ** (i - 1))
+
+            service = self._services.get()
+            try:
+                df, err_msg = getattr(service, query_func_name)(symbol=','.join(symbol_list),
+                                                                start_date=start_date, end_date=end_date,
+                                                                **kwargs)
+            except (QueryDataError, IOError, RuntimeError) as e:
+                df, err_msg = None, "-1,{}".format(e)
+            finally:
+                self._services.put(service)
+
+            if _is_success(err_msg) and df is not None:
+                return df, err_msg
+
+        raise QueryDataError("{} of [{:d} symbols, {} - {}] failed after {:d} retries: {}".format(
+                             query_func_name, len(symbol_list), start_date, end_date, self.max_retries, err_msg))
+
+    def fetch(self, query_func_name, symbols, start_date, end_date, dates, limit=100000, max_symbols=None,
+              **kwargs):
+        """
+        Query [start_date, end_date] of symbols in chunks and concatenate results.
+
+        Parameters
+        ----------
+        query_func_name : str
+            Name of query method of data service, e.g. 'daily', 'query_lb_dailyindicator'.
+            It is called as func(symbol=..., start_date=..., end_date=..., **kwargs) and returns (df, err_msg).
+        symbols : list of str
+        start_date : int
+        end_date : int
+        dates : np.ndarray
+            Trade dates within [start_date, end_date].
+        limit : int
+            Max number of rows of one chunk.
+        max_symbols : int or None
+            Max number of symbols of one chunk.
+        kwargs
+            Passed to query method.
+
+        Returns
+        -------
+        df : pd.DataFrame
+        err_msg : str
+
+        """
+        chunks = split_chunks(symbols, start_date, end_date, dates, limit, max_symbols=max_symbols)
+        n_total = len(chunks)
+        tasks = [(query_func_name, chunk, kwargs) for chunk in chunks]
+
+        results = [None] * n_total
+        if self.n_workers == 1 or n_total == 1:
+            for i, task in enumerate(tasks):
+                results[i] = self._query_chunk(task)
+                self._report(i + 1, n_total)
+        else:
+            pool = ThreadPool(processes=min(self.n_workers, n_total))
+            try:
+                it = pool.imap_unordered(self._query_chunk_indexed, enumerate(tasks))
+                for n_done, (i, res) in enumerate(it, 1):
+                    results[i] = res
+                    self._report(n_done, n_total)
+            finally:
+                pool.terminate()
+                pool.join()
+
+        df_list = [df for df, _ in results]
+        df = df_list[0] if n_total == 1 else pd.concat(df_list, axis=0)
+        return df, results[-1][1]
+
+    def _query_chunk_indexed(self, args):
+        i, task = args
+        return i, self._query_chunk(task)
+
+    def _report(self, n_done, n_total):
+        if self.progress_callback is not None:
+            self.progress_callback(n_done, n_total)
@@ -0,0 +1,539 @@
+# encoding: utf-8
+"""
+ColumnarPanel stores daily data of a DataView as one 2-D array per field,
+instead of one wide DataFrame with (symbol, field) MultiIndex columns.
+
+Every field is a contiguous np.ndarray of shape (n_dates, n_symbols) and all fields share
+the same date index and symbol index. Adding or removing a field only touches that field,
+pandas objects are built on demand when data is fetched.
+
+BlockFrame keeps the MultiIndex DataFrame format, but buffers added / removed fields and
+merges them lazily, so that a series of append_df calls does not re-sort the whole frame each time.
+
+"""
+from __future__ import print_function
+
+import numpy as np
+import pandas as pd
+
+
+class ColumnarPanel(object):
+    """
+    Daily data stored by field.
+
+    Attributes
+    ----------
+    dates : np.ndarray
+        Shared date index. dtype = int
+    symbols : list of str
+        Shared symbol index.
+
+    """
+    SYMBOL_LEVEL_NAME = 'symbol'
+    FIELD_LEVEL_NAME = 'field'
+
+    def __init__(self, dates, symbols, index_name='trade_date'):
+        self.dates = np.asarray(dates)
+        self.symbols = list(symbols)
+        self.index_name = index_name
+
+        self._symbol_pos = {s: i for i, s in enumerate(self.symbols)}
+        self._data = dict()
+
+    # --------------------------------------------------------------------------------------------------------
+    # Construction
+    @classmethod
+    def from_frame(cls, df):
+        """
+        Build panel from a DataFrame with (symbol, field) MultiIndex columns.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            index is date, columns is symbol-field MultiIndex
+
+        Returns
+        -------
+        ColumnarPanel
+
+        """
+        symbols = sorted(df.columns.get_level_values(cls.SYMBOL_LEVEL_NAME).unique())
+        panel = cls(df.index.values, symbols, index_name=df.index.name)
+
+        df_by_field = df.swaplevel(axis=1).sort_index(axis=1)
+        for field in df_by_field.columns.get_level_values(0).unique():
+            panel.set_field(field, df_by_field[field])
+        return panel
+
+    def copy(self):
+        panel = ColumnarPanel(self.dates.copy(), self.symbols, index_name=self.index_name)
+        panel._data = {k: v.copy() for k, v in self._data.items()}
+        return panel
+
+    # --------------------------------------------------------------------------------------------------------
+    # Fields
+    @property
+    def fields(self):
+        return sorted(self._data.keys())
+
+    @property
+    def shape(self):
+        return len(self.dates), len(self.symbols)
+
+    def __contains__(self, field):
+        return field in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def set_field(self, field, data):
+        """
+        Add or replace a field.
+
+        Parameters
+        ----------
+        field : str
+        data : pd.DataFrame or np.ndarray
+            If DataFrame, index is date and columns is symbol, it will be re-indexed to
+            dates and symbols of the panel (missing cells are NaN, unknown symbols are dropped).
+            If np.ndarray, its shape must be (n_dates, n_symbols).
+
+        """
+        if isinstance(data, pd.Series):
+            data = pd.DataFrame(data)
+
+        if isinstance(data, pd.DataFrame):
+            if not (data.index.equals(pd.Index(self.dates)) and list(data.columns) == self.symbols):
+                data = data.reindex(index=self.dates, columns=self.symbols)
+            arr = data.values
+        elif isinstance(data, np.ndarray):
+            if data.shape != self.shape:
+                raise ValueError("Shape of field [{}] should be {}, but we have {}".format(field, self.shape,
+                                                                                          data.shape))
+            arr = data
+        else:
+            raise ValueError("Data of field must be pandas format or np.ndarray. But we have {}".format(type(data)))
+
+        self._data[field] = np.ascontiguousarray(arr)
+
+    def remove_field(self, field):
+        self._data.pop(field, None)
+
+    def get_field(self, field):
+        """Return the underlying array of field, shape (n_dates, n_symbols). No copy."""
+        return self._data[field]
+
+    # --------------------------------------------------------------------------------------------------------
+    # Index helpers
+    def date_slice(self, start_date=None, end_date=None):
+        """Positional slice of dates within [start_date, end_date]. Dates must be sorted."""
+        start = 0 if start_date is None else np.searchsorted(self.dates, start_date, side='left')
+        end = len(self.dates) if end_date is None else np.searchsorted(self.dates, end_date, side='right')
+        return slice(start, end)
+
+    def date_pos(self, date):
+        """Position of date in dates, or -1 if not found."""
+        pos = np.searchsorted(self.dates, date)
+        if pos < len(self.dates) and self.dates[pos] == date:
+            return pos
+        return -1
+
+    def _symbol_index(self, symbols):
+        if symbols is None:
+            return self.symbols, slice(None)
+        symbols = [s for s in symbols if s in self._symbol_pos]
+        return symbols, np.array([self._symbol_pos[s] for s in symbols], dtype=int)
+
+    def _field_list(self, fields):
+        if fields is None:
+            return self.fields
+        return [f for f in fields if f in self._data]
+
+    # --------------------------------------------------------------------------------------------------------
+    # Get Data
+    def get_ts(self, field, symbols=None, start_date=None, end_date=None):
+        """
+        Get time series data of single field.
+
+        Returns
+        -------
+        res : pd.DataFrame
+            Index is int date, column is symbol.
+
+        """
+        sl = self.date_slice(start_date, end_date)
+        symbols, col_idx = self._symbol_index(symbols)
+        arr = self._data[field][sl][:, col_idx]
+
+        res = pd.DataFrame(index=pd.Index(self.dates[sl], name=self.index_name),
+                           columns=pd.Index(symbols, name=self.SYMBOL_LEVEL_NAME),
+                           data=arr)
+        return res
+
+    def get(self, fields=None, symbols=None, start_date=None, end_date=None):
+        """
+        Get data of several fields.
+
+        Parameters
+        ----------
+        fields : list of str or None
+            None for all fields.
+        symbols : list of str or None
+            None for all symbols.
+        start_date : int or None
+        end_date : int or None
+
+        Returns
+        -------
+        res : pd.DataFrame
+            index is date, columns are (symbol, field) MultiIndex
+
+        """
+        sl = self.date_slice(start_date, end_date)
+        idx = pd.Index(self.dates[sl], name=self.index_name)
+        fields = self._field_list(fields)
+        symbols, col_idx = self._symbol_index(symbols)
+
+        if not fields or not len(symbols):
+            return pd.DataFrame(index=idx)
+
+        dic = {field: pd.DataFrame(index=idx, columns=symbols, data=self._data[field][sl][:, col_idx])
+               for field in fields}
+        res = pd.concat(dic, axis=1, keys=fields)
+        res.columns = res.columns.swaplevel()
+        res.columns.names = [self.SYMBOL_LEVEL_NAME, self.FIELD_LEVEL_NAME]
+        res = res.reindex(columns=pd.MultiIndex.from_product([symbols, fields],
+                                                             names=res.columns.names))
+        return res
+
+    def get_snapshot(self, date, fields=None, symbols=None):
+        """
+        Get cross-section data at date.
+
+        Returns
+        -------
+        res : pd.DataFrame or None
+            symbol as index, field as columns. None if date is not in dates.
+
+        """
+        pos = self.date_pos(date)
+        if pos < 0:
+            return None
+        fields = self._field_list(fields)
+        symbols, col_idx = self._symbol_index(symbols)
+
+        dic = {field: self._data[field][pos, col_idx] for field in fields}
+        res = pd.DataFrame(index=pd.Index(symbols, name=self.SYMBOL_LEVEL_NAME), data=dic,
+                           columns=pd.Index(fields, name=self.FIELD_LEVEL_NAME))
+        return res
+
+    def to_frame(self):
+        """
+        Convert to a DataFrame with (symbol, field) MultiIndex columns, which is the format of DataView.data_d.
+
+        Returns
+        -------
+        pd.DataFrame
+
+        """
+        res = self.get()
+        res = res.sort_index(axis=1)
+        return res
+
+
+class BlockFrame(object):
+    """
+    A DataFrame with (symbol, field) MultiIndex columns, whose newly added fields are kept
+    as separate blocks and whose removed fields are only marked, until the whole frame is needed.
+
+    Adding or removing a field costs only the size of that field. All pending changes are
+    merged into the frame with one concat and one sort when frame is accessed.
+
+    """
+    def __init__(self, df=None):
+        self._base = df
+        self._blocks = dict()
+        self._removed = set()
+
+        self._symbols = None
+        self._base_fields = set()
+        if df is not None:
+            self._symbols = pd.Index(df.columns.get_level_values(ColumnarPanel.SYMBOL_LEVEL_NAME).unique(),
+                                     name=ColumnarPanel.SYMBOL_LEVEL_NAME).sort_values()
+            self._base_fields = set(df.columns.get_level_values(ColumnarPanel.FIELD_LEVEL_NAME))
+
+    @property
+    def is_empty(self):
+        return self._base is None
+
+    @property
+    def base(self):
+        """Frame without pending changes. Index and symbols are always the same as frame."""
+        return self._base
+
+    @property
+    def symbols(self):
+        return self._symbols
+
+    @property
+    def frame(self):
+        """Frame with all pending changes merged."""
+        if self._blocks or self._removed:
+            self._consolidate()
+        return self._base
+
+    def is_clean(self, fields):
+        """
+        Whether none of fields has pending changes, so they can be read from base directly.
+
+        Parameters
+        ----------
+        fields : list of str or slice
+            slice(None) for all fields.
+
+        """
+        if not (self._blocks or self._removed):
+            return True
+        if isinstance(fields, slice):
+            return False
+        return not any((f in self._blocks or f in self._removed) for f in fields)
+
+    def get_block(self, field):
+        """Return pending block of field (index is date, column is symbol), or None."""
+        return self._blocks.get(field, None)
+
+    def add(self, field, df):
+        """
+        Add a new field. df is re-indexed to index and symbols of the frame.
+
+        Parameters
+        ----------
+        field : str
+        df : pd.DataFrame
+            Index is date, column is symbol.
+
+        """
+        if not (df.index.equals(self._base.index) and df.columns.equals(self._symbols)):
+            df = df.reindex(index=self._base.index, columns=self._symbols)
+        else:
+            df = df.copy(deep=False)
+        # same index and column names as fields read from the frame, e.g. trade_date and symbol
+        df.index = self._base.index
+        df.columns = self._symbols
+        self._blocks[field] = df
+
+    def remove(self, field):
+        self._blocks.pop(field, None)
+        if field in self._base_fields:
+            self._removed.add(field)
+
+    def _consolidate(self):
+        df = self._base
+        if self._removed:
+            df = df.drop(list(self._removed), axis=1, level=ColumnarPanel.FIELD_LEVEL_NAME)
+            self._base_fields -= self._removed
+
+        if self._blocks:
+            new = pd.concat(self._blocks, axis=1)
+            new.columns = new.columns.swaplevel()
+            new.columns.names = df.columns.names
+            df = pd.concat([df, new], axis=1)
+            self._base_fields |= set(self._blocks.keys())
+
+        df = df.sort_index(axis=1)
+        self._base = df
+        self._blocks = dict()
+        self._removed = set()
+
+
+def _frame_blocks(df):
+    """Yield (column positions, values of shape (n_columns, n_rows)) of each 2-D numpy block of df, no copy."""
+    mgr = df._mgr if hasattr(df, '_mgr') else df._data
+    for block in mgr.blocks:
+        values = block.values
+        if isinstance(values, np.ndarray) and values.ndim == 2:
+            yield np.asarray(block.mgr_locs.as_array), values
+
+
+class SnapshotIndex(object):
+    """
+    Cross-section (symbol x field) data of each date, read straight from date-major arrays.
+
+    Data is kept as blocks of shape (n_dates, n_symbols, n_fields), one block for fields of the same dtype.
+    A snapshot is the [date] slice of blocks, so get costs O(n_symbols x n_fields) at most
+    and no DataFrame is kept for each date.
+
+    Blocks are views of the source whenever possible: ColumnarPanel fields are never copied, and
+    fields of a DataFrame are read from the same-dtype blocks pandas keeps them in.
+    Only fields whose pandas block does not hold all symbols of them in (symbol, field) order,
+    e.g. a field with different dtypes among symbols, are copied.
+
+    """
+    def __init__(self, dates, symbols, index_name='trade_date'):
+        self.dates = np.asarray(dates)
+        self.symbols = list(symbols)
+        self.index_name = index_name
+
+        self._symbol_pos = {s: i for i, s in enumerate(self.symbols)}
+        self._blocks = []
+        self._field_pos = dict()
+
+    @classmethod
+    def from_frame(cls, df):
+        """
+        Parameters
+        ----------
+        df : pd.DataFrame
+            index is date, columns is (symbol, field) MultiIndex. Dates must be sorted.
+
+        """
+        symbols = df.columns.get_level_values(ColumnarPanel.SYMBOL_LEVEL_NAME).unique().sort_values()
+        fields = df.columns.get_level_values(ColumnarPanel.FIELD_LEVEL_NAME).unique().sort_values()
+        index = cls(df.index.values, symbols, index_name=df.index.name)
+
+        full_columns = pd.MultiIndex.from_product([symbols, fields], names=df.columns.names)
+        if not df.columns.equals(full_columns):
+            df = df.reindex(columns=full_columns)
+
+        n_symbols, n_fields = len(symbols), len(fields)
+        viewed = set()
+        for locs, values in _frame_blocks(df):
+            # column position of (symbol i, field j) is i * n_fields + j
+            field_pos = np.unique(locs % n_fields)
+            expected = (np.arange(n_symbols)[:, np.newaxis] * n_fields + field_pos).ravel()
+            if len(locs) == len(expected) and (locs == expected).all():
+                # values is (n_columns, n_dates), its transpose is split into symbols x fields without copy
+                arr = values.T.reshape(len(df), n_symbols, len(field_pos))
+                index._add_block([fields[j] for j in field_pos], arr)
+                viewed.update(field_pos.tolist())
+
+        rest = [fields[j] for j in range(n_fields) if j not in viewed]
+        if rest:
+            dtypes = df.dtypes.groupby(level=ColumnarPanel.FIELD_LEVEL_NAME).first().loc[rest]
+            for _, block_fields in dtypes.groupby(dtypes.astype(str)):
+                block_fields = list(block_fields.index)
+                cols = pd.MultiIndex.from_product([symbols, block_fields])
+                arr = df.loc[:, cols].values
+                index._add_block(block_fields, arr.reshape(len(df), n_symbols, len(block_fields)))
+        return index
+
+    @classmethod
+    def from_panel(cls, panel):
+        """Use arrays of a ColumnarPanel, no copy."""
+        index = cls(panel.dates, panel.symbols, index_name=panel.index_name)
+        for field in panel.fields:
+            index._add_block([field], panel.get_field(field)[:, :, np.newaxis])
+        return index
+
+    def _add_block(self, fields, arr):
+        for i, field in enumerate(fields):
+            self._field_pos[field] = (len(self._blocks), i)
+        self._blocks.append((fields, arr))
+
+    @property
+    def fields(self):
+        return sorted(self._field_pos.keys())
+
+    def date_pos(self, date):
+        """Position of date in dates, or -1 if not found."""
+        pos = np.searchsorted(self.dates, date)
+        if pos < len(self.dates) and self.dates[pos] == date:
+            return pos
+        return -1
+
+    def _plan(self, fields, symbols):
+        """Decide symbols, fields and which part of each block to read, shared by all dates."""
+        if symbols is None:
+            symbols, col_idx = self.symbols, slice(None)
+        else:
+            symbols = [s for s in symbols if s in self._symbol_pos]
+            col_idx = np.array([self._symbol_pos[s] for s in symbols], dtype=int)
+
+        if fields is None:
+            fields = self.fields
+        else:
+            fields = [f for f in fields if f in self._field_pos]
+
+        block_fields = dict()
+        for field in fields:
+            block_no, pos = self._field_pos[field]
+            block_fields.setdefault(block_no, []).append(pos)
+
+        reads = []
+        for block_no, positions in sorted(block_fields.items()):
+            block_field_list, arr = self._blocks[block_no]
+            if positions == list(range(len(block_field_list))):
+                reads.append((arr, slice(None), block_field_list))
+            else:
+                reads.append((arr, positions, [block_field_list[i] for i in positions]))
+
+        symbol_index = pd.Index(symbols, name=ColumnarPanel.SYMBOL_LEVEL_NAME)
+        return symbol_index, col_idx, fields, reads
+
+    @staticmethod
+    def _read(pos, plan):
+        symbol_index, col_idx, fields, reads = plan
+        dfs = []
+        for arr, positions, read_fields in reads:
+            values = arr[pos]
+            if not isinstance(col_idx, slice):
+                values = values[col_idx]
+            if not isinstance(positions, slice):
+                values = values[:, positions]
+            if np.may_share_memory(values, arr):
+                # snapshots are modified by strategies, never return a view of data of all dates
+                values = values.copy()
+            dfs.append(pd.DataFrame(values, index=symbol_index, columns=read_fields, copy=False))
+
+        if len(dfs) == 1:
+            res = dfs[0]
+            if list(res.columns) != fields:
+                res = res.loc[:, fields]
+        elif dfs:
+            res = pd.concat(dfs, axis=1).loc[:, fields]
+        else:
+            res = pd.DataFrame(index=symbol_index, columns=fields)
+        res.columns.name = ColumnarPanel.FIELD_LEVEL_NAME
+        return res
+
+    def get(self, date, fields=None, symbols=None):
+        """
+        Get cross-section data at date.
+
+        Parameters
+        ----------
+        date : int
+        fields : list of str or None
+            None for all fields.
+        symbols : list of str or None
+            None for all symbols.
+
+        Returns
+        -------
+        res : pd.DataFrame or None
+            symbol as index, field as columns. None if date is not in dates.
+            A copy, modifying it does not change the source.
+
+        """
+        pos = self.date_pos(date)
+        if pos < 0:
+            return None
+        return self._read(pos, self._plan(fields, symbols))
+
+    def iter_dates(self, start_date=None, end_date=None, fields=None, symbols=None):
+        """
+        Iterate over snapshots of consecutive dates within [start_date, end_date].
+
+        Yields
+        ------
+        date : int
+        res : pd.DataFrame
+            Same as get(date, fields, symbols).
+
+        """
+        start = 0 if start_date is None else np.searchsorted(self.dates, start_date, side='left')
+        end = len(self.dates) if end_date is None else np.searchsorted(self.dates, end_date, side='right')
+
+        plan = self._plan(fields, symbols)
+        for pos in range(start, end):
+            yield self.dates[pos], self._read(pos, plan)
@@ -0,0 +1,195 @@
+# encoding: utf-8
+"""
+Evaluate formulas of DataView in a pool of processes.
+
+Input DataFrames are saved once as .npy files in a temporary folder. Workers open them with
+np.load(mmap_mode='c'), so inputs are shared through the page cache instead of being pickled
+to every worker, and in-place modification in a worker never reaches other workers.
+
+Formulas which only use column-wise functions (time series and element-wise operations) are
+further split into blocks of symbols. Every worker evaluates exactly what serial evaluation does
+on its own columns, so the result is the same as Parser.evaluate on the whole DataFrame.
+
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+from jaqs.data.py_expression_eval import Parser
+
+
+# functions which work on each column (symbol) independently
+COLUMN_WISE_FUNCTIONS = {'Ts_Sum', 'Ts_Product', 'CountNans', 'StdDev', 'Covariance', 'Correlation', 'Corr',
+                         'Delay', 'Delta', 'Return', 'Ts_Mean', 'Ts_Min', 'Ts_Max', 'Ts_Skewness', 'Ts_Kurtosis',
+                         'Ts_Rank', 'Ts_Percentile', 'Ts_Quantile', 'Ewma', 'Sma', 'Decay_linear', 'Decay_exp',
+                         'Return_Abs', 'Return_Fwd', 'Min', 'Max', 'Pow', 'SignedPower', 'IsNan', 'FillNan',
+                         'If', 'Tail'}
+_COLUMN_WISE_FUNCTIONS_LOWER = {name.lower() for name in COLUMN_WISE_FUNCTIONS}
+
+_ANN_DTS = '__ann_dts__'
+_INDEX_MEMBER = '__index_member__'
+
+
+def is_column_wise(expr, values, trade_dts):
+    """
+    Whether expr can be evaluated on blocks of columns separately.
+
+    Parameters
+    ----------
+    expr : Expression
+    values : dict
+        Variables of expr.
+    trade_dts : np.ndarray
+
+    Returns
+    -------
+    bool
+
+    """
+    columns = None
+    for var in expr.variables():
+        if var in values:
+            df = values[var]
+            # frequency alignment of quarterly data is done with all symbols
+            if len(df) != len(trade_dts):
+                return False
+            if columns is None:
+                columns = df.columns
+            elif not df.columns.equals(columns):
+                return False
+        elif var in expr.functions:
+            if var.lower() not in _COLUMN_WISE_FUNCTIONS_LOWER:
+                return False
+        else:
+            return False
+    return True
+
+
+class SharedFrames(object):
+    """
+    DataFrames saved in a temporary folder, to be opened by worker processes as memory-mapped arrays.
+    Frames of object dtype can not be memory-mapped and are pickled as they are.
+
+    """
+    def __init__(self):
+        self.folder = tempfile.mkdtemp(prefix='jaqs_shared_')
+        self.meta = dict()
+
+    def add(self, name, df):
+        if df is None or df.values.dtype == object:
+            self.meta[name] = df
+            return
+        path = os.path.join(self.folder, '{:d}.npy'.format(len(self.meta)))
+        np.save(path, df.values)
+        self.meta[name] = (path, df.index, df.columns)
+
+    def close(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+
+def _open_frame(meta):
+    if meta is None or isinstance(meta, pd.DataFrame):
+        return meta
+    path, index, columns = meta
+    return pd.DataFrame(index=index, columns=columns, data=np.load(path, mmap_mode='c'))
+
+
+def _take_columns(df, col_slice):
+    if df is None or col_slice is None:
+        return df
+    return df.iloc[:, col_slice].copy()
+
+
+def _evaluate_task(task):
+    formula, formula_func_name_style, frames, var_names, trade_dts, col_slice = task
+
+    values = {name: _take_columns(_open_frame(frames[name]), col_slice) for name in var_names}
+    ann_dts = _take_columns(_open_frame(frames[_ANN_DTS]), col_slice)
+    index_member = _take_columns(_open_frame(frames[_INDEX_MEMBER]), col_slice)
+
+    parser = Parser()
+    parser.set_capital(formula_func_name_style)
+    parser.parse(formula)
+    return parser.evaluate(values, ann_dts=ann_dts, trade_dts=trade_dts, index_member=index_member)
+
+
+def evaluate_formulas(formulas, values, ann_dts=None, trade_dts=None, index_member=None,
+                      formula_func_name_style='camel', n_jobs=None):
+    """
+    Evaluate independent formulas in a process pool.
+
+    Parameters
+    ----------
+    formulas : dict
+        Key is field name, value is formula. Formulas must not use each other
+        nor functions registered to a parser.
+    values : dict
+        Key is variable name, value is pd.DataFrame (index is date, column is symbol)
+    ann_dts : pd.DataFrame
+    trade_dts : np.ndarray
+    index_member : pd.DataFrame
+    formula_func_name_style : {'camel', 'upper', 'lower'}
+    n_jobs : int or None
+        Number of processes. None for number of CPUs.
+
+    Returns
+    -------
+    res : dict
+        Key is field name, value is pd.DataFrame, same as Parser.evaluate.
+
+    """
+    if not formulas:
+        return dict()
+    if n_jobs is None:
+        n_jobs = multiprocessing.cpu_count()
+
+    parser = Parser()
+    parser.set_capital(formula_func_name_style)
+
+    shared = SharedFrames()
+    try:
+        for name, df in values.items():
+            shared.add(name, df)
+        shared.add(_ANN_DTS, ann_dts)
+        shared.add(_INDEX_MEMBER, index_member)
+
+        tasks = []
+        task_names = []
+        for field_name, formula in formulas.items():
+            expr = parser.parse(formula)
+            var_names = [var for var in expr.variables() if var in values]
+
+            n_cols = len(values[var_names[0]].columns) if var_names else 0
+            if n_jobs > 1 and n_cols >= 2 * n_jobs and is_column_wise(expr, values, trade_dts):
+                bounds = np.linspace(0, n_cols, n_jobs + 1).astype(int)
+                col_slices = [slice(start, end) for start, end in zip(bounds[:-1], bounds[1:])]
+            else:
+                col_slices = [None]
+
+            for col_slice in col_slices:
+                tasks.append((formula, formula_func_name_style, shared.meta, var_names, trade_dts, col_slice))
+                task_names.append(field_name)
+
+        pool = multiprocessing.Pool(processes=min(n_jobs, len(tasks)))
+        try:
+            task_results = pool.map(_evaluate_task, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        shared.close()
+
+    blocks = dict()
+    for field_name, df in zip(task_names, task_results):
+        blocks.setdefault(field_name, []).append(df)
+
+    res = dict()
+    for field_name, dfs in blocks.items():
+        res[field_name] = dfs[0] if len(dfs) == 1 else pd.concat(dfs, axis=1)
+    return res
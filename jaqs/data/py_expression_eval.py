@@ -23,6 +23,7 @@ from __future__ import division
 from __future__ import print_function
 
 import math
+from collections import OrderedDict
 
 import numpy as np
 import pandas as pd
@@ -246,6 +247,157 @@ class Token(object):
             return 'Invalid Token'
 
 
+class Node(object):
+    """
+    Node of a compiled expression DAG.
+
+    Nodes with the same key compute the same value from the same input variables,
+    so key can be used to share intermediate results between formulas.
+
+    Attributes
+    ----------
+    type_ : int
+        One of TNUMBER, TVAR, TOP1, TOP2, TFUNCALL.
+    index_ : object
+        Number (TNUMBER), variable or function name (TVAR), operator (TOP1, TOP2). None for TFUNCALL.
+    children : tuple of Node
+        Operands. For TFUNCALL, the function and its argument(s).
+    key : tuple
+        Hashable structural key of the whole sub-expression.
+
+    """
+    __slots__ = ['type_', 'index_', 'children', 'key']
+
+    def __init__(self, type_, index_, children=()):
+        self.type_ = type_
+        self.index_ = index_
+        self.children = tuple(children)
+
+        if type_ == TNUMBER:
+            value = index_
+            if isinstance(value, list):
+                value = tuple(value)
+            key_index = (type(value).__name__, value)
+        else:
+            key_index = index_
+        self.key = (type_, key_index, tuple(c.key for c in self.children))
+
+    @property
+    def cacheable(self):
+        """Operators and function calls, except ',' which only builds argument lists."""
+        if self.type_ == TOP2:
+            return self.index_ != ','
+        return self.type_ in (TOP1, TFUNCALL)
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __eq__(self, other):
+        return isinstance(other, Node) and self.key == other.key
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+
+class ExpressionCache(object):
+    """
+    Bounded cache of intermediate results of expressions, keyed by node key.
+
+    Least recently used results are dropped when total memory of cached results exceeds max_bytes,
+    or number of cached results exceeds max_items.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Memory limit of cached values, in bytes.
+    max_items : int or None
+        Limit of number of cached values. None for no limit.
+
+    Attributes
+    ----------
+    hits : int
+    misses : int
+    evictions : int
+
+    """
+    def __init__(self, max_bytes=512 * 1024 ** 2, max_items=None):
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+
+        self._data = OrderedDict()
+        self._nbytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _sizeof(value):
+        if isinstance(value, pd.DataFrame):
+            return int(value.memory_usage(index=True).sum())
+        elif isinstance(value, pd.Series):
+            return int(value.memory_usage(index=True))
+        elif isinstance(value, np.ndarray):
+            return int(value.nbytes)
+        return 0
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key):
+        """
+        Return a copy of the cached value, or None if key is not cached.
+        A copy is returned because many functions modify their arguments in place.
+
+        """
+        if key not in self._data:
+            self.misses += 1
+            return None
+        self.hits += 1
+        item = self._data.pop(key)
+        self._data[key] = item
+        return item[0].copy()
+
+    def put(self, key, value):
+        """Store a copy of value. Values larger than max_bytes are not cached."""
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+        if key in self._data:
+            self._nbytes -= self._data.pop(key)[1]
+
+        self._data[key] = (value.copy(), size)
+        self._nbytes += size
+
+        while self._data and (self._nbytes > self.max_bytes
+                              or (self.max_items is not None and len(self._data) > self.max_items)):
+            _, (_, size_old) = self._data.popitem(last=False)
+            self._nbytes -= size_old
+            self.evictions += 1
+
+    def clear(self):
+        self._data.clear()
+        self._nbytes = 0
+
+    def stats(self):
+        """
+        Returns
+        -------
+        dict
+            hits, misses, evictions, number of items and bytes of the cache.
+
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'items': len(self._data), 'nbytes': self._nbytes}
+
+
 class Parser(object):
     def __init__(self):
         self.success = False
@@ -620,34 +772,25 @@ class Parser(object):
     def ts_skew(self, x, n):
         return x.rolling(n).skew()
     
+    @staticmethod
+    def _like(df, arr):
+        """Wrap result array of rolling kernels with index and columns of df."""
+        if isinstance(df, pd.Series):
+            return pd.Series(index=df.index, data=arr, name=df.name)
+        return pd.DataFrame(index=df.index, columns=df.columns, data=arr)
+
     def ts_product(self, x, n):
-        return x.rolling(n).apply(np.product)
+        return self._like(x, numeric.rolling_product(x.values, n))
     
     @staticmethod
     def ts_rank(df, window):
-        """Return a DataFrame with values ranging from 0.0 to 1.0"""
-        roll = df.rolling(window=window)
-    
-        def _rank_arr(arr, norm=1.0):
-            norm = norm * 1.0
-            ranks = np.argsort(np.argsort(arr))[-1] + 1
-            return ranks / norm
-    
-        res = roll.apply(_rank_arr)
-        return res
+        """Return a DataFrame with rank of the last value in each window, ranging from 1 to window"""
+        return Parser._like(df, numeric.rolling_rank(df.values, window))
 
     @staticmethod
     def ts_percentile(df, window):
         """Return a DataFrame with values ranging from 0.0 to 1.0"""
-        roll = df.rolling(window=window)
-    
-        def _rank_arr(arr, norm=1.0):
-            norm = norm * 1.0
-            ranks = np.argsort(np.argsort(arr))[-1] + 1
-            return ranks / norm
-    
-        res = roll.apply(_rank_arr, kwargs={'norm': window})
-        return res
+        return Parser._like(df, numeric.rolling_rank(df.values, window) / window)
 
     # Time Series Two Parameters
     def corr(self, x, y, n):
@@ -693,10 +836,12 @@ class Parser(object):
         return np.dot(x, step) / np.sum(step)
     
     def decay_linear(self, x, n):
-        return x.rolling(n).apply(self.decay_linear_array)
+        weights = np.arange(1, int(n) + 1)
+        return self._like(x, numeric.rolling_weighted_sum(x.values, weights) / np.sum(weights))
     
     def decay_exp(self, x, f, n):
-        return x.rolling(n).apply(self.decay_exp_array, args=[f])
+        weights = np.power(f, np.arange(int(n))[::-1])
+        return self._like(x, numeric.rolling_weighted_sum(x.values, weights) / np.sum(weights))
     
     @staticmethod
     def is_nan(df):
@@ -792,38 +937,29 @@ class Parser(object):
         rank = rank_with_mask(df, axis=1, normalize=True)
         return rank
     
+    @staticmethod
+    def _group_codes(df, group):
+        """Integer codes of group (like industry) for each cell of df. -1 for no group."""
+        if not (group.index.equals(df.index) and group.columns.equals(df.columns)):
+            group = group.reindex(index=df.index, columns=df.columns)
+        return numeric.encode_groups(group.values)
+
     # TODO: all cross-section operations support in-group modification: neutral, extreme values, standardize.
     def group_rank(self, df, group, mask=None):
         df = self._align_univariate(df)
         df = self._mask_non_index_member(df)
         df = self._mask_df(df, mask)
         
-        vals = np.unique(pd.Series(group.values.flatten()).dropna())
-        res = None
-        for val in vals:
-            mask = (group == val)
-            rank = rank_with_mask(df, mask=mask, axis=1, normalize=False)
-            if res is None:
-                res = rank
-            else:
-                res = res.fillna(rank)
-        return res
+        res_arr = numeric.rank_with_groups(df.values, self._group_codes(df, group), normalize=False)
+        return pd.DataFrame(index=df.index, columns=df.columns, data=res_arr)
     
     def group_percentile(self, df, group, mask=None):
         df = self._align_univariate(df)
         df = self._mask_non_index_member(df)
         df = self._mask_df(df, mask)
         
-        vals = np.unique(pd.Series(group.values.flatten()).dropna())
-        res = None
-        for val in vals:
-            mask = (group == val)
-            rank = rank_with_mask(df, mask=mask, axis=1, normalize=True)
-            if res is None:
-                res = rank
-            else:
-                res = res.fillna(rank)
-        return res
+        res_arr = numeric.rank_with_groups(df.values, self._group_codes(df, group), normalize=True)
+        return pd.DataFrame(index=df.index, columns=df.columns, data=res_arr)
     
     def ts_quantile(self, df, window=3, n_quantiles=5):
         roll = df.rolling(window=window)
@@ -868,16 +1004,8 @@ class Parser(object):
         df = self._mask_non_index_member(df)
         df = self._mask_df(df, mask)
 
-
-        res = None
-        groups = np.unique(pd.Series(group.values.flatten()).dropna())
-        for val in groups:
-            val_res = self.to_quantile(df[group == val], n_quantiles=n_quantiles)
-            if res is None:
-                res = val_res
-            else:
-                res = res.fillna(val_res)
-        return res
+        res_arr = numeric.quantilize_with_groups(df.values, self._group_codes(df, group), n_quantiles=n_quantiles)
+        return pd.DataFrame(index=df.index, columns=df.columns, data=res_arr)
 
     '''
         def group_apply(self, func, df_arg, *args, **kwargs):
@@ -1191,7 +1319,84 @@ class Parser(object):
         self.tokens = tokenstack
         return Expression(tokenstack, self.ops1, self.ops2, self.functions)
     
-    def evaluate(self, values, ann_dts=None, trade_dts=None, index_member=None):
+    def compile(self):
+        """
+        Compile tokens of the last parsed expression into a DAG.
+        Identical sub-expressions are compiled into one Node.
+
+        Returns
+        -------
+        Node
+            Root of the DAG.
+
+        """
+        nodes = dict()
+
+        def make_node(type_, index_, children=()):
+            node = Node(type_, index_, children)
+            return nodes.setdefault(node.key, node)
+
+        nstack = []
+        for item in self.tokens:
+            type_ = item.type_
+            if type_ == TNUMBER:
+                nstack.append(make_node(TNUMBER, item.number_))
+            elif type_ == TOP2:
+                n2 = nstack.pop()
+                n1 = nstack.pop()
+                nstack.append(make_node(TOP2, item.index_, (n1, n2)))
+            elif type_ == TVAR:
+                nstack.append(make_node(TVAR, item.index_))
+            elif type_ == TOP1:
+                n1 = nstack.pop()
+                nstack.append(make_node(TOP1, item.index_, (n1,)))
+            elif type_ == TFUNCALL:
+                n1 = nstack.pop()
+                f = nstack.pop()
+                nstack.append(make_node(TFUNCALL, None, (f, n1)))
+            else:
+                raise Exception('invalid Expression')
+        if len(nstack) > 1:
+            raise Exception('invalid Expression (parity)')
+        return nstack[0]
+
+    def _evaluate_node(self, node, values, cache, context):
+        type_ = node.type_
+        if type_ == TNUMBER:
+            return node.index_
+        elif type_ == TVAR:
+            if node.index_ in values:
+                return values[node.index_]
+            elif node.index_ in self.functions:
+                return self.functions[node.index_]
+            else:
+                raise Exception('undefined variable: ' + node.index_)
+
+        key = (context, node.key)
+        if node.cacheable:
+            res = cache.get(key)
+            if res is not None:
+                return res
+
+        args = [self._evaluate_node(child, values, cache, context) for child in node.children]
+        if type_ == TOP2:
+            res = self.ops2[node.index_](*args)
+        elif type_ == TOP1:
+            res = self.ops1[node.index_](*args)
+        else:
+            f, n1 = args
+            if not callable(f):
+                raise Exception(f + ' is not a function')
+            if type(n1) is list:
+                res = f(*n1)
+            else:
+                res = f(n1)
+
+        if node.cacheable and isinstance(res, (pd.DataFrame, pd.Series)):
+            cache.put(key, res)
+        return res
+
+    def evaluate(self, values, ann_dts=None, trade_dts=None, index_member=None, cache=None):
         """
         Evaluate the value of expression using. Data of different frequency will be automatically expanded.
         
@@ -1204,6 +1409,10 @@ class Parser(object):
         trade_dts : np.ndarray
             The date index of result.
         index_member : pd.DataFrame
+        cache : ExpressionCache, optional
+            If not None, the expression is compiled into a DAG and intermediate results are
+            looked up in / stored into cache. The same cache must only be used with the same values,
+            ann_dts and trade_dts.
 
         Returns
         -------
@@ -1215,6 +1424,11 @@ class Parser(object):
         self.index_member = index_member
         
         values = values or {}
+        if cache is not None:
+            # results of cross-section functions depend on whether index_member is provided
+            context = index_member is not None
+            return self._evaluate_node(self.compile(), values, cache, context)
+
         nstack = []
         L = len(self.tokens)
         for i in range(0, L):
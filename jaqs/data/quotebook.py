@@ -0,0 +1,105 @@
+# encoding: utf-8
+"""
+Latest live quotes of subscribed symbols, shared by the thread receiving quotes and the
+thread consuming them.
+
+"""
+from __future__ import print_function
+
+import threading
+import collections
+
+from jaqs.data.basic import SlotQuote
+
+
+class QuoteBook(object):
+    """
+    One SlotQuote for each symbol, updated in place, and a queue of symbols whose latest
+    quote has not been taken yet.
+
+    A symbol updated again before its quote is taken stays at its place in the queue, so a
+    consumer that falls behind gets the latest quote of each symbol once, instead of every
+    intermediate quote.
+
+    Attributes
+    ----------
+    n_updates : int
+        Number of quotes received.
+    n_coalesced : int
+        Number of quotes merged into a quote not taken yet.
+
+    """
+    def __init__(self):
+        self.n_updates = 0
+        self.n_coalesced = 0
+        self._lock = threading.Lock()
+        self._quotes = dict()
+        self._pending = collections.deque()
+        self._pending_set = set()
+
+    def __len__(self):
+        """Number of symbols whose latest quote has not been taken."""
+        return len(self._pending)
+
+    def update(self, decoder, quote_ind):
+        """
+        Write a jsq.quote_ind message into the quote of its symbol.
+
+        Parameters
+        ----------
+        decoder : jaqs.data.dataapi.quote_decoder.QuoteDecoder
+        quote_ind : dict
+
+        Returns
+        -------
+        bool
+            True if the symbol is newly queued, False if it was already queued or the message is ignored.
+
+        """
+        symbol = decoder.get_symbol(quote_ind)
+        if symbol is None:
+            return False
+
+        with self._lock:
+            quote = self._quotes.get(symbol, None)
+            if quote is None or quote.DECODER is not decoder:
+                # first quote of symbol, or schema changed after subscribing again
+                quote = self._quotes[symbol] = decoder.new_quote(SlotQuote)
+            decoder.decode_into(quote_ind, quote)
+            self.n_updates += 1
+
+            if symbol in self._pending_set:
+                self.n_coalesced += 1
+                return False
+            self._pending_set.add(symbol)
+            self._pending.append(symbol)
+            return True
+
+    def pop(self):
+        """
+        Returns
+        -------
+        SlotQuote or None
+            A copy of the latest quote of the symbol queued first, None if no quote is queued.
+
+        """
+        with self._lock:
+            if not self._pending:
+                return None
+            symbol = self._pending.popleft()
+            self._pending_set.discard(symbol)
+            return self._quotes[symbol].copy()
+
+    def pop_all(self):
+        """Copies of latest quotes of all queued symbols, in the order they were queued."""
+        with self._lock:
+            quotes = [self._quotes[symbol].copy() for symbol in self._pending]
+            self._pending.clear()
+            self._pending_set.clear()
+        return quotes
+
+    def get(self, symbol):
+        """A copy of the latest quote of symbol whether it is queued or not, None if never received."""
+        with self._lock:
+            quote = self._quotes.get(symbol, None)
+            return quote.copy() if quote is not None else None
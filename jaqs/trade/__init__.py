@@ -5,16 +5,20 @@ Basic data types, classes and models for trade.
 """
 
 from .tradeapi import TradeApi
-from .backtest import AlphaBacktestInstance, EventBacktestInstance
+from .backtest import AlphaBacktestInstance, VectorizedAlphaBacktestInstance, EventBacktestInstance
 from .portfoliomanager import PortfolioManager
 from .livetrade import EventLiveTradeInstance, AlphaLiveTradeInstance
 from .strategy import Strategy, AlphaStrategy, EventDrivenStrategy
 from .tradegateway import BaseTradeApi, RealTimeTradeApi, AlphaTradeApi, BacktestTradeApi
+from .tradegateway import FillModel, ParticipationFillModel
+from .sweep import ParameterSweep
 
 
 __all__ = ['TradeApi',
-           'AlphaBacktestInstance', 'EventBacktestInstance',
+           'AlphaBacktestInstance', 'VectorizedAlphaBacktestInstance', 'EventBacktestInstance',
            'PortfolioManager',
            'EventLiveTradeInstance', 'AlphaLiveTradeInstance',
            'Strategy', 'AlphaStrategy', 'EventDrivenStrategy',
-           'BaseTradeApi', 'RealTimeTradeApi', 'AlphaTradeApi', 'BacktestTradeApi']
+           'BaseTradeApi', 'RealTimeTradeApi', 'AlphaTradeApi', 'BacktestTradeApi',
+           'FillModel', 'ParticipationFillModel',
+           'ParameterSweep']
@@ -16,8 +16,11 @@ import pandas as pd
 import datetime as dt
 
 from jaqs.trade import common
-from jaqs.data.basic import Bar
+from jaqs.data.basic import BarReplay
+from jaqs.data.barsource import DataViewBarSource, DataApiBarSource, BarStoreBarSource, BarPrefetcher
+from jaqs.data.barstore import BarStore
 from jaqs.data.basic import Trade
+from jaqs.trade.ledger import TradeLedger
 import jaqs.util as jutil
 from functools import reduce
 
@@ -42,6 +45,60 @@ def generate_cash_trade_ind(symbol, amount, date, time=200000):
         trade_ind.entrust_action = common.ORDER_ACTION.SELL
         trade_ind2.entrust_action = common.ORDER_ACTION.BUY
     return trade_ind, trade_ind2
+
+
+_ACTION_SIGN = dict()
+for _action in common.ORDER_ACTION:
+    _ACTION_SIGN[_action.value] = _ACTION_SIGN[str(_action)] = 1 if common.ORDER_ACTION.is_positive(_action) else -1
+
+
+def calc_daily_value(df_trades, df_close, init_balance, end_date=0):
+    """
+    Daily cash, market value and total value of a portfolio from its trades and close prices.
+
+    Parameters
+    ----------
+    df_trades : pd.DataFrame
+        Same format as PortfolioManager.get_trades_df.
+    df_close : pd.DataFrame
+        Close price (not adjusted), index is trade date, column is symbol.
+    init_balance : float
+    end_date : int
+        Last date to evaluate, default is last date of df_close.
+
+    Returns
+    -------
+    pd.DataFrame
+        Index is trade date from the first trade date to end_date,
+        columns are cash, market_value, commission, total, pnl.
+
+    """
+    if end_date:
+        df_close = df_close.loc[df_close.index <= end_date]
+    if not len(df_trades) or not len(df_close):
+        return pd.DataFrame(columns=['cash', 'market_value', 'commission', 'total', 'pnl'], dtype=float)
+
+    direction = df_trades['entrust_action'].astype(str).map(_ACTION_SIGN).fillna(-1).values
+    size = df_trades['fill_size'].values.astype(float) * direction
+    commission = df_trades['commission'].values.astype(float)
+    df = pd.DataFrame({'trade_date': df_trades['trade_date'].values.astype(np.int64),
+                       'symbol': df_trades['symbol'].astype(str).values,
+                       'size': size,
+                       'commission': commission,
+                       'cash': -size * df_trades['fill_price'].values.astype(float) - commission})
+
+    dates = df_close.index
+    df_pos = df.pivot_table(index='trade_date', columns='symbol', values='size', aggfunc='sum')
+    df_pos = df_pos.reindex(index=dates, columns=df_close.columns).fillna(0.0).cumsum()
+    df_by_date = df.groupby('trade_date')[['cash', 'commission']].sum().reindex(dates).fillna(0.0)
+
+    res = pd.DataFrame(index=dates)
+    res['cash'] = df_by_date['cash'].cumsum() + init_balance
+    res['market_value'] = (df_pos * df_close.ffill()).sum(axis=1)
+    res['commission'] = df_by_date['commission']
+    res['total'] = res['cash'] + res['market_value']
+    res['pnl'] = res['total'] - res['total'].shift(1).fillna(init_balance)
+    return res.loc[dates >= df['trade_date'].min()]
     
 
 class BacktestInstance(six.with_metaclass(abc.ABCMeta)):
@@ -717,32 +774,15 @@ class AlphaBacktestInstance(BacktestInstance):
             self.univ_price_dic = self.ctx.snapshot.to_dict(orient='index')
             self.tmp_univ_price_dic_map[date] = self.univ_price_dic
 
+    def get_trades_df(self):
+        """All trades of the backtest, see PortfolioManager.get_trades_df."""
+        return self.ctx.pm.get_trades_df()
+
     def save_results(self, folder_path='.'):
         import os
-        import pandas as pd
         folder_path = os.path.abspath(folder_path)
     
-        trades = self.ctx.pm.trades
-    
-        type_map = {'task_id': str,
-                    'entrust_no': str,
-                    'entrust_action': str,
-                    'symbol': str,
-                    'fill_price': float,
-                    'fill_size': float,
-                    'fill_date': np.integer,
-                    'fill_time': np.integer,
-                    'fill_no': str,
-                    'commission': float,
-                    'trade_date': np.integer}
-        # keys = trades[0].__dict__.keys()
-        ser_list = dict()
-        for key in type_map.keys():
-            v = [t.__getattribute__(key) for t in trades]
-            ser = pd.Series(data=v, index=None, dtype=type_map[key], name=key)
-            ser_list[key] = ser
-        df_trades = pd.DataFrame(ser_list)
-        df_trades.index.name = 'index'
+        df_trades = self.get_trades_df()
     
         trades_fn = os.path.join(folder_path, 'trades.csv')
         configs_fn = os.path.join(folder_path, 'configs.json')
@@ -765,6 +805,335 @@ class AlphaBacktestInstance(BacktestInstance):
         print("float {:.2e}, frozen {:.2e}".format(market_value_float, market_value_frozen))
 
 
+class VectorizedAlphaBacktestInstance(AlphaBacktestInstance):
+    """
+    Backtest alpha strategy with matrix operations over (re-balance dates x symbols).
+    
+    For strategies whose portfolio is decided by weights only (pc_method in SUPPORTED_PC_METHODS)
+    and whose orders are all filled on the re-balance day. Trades are the same as AlphaBacktestInstance
+    (within float rounding), but daily snapshots, Trade objects and callbacks are not used.
+    
+    Universe filter, target weights, suspension / limit freezes and de-list dates are computed for all
+    re-balance dates at once. Positions of a re-balance depend on value of the last one, so lot rounding,
+    dividend adjustment and commission are computed date by date, on vectors of all symbols.
+    Stock selector and signal model, if any, are called once on each re-balance date.
+    
+    Attributes
+    ----------
+    rebalance_dates : np.ndarray
+    weights : pd.DataFrame
+        Target weights after freezes, index is re-balance date, column is symbol.
+    positions : pd.DataFrame
+        Position sizes after re-balance.
+    df_trades : pd.DataFrame
+        Same format as PortfolioManager.get_trades_df. PortfolioManager is not updated.
+    df_daily : pd.DataFrame
+        Daily cash, market value, commission, total value and PnL, see calc_daily_value.
+
+    """
+    SUPPORTED_PC_METHODS = ['equal_weight', 'index_weight', 'market_value_weight', 'factor_value_weight']
+    
+    def __init__(self):
+        super(VectorizedAlphaBacktestInstance, self).__init__()
+        
+        self.price_field = 'vwap'
+        self.rebalance_dates = None
+        self.weights = None
+        self.positions = None
+        self.df_trades = None
+        self.df_daily = None
+        
+        self._trade_columns = None
+    
+    def init_from_config(self, props):
+        super(VectorizedAlphaBacktestInstance, self).init_from_config(props)
+        strategy = self.ctx.strategy
+        
+        if strategy.pc_method not in self.SUPPORTED_PC_METHODS:
+            raise NotImplementedError("pc_method = {} is not supported by vectorized backtest".format(strategy.pc_method))
+        if props.get('participation_rate', None) is not None:
+            raise ValueError("Orders must be filled on the re-balance day in vectorized backtest, "
+                             "[participation_rate] is not supported.")
+        
+        # same as AlphaTradeApi.goal_portfolio
+        algo = strategy.match_method
+        if algo in ['', 'vwap']:
+            self.price_field = 'vwap'
+        elif algo.startswith('limit:'):
+            self.price_field = algo.split(':')[1].strip()
+        else:
+            raise NotImplementedError("goal_portfolio algo = {}".format(algo))
+        # same as AlphaTradeApi
+        self.commission_rate = props.get('commission_rate', 0.0)
+    
+    def _get_frame(self, field, dates, symbols):
+        dv = self.ctx.dataview
+        df = dv.get_ts(field, start_date=dv.dates[0], end_date=dv.dates[-1])
+        return df.reindex(index=dates, columns=symbols)
+    
+    def _get_rebalance_dates(self):
+        """Re-balance dates of run_alpha when every order is filled on the re-balance day."""
+        strategy = self.ctx.strategy
+        if strategy.period in ['week', 'month']:
+            date = self._get_first_period_day()
+        else:
+            date = self._get_next_trade_date(self.start_date)
+        
+        res = [date]
+        while True:
+            try:
+                if strategy.period == 'day':
+                    date = self._get_next_trade_date(date, strategy.n_periods)
+                else:
+                    date = self._get_next_period_day(date, strategy.period,
+                                                     n=strategy.n_periods, extra_offset=strategy.days_delay)
+            except (ValueError, IndexError):
+                break
+            if date > self.end_date:
+                break
+            res.append(date)
+        return np.array(res, dtype=np.int64)
+    
+    def _calc_weights(self, dates, last_dates, symbols):
+        """
+        Same as re_balance_plan_before_open on each re-balance date.
+        
+        Returns
+        -------
+        np.ndarray
+            Normalized weights, shape (len(dates), len(symbols)).
+
+        """
+        ctx = self.ctx
+        dv = ctx.dataview
+        strategy = ctx.strategy
+        
+        # Step.1 index members that are listed on re-balance dates
+        mask = np.ones((len(dates), len(symbols)), dtype=bool)
+        if dv.universe:
+            mask &= self._get_frame('index_member', dates, symbols).fillna(0).astype(bool).values
+        df_inst = dv.data_inst.reindex(symbols)
+        d = dates.reshape(-1, 1)
+        mask &= np.logical_and(d > df_inst['list_date'].values.astype(float),
+                               d < df_inst['delist_date'].values.astype(float))
+        
+        # Step.2 raw weights of portfolio construction method, using data of last trade date
+        pc_method = strategy.pc_method
+        if pc_method == 'market_value_weight':
+            if 'total_mv' in dv.fields:
+                mv_field = 'total_mv'
+            elif 'float_mv' in dv.fields:
+                mv_field = 'float_mv'
+            else:
+                raise ValueError("market_value_weight is chosen,"
+                                 "while no [float_mv] or [total_mv] field found in dataview.")
+            raw = self._get_frame(mv_field, last_dates, symbols).fillna(0.0).values
+        elif pc_method == 'index_weight':
+            if 'index_weight' not in dv.fields:
+                raise ValueError("index_weight is chosen,"
+                                 "while no [index_weight] field found in dataview.")
+            raw = self._get_frame('index_weight', last_dates, symbols).fillna(0.0).values
+        else:
+            raw = np.ones(mask.shape)
+        
+        # Step.3 stock selector and signal model use snapshot of last trade date
+        is_factor = pc_method == 'factor_value_weight'
+        if strategy.stock_selector is not None or is_factor:
+            trade_date = ctx.trade_date
+            for i, (date, last_date) in enumerate(zip(dates, last_dates)):
+                ctx.trade_date = date
+                ctx.snapshot = dv.get_snapshot(last_date)
+                if strategy.stock_selector is not None:
+                    mask[i] &= np.in1d(symbols, strategy.stock_selector.get_selection())
+                ctx.snapshot_sub = ctx.snapshot.loc[sorted(symbols[mask[i]]), :]
+                if is_factor:
+                    weights_sub_universe, _ = strategy.factor_value_weight()
+                    raw[i] = pd.Series(weights_sub_universe, dtype=float).reindex(symbols).values
+            ctx.trade_date = trade_date
+        
+        # weights given by signal model are not limited to sub-universe
+        w = raw if is_factor else np.where(mask, raw, np.nan)
+        w = np.where(np.isnan(w), 0.0, w)
+        w_sum = np.sum(np.abs(w), axis=1).reshape(-1, 1)
+        w = np.where(w_sum > 1e-8, w / np.where(w_sum > 1e-8, w_sum, 1.0), w)
+        if strategy.single_symbol_weight_limit < 1:
+            w = np.minimum(w, strategy.single_symbol_weight_limit)
+        return w
+    
+    def _calc_freezes(self, dates, symbols):
+        """
+        Returns
+        -------
+        frozen : np.ndarray of bool
+            Suspended or reaching limit on re-balance dates, shape (len(dates), len(symbols)).
+        n_frozen : np.ndarray
+            Number of frozen symbols of DataView on each date, as get_suspensions and get_limit_reaches.
+
+        """
+        all_symbols = self.ctx.dataview.symbol
+        df_status = self._get_frame('trade_status', dates, all_symbols)
+        df_limit = self._get_frame('_limit', dates, all_symbols)
+        df_frozen = (df_status == '停牌') | (df_limit > 9.5E-2)
+        return df_frozen.reindex(columns=symbols, fill_value=False).values, df_frozen.values.sum(axis=1)
+    
+    def _add_trades(self, task_id, entrust_no, action, symbol, price, size, date, time, fill_no, commission):
+        """Record trades, each argument is a list of values or a value for all trades."""
+        n = len(symbol)
+        values = [task_id, entrust_no, action, symbol, price, size, date, time, fill_no, commission, date]
+        for name, value in zip(TradeLedger.COLUMNS, values):
+            self._trade_columns[name].extend(value if isinstance(value, list) else [value] * n)
+    
+    def run_alpha(self):
+        print("Run vectorized alpha backtest from {0} to {1}".format(self.start_date, self.end_date))
+        begin_time = dt.datetime.now()
+        
+        ctx = self.ctx
+        dv = ctx.dataview
+        strategy = ctx.strategy
+        symbols = np.array(ctx.universe)
+        all_dates = np.asarray(dv.dates)
+        buy, sell = common.ORDER_ACTION.BUY, common.ORDER_ACTION.SELL
+        self._trade_columns = {name: [] for name in TradeLedger.COLUMNS}
+        
+        dates = self._get_rebalance_dates()
+        i_dates = np.searchsorted(all_dates, dates)
+        last_dates = all_dates[i_dates - 1]
+        
+        # matrices of re-balance dates x symbols
+        weights = self._calc_weights(dates, last_dates, symbols)
+        frozen, n_frozen = self._calc_freezes(dates, symbols)
+        if (n_frozen == len(symbols)).any():
+            raise ValueError("All suspended")
+        # weights of frozen symbols are removed, weights of others are re-normalized
+        weights = np.where(frozen, 0.0, weights)
+        w_sum = np.sum(np.abs(weights), axis=1).reshape(-1, 1)
+        mask_renorm = np.logical_and(n_frozen.reshape(-1, 1) > 0, w_sum > 0.0)
+        weights = np.where(mask_renorm, weights / np.where(mask_renorm, w_sum, 1.0), weights)
+        prices = self._get_frame(self.price_field, dates, symbols).values
+        
+        # matrices of all trade dates x symbols
+        adjust_factor = self._get_frame('_daily_adjust_factor', all_dates, symbols).values
+        close = self._get_frame('close', all_dates, symbols).values
+        delist_date = dv.data_inst.reindex(symbols)['delist_date'].values.astype(float)
+        
+        pos = np.zeros(len(symbols))
+        positions = np.zeros(weights.shape)
+        cash = strategy.cash
+        n_entrust = n_fill = 0
+        for k, date in enumerate(dates):
+            # Step1. dividend and de-list adjustment of positions during the last period
+            if k > 0:
+                held = np.nonzero(pos > 0)[0]
+                adj = adjust_factor[i_dates[k - 1] + 1: i_dates[k] + 1, held]
+                ratio = np.where(adj > 1, adj, 1.0)
+                if (ratio != 1).any():
+                    pos_path = pos[held] * np.cumprod(ratio, axis=0)
+                    diff = np.diff(np.vstack([pos[held], pos_path]), axis=0)
+                    col, row = np.nonzero(ratio.T != 1)
+                    adj_dates = all_dates[i_dates[k - 1] + 1 + row]
+                    self._add_trades(self.POSITION_ADJUST_NO, self.POSITION_ADJUST_NO, buy,
+                                     symbols[held[col]].tolist(), 0.0, diff[row, col].tolist(),
+                                     adj_dates.tolist(), self.POSITION_ADJUST_TIME, self.POSITION_ADJUST_NO, 0.0)
+                    pos[held] = pos_path[-1]
+            
+            mask_delist = np.logical_and(pos != 0, np.logical_and(delist_date >= self.last_rebalance_date,
+                                                                  delist_date <= date))
+            if mask_delist.any():
+                col = np.nonzero(mask_delist)[0]
+                i_last = np.searchsorted(all_dates, delist_date[col], side='left') - 1
+                last_close = close[i_last, col]
+                cash += np.sum(last_close * pos[col])
+                self._add_trades(self.DELIST_ADJUST_NO, self.DELIST_ADJUST_NO, sell,
+                                 symbols[col].tolist(), last_close.tolist(), pos[col].tolist(),
+                                 all_dates[i_last].tolist(), self.DELIST_ADJUST_TIME, self.DELIST_ADJUST_NO, 0.0)
+                pos[col] = 0.0
+            
+            # Step2. market value and cash, frozen positions are not traded
+            price, w, f = prices[k], weights[k], frozen[k]
+            mv = np.where(pos != 0, price * pos, 0.0)
+            market_value_float, market_value_frozen = np.sum(mv[~f]), np.sum(mv[f])
+            cash_available = cash + market_value_float
+            cash_to_use = cash_available * strategy.position_ratio
+            cash_unuse = cash_available - cash_to_use
+            
+            # Step3. lot-rounded target positions, same as AlphaStrategy.generate_weights_order
+            mask_trade = np.logical_and(~f, np.abs(w) >= 1e-8)
+            price_trade, w_trade = price[mask_trade], w[mask_trade]
+            mask_invalid = ~np.logical_and(np.isfinite(price_trade), np.isfinite(w_trade))
+            if mask_invalid.any():
+                i = np.nonzero(mask_invalid)[0][0]
+                raise ValueError("NaN or Inf encountered! \n"
+                                 "trade_date={}, symbol={}, price={}, weight={}".format(date,
+                                                                                        symbols[mask_trade][i],
+                                                                                        price_trade[i], w_trade[i]))
+            shares = np.round(w_trade * cash_to_use / price_trade / 100.) * 100
+            cash = cash_to_use - float(np.sum(shares * price_trade)) + cash_unuse
+            goal = np.where(f, pos, 0.0)
+            goal[mask_trade] = shares
+            
+            ctx.trade_date = date
+            total = cash_available + market_value_frozen
+            strategy.on_after_rebalance(total)
+            ctx.record('total_cash', total)
+            
+            # Step4. orders are filled on re-balance date
+            diff = goal - pos
+            col = np.nonzero(diff != 0)[0]
+            fill_price, fill_size = price[col], np.abs(diff[col])
+            commission = np.abs(fill_price * fill_size) * self.commission_rate
+            cash -= np.sum(commission)
+            n = len(col)
+            self._add_trades(int(date) * 10000 + k + 1,
+                             list(range(n_entrust + 1, n_entrust + n + 1)),
+                             [buy if x > 0 else sell for x in diff[col]],
+                             symbols[col].tolist(), fill_price.tolist(), fill_size.tolist(),
+                             int(date), ctx.trade_api.MATCH_TIME if ctx.trade_api is not None else 143000,
+                             list(range(int(date) * 10000 + n_fill + 1, int(date) * 10000 + n_fill + n + 1)),
+                             commission.tolist())
+            n_entrust += n
+            n_fill += n
+            
+            pos = goal
+            positions[k] = pos
+            self.last_rebalance_date = date
+            self.current_rebalance_date = date
+        
+        strategy.cash = cash
+        self.rebalance_dates = dates
+        self.weights = pd.DataFrame(weights, index=dates, columns=symbols)
+        self.positions = pd.DataFrame(positions, index=dates, columns=symbols)
+        self.df_trades = self._make_trades_df()
+        self.df_daily = calc_daily_value(self.df_trades, self._get_frame('close', all_dates, symbols),
+                                         self.props['init_balance'], end_date=self.end_date)
+        
+        used_time = (dt.datetime.now() - begin_time).total_seconds()
+        print("Backtest done. {0:d} re-balance dates, {1:.2e} trades in total. used time: {2}s".
+              format(len(dates), len(self.df_trades), used_time))
+    
+    def _make_trades_df(self):
+        cols = self._trade_columns
+        def to_str(values):
+            return np.array(values, dtype=np.int64).astype(str).astype(object)
+        
+        df = pd.DataFrame({'task_id': to_str(cols['task_id']),
+                           'entrust_no': to_str(cols['entrust_no']),
+                           'entrust_action': cols['entrust_action'],
+                           'symbol': cols['symbol'],
+                           'fill_price': np.array(cols['fill_price'], dtype=float),
+                           'fill_size': np.array(cols['fill_size'], dtype=float),
+                           'fill_date': np.array(cols['fill_date'], dtype=np.int64),
+                           'fill_time': np.array(cols['fill_time'], dtype=np.int64),
+                           'fill_no': to_str(cols['fill_no']),
+                           'commission': np.array(cols['commission'], dtype=float),
+                           'trade_date': np.array(cols['trade_date'], dtype=np.int64)},
+                          columns=TradeLedger.COLUMNS)
+        df.index.name = 'index'
+        return df
+    
+    def get_trades_df(self):
+        return self.df_trades
+
+
 class EventBacktestInstance(BacktestInstance):
     """
     Backtest event-driven strategy using DataService.
@@ -773,6 +1142,14 @@ class EventBacktestInstance(BacktestInstance):
     ----------
     bar_type : str
         {'1d', '1M', '5M', etc.}
+    bar_source : BarSource or None
+        Where intraday bars come from. If None, DataView is used if provided, else DataApi.
+        Set by props "bar_store.folder" to read bars from a local BarStore.
+    prefetch_days : int
+        Number of trade dates whose intraday bars are loaded in background in advance, default 0
+        (no background loading). The loading thread uses the same bar source (and DataApi) as the
+        backtest, so only turn it on if that source can be used from two threads, and the universe
+        of a date is read before the strategy's on_new_day of that date.
     
     """
     def __init__(self):
@@ -780,11 +1157,17 @@ class EventBacktestInstance(BacktestInstance):
         
         self.bar_type = ""
         self.df_dividend = None
+        self.bar_source = None
+        self.prefetch_days = 0
         
     def init_from_config(self, props):
         super(EventBacktestInstance, self).init_from_config(props)
         
         self.bar_type = props.get("bar_type", "1d")
+        self.prefetch_days = props.get("prefetch_days", 0)
+        bar_store_folder = props.get("bar_store.folder", "")
+        if bar_store_folder and self.bar_type != '1d':
+            self.bar_source = BarStoreBarSource(BarStore(bar_store_folder), freq=self.bar_type)
     
     def _get_dividend_info(self):
         """
@@ -853,9 +1236,19 @@ class EventBacktestInstance(BacktestInstance):
     def on_after_market_close(self):
         pass
         
+    def _get_bar_source(self):
+        if self.bar_source is None:
+            if self.ctx.dataview is not None:
+                self.bar_source = DataViewBarSource(self.ctx.dataview, freq=self.bar_type)
+            elif self.ctx.data_api is not None:
+                self.bar_source = DataApiBarSource(self.ctx.data_api, freq=self.bar_type)
+            else:
+                raise ValueError("No dataview or data_api to get bars from.")
+        return self.bar_source
+    
     def _get_df_bar(self, symbols, date):
         """
-        Get bar DataFrame from DataApi or DataView.
+        Get bar DataFrame from bar source (DataView or DataApi by default).
         
         Parameters
         ----------
@@ -867,21 +1260,9 @@ class EventBacktestInstance(BacktestInstance):
         res : pd.DataFrame
 
         """
-        if self.ctx.dataview is not None:
-            df_quotes = self.ctx.dataview.get(symbol=symbols,
-                                              start_date=date, end_date=date,
-                                              fields='open,high,low,close,volume,oi,trade_date,date,time',
-                                              data_format='long')
-        elif self.ctx.data_api is not None:
-            df_quotes, _ = self.ctx.data_api.bar(symbol=symbols,
-                                                   start_time=200000, end_time=160000, trade_date=date,
-                                                   freq=self.bar_type)
-        else:
-            raise ValueError()
-        
-        return df_quotes
+        return self._get_bar_source().get_bars(symbols, date)
             
-    def _create_time_symbol_bars(self, date):
+    def _create_time_symbol_bars(self, date, df_quotes=None):
         """
         Given a trade date, query bars of all symbols on that day and return a nested dict.
         
@@ -889,38 +1270,42 @@ class EventBacktestInstance(BacktestInstance):
         ----------
         date : int
             Trade date.
+        df_quotes : pd.DataFrame or None
+            Bars of the date if they are already loaded.
 
         Returns
         -------
-        res : list of tuples
-            Three-element tuple: (trade_date, time, dict of quote)
+        res : BarReplay
+            Iterate over it to get (time, dict of quote) of each bar time.
 
         """
         # query quotes data
-        symbols_str = ','.join(self.ctx.universe)
-        df_quotes = self._get_df_bar(symbols_str, date)
+        if df_quotes is None:
+            symbols_str = ','.join(self.ctx.universe)
+            df_quotes = self._get_df_bar(symbols_str, date)
         if df_quotes is None or df_quotes.empty:
-            return dict()
+            return []
     
-        # create nested dict
-        df_quotes = df_quotes.sort_values(['date', 'time', 'symbol'])
-        res = []
-        for time, df in df_quotes.groupby(by=['time'], sort=False):
-            quotes_list = Bar.create_from_df(df)
-            dic = {quote.symbol: quote for quote in quotes_list}
-            res.append((time, dic))
-        return res
+        return BarReplay(df_quotes, keys=('date', 'time'))
     
     def _run_bar(self):
         """Quotes of different symbols will be aligned into one dictionary."""
-        trade_dates_arr = self.ctx.data_api.query_trade_dates(self.start_date, self.end_date)
+        trade_dates_arr = self._get_bar_source().query_trade_dates(self.start_date, self.end_date)
+        
+        if self.prefetch_days > 0:
+            # bars of next days are loaded while current day is being simulated
+            dates_bars = BarPrefetcher(lambda date: self._get_df_bar(','.join(self.ctx.universe), date),
+                                       trade_dates_arr, n_ahead=self.prefetch_days)
+        else:
+            # bars are loaded after on_new_day, with universe of that day
+            dates_bars = ((date, None) for date in trade_dates_arr)
 
         last_trade_date = trade_dates_arr[0]
-        for trade_date in trade_dates_arr:
+        for trade_date, df_quotes in dates_bars:
             self.settle_for_stocks(last_trade_date, trade_date)
             self.on_new_day(trade_date)
             
-            list_of_quotes_tuples = self._create_time_symbol_bars(trade_date)
+            list_of_quotes_tuples = self._create_time_symbol_bars(trade_date, df_quotes)
             for time, quotes_dic in list_of_quotes_tuples:
                 self._process_quote_bar(quotes_dic)
             
@@ -969,41 +1354,33 @@ class EventBacktestInstance(BacktestInstance):
 
         Returns
         -------
-        res : list of tuples
-            Two-element tuple: (trade_date, dict of quotes)
+        res : BarReplay
+            Iterate over it to get (trade_date, dict of quotes) of each trade date.
 
         """
         # query quotes data
         symbols_str = ','.join(self.ctx.universe)
         df_daily = self._get_df_daily(symbol=symbols_str, start_date=start_date, end_date=end_date)
-        df_daily['date'] = df_daily['trade_date']
         if df_daily is None or df_daily.empty:
-            return dict()
-
-        # create nested dict
-        df_daily = df_daily.sort_values(['trade_date', 'symbol'])
-        res = []
-        for date, df in df_daily.groupby(by='trade_date'):
-            quotes_list = Bar.create_from_df(df)
-            dic = {quote.symbol: quote for quote in quotes_list}
-            res.append((date, dic))
-    
-        return res
+            return []
+        df_daily['date'] = df_daily['trade_date']
+
+        return BarReplay(df_daily, keys=('trade_date', ))
 
     def _run_daily(self):
         """Quotes of different symbols will be aligned into one dictionary."""
-        # create nested dict
-        list_of_quotes_tuples = self._create_daily_symbol_bars(self.start_date, self.end_date)
+        # bars of a date are created when the date is reached
+        quotes_iter = iter(self._create_daily_symbol_bars(self.start_date, self.end_date))
         
-        for i in range(len(list_of_quotes_tuples) - 1):
-            date1, quotes_dic1 = list_of_quotes_tuples[i]
-            date2, quotes_dic2 = list_of_quotes_tuples[i + 1]
+        date1, quotes_dic1 = next(quotes_iter, (None, None))
+        for date2, quotes_dic2 in quotes_iter:
             self.on_new_day(date2)
             
             self._process_quote_daily(quotes_dic1, quotes_dic2)
             
             self.on_after_market_close()
             self.settle_for_stocks(date1, date2)
+            date1, quotes_dic1 = date2, quotes_dic2
     
     def _process_quote_daily(self, quote_yesterday, quote_today):
         # on_bar
@@ -1037,30 +1414,9 @@ class EventBacktestInstance(BacktestInstance):
         
     def save_results(self, folder_path='.'):
         import os
-        import pandas as pd
         folder_path = os.path.abspath(folder_path)
     
-        trades = self.ctx.pm.trades
-    
-        type_map = {'task_id': str,
-                    'entrust_no': str,
-                    'entrust_action': str,
-                    'symbol': str,
-                    'fill_price': float,
-                    'fill_size': float,
-                    'fill_date': np.integer,
-                    'fill_time': np.integer,
-                    'fill_no': str,
-                    'commission': float,
-                    'trade_date': np.integer}
-        # keys = trades[0].__dict__.keys()
-        ser_list = dict()
-        for key in type_map.keys():
-            v = [t.__getattribute__(key) for t in trades]
-            ser = pd.Series(data=v, index=None, dtype=type_map[key], name=key)
-            ser_list[key] = ser
-        df_trades = pd.DataFrame(ser_list)
-        df_trades.index.name = 'index'
+        df_trades = self.ctx.pm.get_trades_df()
     
         trades_fn = os.path.join(folder_path, 'trades.csv')
         configs_fn = os.path.join(folder_path, 'configs.json')
@@ -7,4 +7,5 @@ Our framework utilizes event engine to run in an efficient way.
 
 """
 from .engine import EventEngine, Event
+from .batchengine import BatchEventEngine, Histogram
 from .eventtype import EVENT_TYPE
@@ -0,0 +1,424 @@
+# encoding: UTF-8
+"""
+Event engine for live trading which drains events in batches.
+
+Compared with EventEngine:
+    - the processing thread takes all pending events of a lane (up to batch_size) with one lock,
+      instead of one queue.get for each event;
+    - events are put into lanes by priority, indications of trades and orders are processed
+      before market data which was received earlier;
+    - events of a type may be coalesced by key, e.g. only the latest quote of each symbol
+      is kept while it is waiting;
+    - queue depth and time spent in handlers are recorded in histograms.
+
+"""
+from __future__ import print_function
+from __future__ import absolute_import
+
+import threading
+from bisect import bisect_left
+from collections import deque
+
+try:
+    from time import perf_counter
+except ImportError:
+    from time import time as perf_counter
+
+import numpy as np
+import pandas as pd
+
+from .engine import Event
+from .eventtype import EVENT_TYPE
+
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+DEFAULT_PRIORITIES = {EVENT_TYPE.TRADE_IND: PRIORITY_HIGH,
+                      EVENT_TYPE.ORDER_STATUS_IND: PRIORITY_HIGH,
+                      EVENT_TYPE.TASK_STATUS_IND: PRIORITY_HIGH,
+                      EVENT_TYPE.ORDER_RSP: PRIORITY_HIGH,
+                      EVENT_TYPE.TASK_RSP: PRIORITY_HIGH,
+                      EVENT_TYPE.MARKET_DATA: PRIORITY_LOW}
+
+# 1us, 2us, 4us, ..., about 1s
+LATENCY_BOUNDS = [1e-6 * 2 ** i for i in range(21)]
+# 0, 1, 2, 4, ..., 65536
+DEPTH_BOUNDS = [0] + [2 ** i for i in range(17)]
+
+
+def quote_symbol(event):
+    """Coalescing key of market data events: symbol of the quote, None for events without a quote dict."""
+    quote = event.dic.get('quote', None)
+    if quote is None:
+        return None
+    return quote.get('symbol', None)
+
+
+class Histogram(object):
+    """
+    Counts of values in buckets, bucket i holds values in (bounds[i-1], bounds[i]],
+    the last bucket holds values larger than bounds[-1].
+
+    Attributes
+    ----------
+    bounds : list of float
+        Upper bounds of buckets, ascending.
+    counts : list of int
+    count : int
+    total : float
+    max : float
+
+    """
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def mean(self):
+        return self.total / self.count if self.count else np.nan
+
+    def percentile(self, q):
+        """
+        Upper bound of the bucket where the q-th percentile falls in, max for the last bucket.
+
+        Parameters
+        ----------
+        q : float
+            In [0, 100].
+
+        Returns
+        -------
+        float
+
+        """
+        if not self.count:
+            return np.nan
+        rank = q / 100.0 * self.count
+        cum = 0
+        for bound, n in zip(self.bounds, self.counts):
+            cum += n
+            if n and cum >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_series(self):
+        """
+        Returns
+        -------
+        pd.Series
+            Counts indexed by upper bound of buckets, np.inf for the last one.
+
+        """
+        index = pd.Index(self.bounds + [np.inf], name='upper_bound')
+        return pd.Series(self.counts, index=index)
+
+
+class _Slot(object):
+    """Place of a coalesced event in a lane, the latest event of the key is looked up when it is taken."""
+    __slots__ = ('type_', 'key')
+
+    def __init__(self, type_, key):
+        self.type_ = type_
+        self.key = key
+
+
+class BatchEventEngine(object):
+    """
+    Event engine with priority lanes, batch draining, coalescing and metrics.
+    Handlers are registered and events are put the same way as EventEngine.
+
+    Events are processed in one thread. Each time the thread takes up to batch_size events
+    from the first non-empty lane, so an event of a higher priority waits for at most one batch.
+    Order of events of the same lane is kept.
+
+    Parameters
+    ----------
+    batch_size : int
+        Maximum number of events taken from a lane at a time.
+    priorities : dict, optional
+        {event type: priority}, updated to DEFAULT_PRIORITIES. Types not listed are PRIORITY_NORMAL.
+    record_stats : bool
+        Record time spent in handlers for each event. Queue depth is always recorded.
+
+    Attributes
+    ----------
+    n_events : int
+        Number of events processed.
+    n_coalesced : int
+        Number of events replaced by a later event of the same key before being processed.
+    n_batches : int
+
+    """
+    def __init__(self, batch_size=256, priorities=None, record_stats=True):
+        super(BatchEventEngine, self).__init__()
+
+        self.batch_size = batch_size
+        self.record_stats = record_stats
+
+        self._priorities = dict(DEFAULT_PRIORITIES)
+        if priorities:
+            self._priorities.update(priorities)
+        self._lanes = [deque() for _ in range(PRIORITY_LOW + 1)]
+        self._n_pending = 0
+        self._cond = threading.Condition(threading.Lock())
+        self._waiting = False
+
+        # {event type: key_func}, {event type: {key: latest event}}
+        self._coalesce_funcs = dict()
+        self._coalesced = dict()
+
+        self._handlers = dict()
+        self._general_handlers = []
+
+        self._active = False
+        self._thread = None
+        self._timer = None
+        self._timer_interval = 1.0
+        self._timer_stop = threading.Event()
+
+        self.n_events = 0
+        self.n_coalesced = 0
+        self.n_batches = 0
+        self._queue_depth = Histogram(DEPTH_BOUNDS)
+        self._handler_latency = dict()
+
+    # -------------------------------------------------------------------------------------------
+    # Configuration
+
+    def set_priority(self, type_, priority):
+        """
+        Parameters
+        ----------
+        type_ : EVENT_TYPE or str
+        priority : int
+            PRIORITY_HIGH, PRIORITY_NORMAL or PRIORITY_LOW. Applies to events put afterwards.
+
+        """
+        if priority not in (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW):
+            raise ValueError("priority must be one of PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW.")
+        self._priorities[type_] = priority
+
+    def set_coalesce(self, type_, key_func=quote_symbol):
+        """
+        Keep only the latest event of each key among waiting events of a type.
+        The latest event is processed at the place of the first one.
+
+        Parameters
+        ----------
+        type_ : EVENT_TYPE or str
+        key_func : callable or None
+            key_func(event) returns a hashable key, events with key None are never coalesced.
+            Default gives symbol of market data events. None to stop coalescing.
+
+        """
+        with self._cond:
+            if key_func is None:
+                self._coalesce_funcs.pop(type_, None)
+            else:
+                self._coalesce_funcs[type_] = key_func
+                self._coalesced.setdefault(type_, dict())
+
+    # -------------------------------------------------------------------------------------------
+    # Handlers
+
+    def register(self, type_, handler):
+        """Register handler(event) for events of type_."""
+        handlers = self._handlers.get(type_, [])
+        if handler not in handlers:
+            # replace the list so that the processing thread never iterates a list being changed
+            self._handlers[type_] = handlers + [handler]
+
+    def unregister(self, type_, handler):
+        handlers = [h for h in self._handlers.get(type_, []) if h != handler]
+        if handlers:
+            self._handlers[type_] = handlers
+        else:
+            self._handlers.pop(type_, None)
+
+    def registerGeneralHandler(self, handler):
+        """Register handler(event) for events of all types."""
+        if handler not in self._general_handlers:
+            self._general_handlers = self._general_handlers + [handler]
+
+    def unregisterGeneralHandler(self, handler):
+        self._general_handlers = [h for h in self._general_handlers if h != handler]
+
+    # -------------------------------------------------------------------------------------------
+    # Run
+
+    def put(self, event):
+        """Put an event, can be called from any thread."""
+        type_ = event.type_
+        key_func = self._coalesce_funcs.get(type_, None)
+        key = key_func(event) if key_func is not None else None
+
+        with self._cond:
+            if key is not None:
+                pending = self._coalesced[type_]
+                if key in pending:
+                    pending[key] = event
+                    self.n_coalesced += 1
+                    return
+                pending[key] = event
+                event = _Slot(type_, key)
+            self._lanes[self._priorities.get(type_, PRIORITY_NORMAL)].append(event)
+            self._n_pending += 1
+            if self._waiting:
+                self._cond.notify()
+
+    def _take_batch(self):
+        """Take events from the first non-empty lane, must be called with lock held."""
+        for lane in self._lanes:
+            if not lane:
+                continue
+
+            self._queue_depth.add(self._n_pending)
+            if len(lane) <= self.batch_size:
+                batch = list(lane)
+                lane.clear()
+            else:
+                popleft = lane.popleft
+                batch = [popleft() for _ in range(self.batch_size)]
+            self._n_pending -= len(batch)
+
+            for i, item in enumerate(batch):
+                if type(item) is _Slot:
+                    batch[i] = self._coalesced[item.type_].pop(item.key)
+            return batch
+        return []
+
+    def _process(self, batch):
+        handlers_map = self._handlers
+        general_handlers = self._general_handlers
+        latency = self._handler_latency
+        record_stats = self.record_stats
+
+        for event in batch:
+            if record_stats:
+                t0 = perf_counter()
+            handlers = handlers_map.get(event.type_, None)
+            if handlers is not None:
+                for handler in handlers:
+                    handler(event)
+            for handler in general_handlers:
+                handler(event)
+            if record_stats:
+                hist = latency.get(event.type_, None)
+                if hist is None:
+                    hist = latency[event.type_] = Histogram(LATENCY_BOUNDS)
+                hist.add(perf_counter() - t0)
+
+        self.n_events += len(batch)
+        self.n_batches += 1
+
+    def _run(self):
+        cond = self._cond
+        while self._active:
+            with cond:
+                if not self._n_pending:
+                    self._waiting = True
+                    cond.wait(1.0)
+                    self._waiting = False
+                batch = self._take_batch()
+            if batch:
+                self._process(batch)
+
+    def _run_timer(self):
+        while not self._timer_stop.wait(self._timer_interval):
+            self.put(Event(EVENT_TYPE.TIMER))
+
+    def start(self, timer=True, timer_interval=1.0):
+        """
+        Start the processing thread.
+
+        Parameters
+        ----------
+        timer : bool
+            Whether to put a TIMER event every timer_interval seconds.
+        timer_interval : float
+
+        """
+        self._active = True
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+        if timer:
+            self._timer_interval = timer_interval
+            self._timer_stop.clear()
+            self._timer = threading.Thread(target=self._run_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def stop(self):
+        """Stop processing, events still waiting are discarded the same as EventEngine."""
+        self._active = False
+        if self._timer is not None:
+            self._timer_stop.set()
+            self._timer.join()
+            self._timer = None
+
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    # -------------------------------------------------------------------------------------------
+    # Metrics
+
+    @property
+    def queue_depth(self):
+        """Number of events waiting to be processed."""
+        return self._n_pending
+
+    def get_stats(self):
+        """
+        Metrics recorded since start or last reset_stats.
+        Histograms are updated by the processing thread, read them after stop for exact numbers.
+
+        Returns
+        -------
+        dict
+            n_events, n_coalesced, n_batches, queue_depth (Histogram of number of waiting events
+            each time a batch is taken) and handler_latency ({event type: Histogram of seconds}).
+
+        """
+        return {'n_events': self.n_events,
+                'n_coalesced': self.n_coalesced,
+                'n_batches': self.n_batches,
+                'queue_depth': self._queue_depth,
+                'handler_latency': dict(self._handler_latency)}
+
+    def latency_summary(self):
+        """
+        Returns
+        -------
+        pd.DataFrame
+            One row for each event type, columns are count, mean, p50, p99 and max of
+            time spent in handlers, in seconds.
+
+        """
+        rows = dict()
+        for type_, hist in self._handler_latency.items():
+            rows[getattr(type_, 'value', type_)] = {'count': hist.count, 'mean': hist.mean(),
+                                'p50': hist.percentile(50), 'p99': hist.percentile(99), 'max': hist.max}
+        return pd.DataFrame.from_dict(rows, orient='index', columns=['count', 'mean', 'p50', 'p99', 'max'])
+
+    def reset_stats(self):
+        self.n_events = 0
+        self.n_coalesced = 0
+        self.n_batches = 0
+        self._queue_depth = Histogram(DEPTH_BOUNDS)
+        self._handler_latency = dict()
@@ -0,0 +1,226 @@
+# encoding: UTF-8
+"""
+Columnar storage of trades and positions for PortfolioManager.
+
+TradeLedger keeps each attribute of trades in a pre-allocated NumPy array, which grows
+by doubling, so recording a trade does not keep a Python object. PositionBook keeps the
+size of every symbol in one vector, each symbol has a fixed slot.
+
+"""
+
+from __future__ import print_function
+
+import numpy as np
+import pandas as pd
+
+from jaqs.data.basic import Trade, Position
+
+
+class TradeLedger(object):
+    """
+    Columnar record of trades. Works like a list of Trade for len, index and iteration.
+
+    Attributes
+    ----------
+    columns : dict
+        {attribute name: np.ndarray}, arrays are larger than number of trades.
+
+    """
+    NUMERIC_FIELDS = [('fill_price', np.float64),
+                      ('fill_size', np.float64),
+                      ('fill_date', np.int64),
+                      ('fill_time', np.int64),
+                      ('commission', np.float64),
+                      ('trade_date', np.int64)]
+    STRING_FIELDS = ['task_id', 'entrust_no', 'fill_no']
+    CATEGORY_FIELDS = ['symbol', 'entrust_action']
+    COLUMNS = ['task_id', 'entrust_no', 'entrust_action', 'symbol', 'fill_price', 'fill_size',
+               'fill_date', 'fill_time', 'fill_no', 'commission', 'trade_date']
+
+    def __init__(self, capacity=1024):
+        self._size = 0
+        self._capacity = 0
+        self.columns = dict()
+        self._categories = {field: [] for field in self.CATEGORY_FIELDS}
+        self._codes = {field: dict() for field in self.CATEGORY_FIELDS}
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        columns = dict()
+        for field, dtype in self.NUMERIC_FIELDS:
+            columns[field] = np.zeros(capacity, dtype=dtype)
+        for field in self.STRING_FIELDS:
+            columns[field] = np.empty(capacity, dtype=object)
+        for field in self.CATEGORY_FIELDS:
+            columns[field] = np.zeros(capacity, dtype=np.int32)
+
+        for field, arr in self.columns.items():
+            columns[field][:self._size] = arr[:self._size]
+        self.columns = columns
+        self._capacity = capacity
+
+    def _get_code(self, field, value):
+        codes = self._codes[field]
+        code = codes.get(value, None)
+        if code is None:
+            code = codes[value] = len(self._categories[field])
+            self._categories[field].append(value)
+        return code
+
+    def __len__(self):
+        return self._size
+
+    def append(self, trade):
+        """
+        Parameters
+        ----------
+        trade : Trade
+
+        """
+        if self._size == self._capacity:
+            self._allocate(max(2 * self._capacity, 1))
+
+        i = self._size
+        columns = self.columns
+        for field, _ in self.NUMERIC_FIELDS:
+            columns[field][i] = getattr(trade, field, 0)
+        for field in self.STRING_FIELDS:
+            columns[field][i] = getattr(trade, field)
+        for field in self.CATEGORY_FIELDS:
+            columns[field][i] = self._get_code(field, str(getattr(trade, field)))
+        self._size += 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._size
+        if not 0 <= i < self._size:
+            raise IndexError("trade index out of range")
+
+        trade = Trade()
+        for field, _ in self.NUMERIC_FIELDS:
+            setattr(trade, field, self.columns[field][i].item())
+        for field in self.STRING_FIELDS:
+            setattr(trade, field, self.columns[field][i])
+        for field in self.CATEGORY_FIELDS:
+            setattr(trade, field, self._categories[field][self.columns[field][i]])
+        return trade
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self[i]
+
+    def to_frame(self):
+        """
+        Returns
+        -------
+        pd.DataFrame
+            One row for each trade. Numeric and string columns are views of the ledger's arrays
+            (not copied), symbol and entrust_action are pd.Categorical.
+            Valid until the next trade is recorded.
+
+        """
+        n = self._size
+        data = dict()
+        for field, _ in self.NUMERIC_FIELDS:
+            data[field] = self.columns[field][:n]
+        for field in self.STRING_FIELDS:
+            data[field] = self.columns[field][:n]
+        for field in self.CATEGORY_FIELDS:
+            data[field] = pd.Categorical.from_codes(self.columns[field][:n], categories=self._categories[field])
+        df = pd.DataFrame(data, columns=self.COLUMNS, copy=False)
+        df.index.name = 'index'
+        return df
+
+
+def _to_size(x):
+    """Size as int if it is integral, to be the same as sizes of Position."""
+    x = x.item()
+    return int(x) if x.is_integer() else x
+
+
+class PositionBook(object):
+    """
+    Current size of positions, in a vector indexed by symbol slot.
+
+    Attributes
+    ----------
+    symbols : list of str
+        Symbol of each slot.
+    sizes : np.ndarray
+        Current size of each slot, larger than number of symbols.
+
+    """
+    def __init__(self, capacity=256):
+        self.symbols = []
+        self.slots = dict()
+        self.sizes = np.zeros(capacity, dtype=np.float64)
+
+    def get_slot(self, symbol):
+        slot = self.slots.get(symbol, None)
+        if slot is None:
+            slot = self.slots[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+            if slot == len(self.sizes):
+                self.sizes = np.concatenate([self.sizes, np.zeros_like(self.sizes)])
+        return slot
+
+    def get_size(self, symbol):
+        slot = self.slots.get(symbol, None)
+        if slot is None:
+            return 0
+        return _to_size(self.sizes[slot])
+
+    def add(self, symbol, size):
+        """Add size to position of symbol, return new size."""
+        slot = self.get_slot(symbol)
+        self.sizes[slot] += size
+        return _to_size(self.sizes[slot])
+
+    def get_position(self, symbol):
+        """Return Position of symbol, or None if no holding."""
+        size = self.get_size(symbol)
+        if size == 0:
+            return None
+        pos = Position(symbol=symbol)
+        pos.current_size = size
+        return pos
+
+    def get_sizes(self, symbols):
+        """Sizes of a list of symbols, 0 for symbols never traded."""
+        slots = np.array([self.slots.get(s, -1) for s in symbols], dtype=np.int64)
+        res = self.sizes[np.maximum(slots, 0)]
+        res[slots < 0] = 0.0
+        return res
+
+    def to_series(self):
+        """Non-zero positions as pd.Series indexed by symbol."""
+        n = len(self.symbols)
+        ser = pd.Series(self.sizes[:n], index=self.symbols)
+        return ser.loc[ser != 0]
+
+    def market_value(self, ref_prices, suspensions=None):
+        """
+        Parameters
+        ----------
+        ref_prices : dict or pd.Series
+            {symbol: price}
+        suspensions : list of str
+
+        Returns
+        -------
+        market_value_float : float
+        market_value_frozen : float
+
+        """
+        n = len(self.symbols)
+        mask = self.sizes[:n] != 0
+        symbols = [s for s, m in zip(self.symbols, mask) if m]
+        if isinstance(ref_prices, pd.Series):
+            prices = ref_prices.reindex(symbols).values
+        else:
+            prices = np.array([ref_prices[s] for s in symbols], dtype=float)
+        values = prices * self.sizes[:n][mask]
+
+        suspensions = set(suspensions) if suspensions else set()
+        frozen = np.array([s in suspensions for s in symbols], dtype=bool)
+        return float(values[~frozen].sum()), float(values[frozen].sum())
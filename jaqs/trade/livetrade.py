@@ -6,7 +6,7 @@ import datetime
 import numpy as np
 import pandas as pd
 
-from jaqs.trade.event import EventEngine, Event, EVENT_TYPE
+from jaqs.trade.event import BatchEventEngine, Event, EVENT_TYPE
 from jaqs.data.basic import Quote
 import jaqs.util as jutil
 from functools import reduce
@@ -241,8 +241,12 @@ class AlphaLiveTradeInstance(object):
         print("float {:.2e}, frozen {:.2e}".format(market_value_float, market_value_frozen))
 
 
-class EventLiveTradeInstance(EventEngine):
+class EventLiveTradeInstance(BatchEventEngine):
     """
+    Trade and order indications are processed before market data received earlier.
+    If props['coalesce_quotes'] is True, only the latest quote of each symbol waiting
+    to be processed is passed to strategy.
+    
     Attributes
     ----------
     start_date : int
@@ -275,6 +279,8 @@ class EventLiveTradeInstance(EventEngine):
         self.props = props
         self.start_date = props.get("start_date")
         self.end_date = props.get("end_date")
+        if props.get("coalesce_quotes", False):
+            self.set_coalesce(EVENT_TYPE.MARKET_DATA)
 
         for obj in ['data_api', 'trade_api', 'pm', 'strategy']:
             if hasattr(self.ctx, obj):
@@ -306,8 +312,14 @@ class EventLiveTradeInstance(EventEngine):
         self.start(timer=False)
     
     def on_bar(self, event):
-        quote_dic = event.dic['quote']
-        quote = Quote.create_from_dict(quote_dic)
+        if 'quote_book' in event.dic:
+            # one event for each queued symbol, quote is the latest one of that symbol
+            quote = event.dic['quote_book'].pop()
+            if quote is None:
+                return
+        else:
+            quote_dic = event.dic['quote']
+            quote = Quote.create_from_dict(quote_dic)
         self.ctx.strategy.on_tick(quote)
     
     def on_order_rsp(self, event):
@@ -11,9 +11,13 @@ from __future__ import print_function
 
 import copy
 
+import numpy as np
+import pandas as pd
+
 import jaqs.trade
 from jaqs.data.basic import OrderStatusInd, Trade, Task, Order, Position, TradeStat
 from jaqs.trade import common
+from jaqs.trade.ledger import TradeLedger, PositionBook
 import jaqs.util as jutil
 
 class PortfolioManager(object):
@@ -23,13 +27,16 @@ class PortfolioManager(object):
     Attributes
     ----------
     orders : list of jaqs.data.basic.Order objects
-    trades : list of jaqs.data.basic.Trade objects
+    trades : list of jaqs.data.basic.Trade objects, or TradeLedger
     positions : dict of {symbol + trade_date : jaqs.data.basic.Position}
     strategy : Strategy
     holding_securities : set of securities
 
     Notes
     -------
+    With props "columnar_ledger" = True, trades are recorded in a TradeLedger and position sizes
+    in a PositionBook instead of Python objects, positions dict is not used.
+    
     Position is determined only by TradeInd
     TradeStat is generated from order/goal_portfolio, updated by TradeInd
     
@@ -54,11 +61,17 @@ class PortfolioManager(object):
         self.tradestat = dict()
         
         self.holding_securities = set()
+        
+        self._position_book = None
     
     def init_from_config(self, props):
         self.init_balance = props.get("init_balance", 0.0)
         self.cash = self.init_balance
         
+        if props.get("columnar_ledger", False):
+            self.trades = TradeLedger()
+            self._position_book = PositionBook()
+        
         self._hook_strategy()
         if isinstance(self.ctx.trade_api, jaqs.trade.RealTimeTradeApi):
             self.init_positions()
@@ -127,11 +140,15 @@ class PortfolioManager(object):
         return trade_stat
     
     def get_position(self, symbol):
+        if self._position_book is not None:
+            return self._position_book.get_position(symbol)
         pos_key = self._make_position_key(symbol)
         position = self.positions.get(pos_key, None)
         return position
     
     def get_pos(self, symbol):
+        if self._position_book is not None:
+            return self._position_book.get_size(symbol)
         pos_key = self._make_position_key(symbol)
         position = self.positions.get(pos_key, None)
         if position is None:
@@ -168,6 +185,10 @@ class PortfolioManager(object):
         df_pos, msg = self.ctx.trade_api.query_position()
         df_pos = df_pos.rename(columns={'security': 'symbol'})
         pos_list = Position.create_from_df(df_pos)
+        if self._position_book is not None:
+            for p in pos_list:
+                self._position_book.add(p.symbol, p.current_size - self._position_book.get_size(p.symbol))
+            return
         pos_dic = {p.symbol: p for p in pos_list}
         self.positions.update(pos_dic)
         
@@ -327,8 +348,9 @@ class PortfolioManager(object):
         new_order.copy(order)  # TODO why copy?
         self.orders[self._make_order_key(order.entrust_no, self.ctx.strategy.ctx.trade_date)] = new_order
         
+        # positions are kept in PositionBook with columnar ledger, no Position object is created
         position_key = self._make_position_key(order.symbol)
-        if position_key not in self.positions:
+        if self._position_book is None and position_key not in self.positions:
             position = Position()
             position.symbol = order.symbol
             self.positions[position_key] = position
@@ -612,6 +634,19 @@ class PortfolioManager(object):
             print("WARNING: no fill_size TradeInd found!")
             return
         
+        if self._position_book is not None:
+            if common.ORDER_ACTION.is_positive(ind.entrust_action):
+                size = self._position_book.add(ind.symbol, ind.fill_size)
+            elif common.ORDER_ACTION.is_negative(ind.entrust_action):
+                size = self._position_book.add(ind.symbol, -ind.fill_size)
+            else:
+                size = self._position_book.get_size(ind.symbol)
+            if size == 0:
+                self.holding_securities.discard(ind.symbol)
+            else:
+                self.holding_securities.add(ind.symbol)
+            return
+        
         # get position, if no, create a new one.
         pos_key = self._make_position_key(ind.symbol)
         pos = self.positions.get(pos_key, None)
@@ -654,6 +689,9 @@ class PortfolioManager(object):
 
         """
         # TODO some securities could not be able to be traded
+        if self._position_book is not None:
+            return self._position_book.market_value(ref_prices, suspensions)
+        
         if suspensions is None:
             suspensions = []
         
@@ -671,6 +709,39 @@ class PortfolioManager(object):
         
         return market_value_float, market_value_frozen
 
+    def get_trades_df(self):
+        """
+        Returns
+        -------
+        pd.DataFrame
+            All trades, one row for each. Columns are task_id, entrust_no, entrust_action, symbol,
+            fill_price, fill_size, fill_date, fill_time, fill_no, commission, trade_date.
+
+        """
+        if isinstance(self.trades, TradeLedger):
+            return self.trades.to_frame()
+        
+        type_map = {'task_id': str,
+                    'entrust_no': str,
+                    'entrust_action': str,
+                    'symbol': str,
+                    'fill_price': float,
+                    'fill_size': float,
+                    'fill_date': np.integer,
+                    'fill_time': np.integer,
+                    'fill_no': str,
+                    'commission': float,
+                    'trade_date': np.integer}
+        # keys = trades[0].__dict__.keys()
+        ser_list = dict()
+        for key in type_map.keys():
+            v = [t.__getattribute__(key) for t in self.trades]
+            ser = pd.Series(data=v, index=None, dtype=type_map[key], name=key)
+            ser_list[key] = ser
+        df_trades = pd.DataFrame(ser_list)
+        df_trades.index.name = 'index'
+        return df_trades
+
 
 '''
 class PortfolioManager_RAW(TradeCallback):
@@ -358,7 +358,8 @@ class AlphaStrategy(Strategy, model.FuncRegisterable):
         Interval between current and next. {'day', 'week', 'month'}
     days_delay : int
         n'th business day after next period.
-    weights : np.array with the same shape with self.context.universe
+    weights : pd.Series
+        Target weight of each symbol, indexed by self.ctx.universe (same order).
     benchmark : str
         The benchmark symbol.
     risk_model : model.RiskModel
@@ -390,6 +391,7 @@ class AlphaStrategy(Strategy, model.FuncRegisterable):
         self.stock_selector = stock_selector
         
         self.weights = None
+        self._universe_index = None
         
         self.pc_method = pc_method
         
@@ -514,28 +516,36 @@ class AlphaStrategy(Strategy, model.FuncRegisterable):
 
         # Step.3 use the registered method to calculate weights and get weights for all symbols in universe
         weights_sub_universe, msg = func(**options)
-        weights_all_universe = {symbol: weights_sub_universe.get(symbol, 0.0) for symbol in self.ctx.universe}
+        universe_index = self._get_universe_index()
+        w = pd.Series(weights_sub_universe, dtype=float).reindex(universe_index).values
         if msg:
             print(msg)
 
         # if nan assign zero
-        weights_all_universe = {k: 0.0 if np.isnan(v) else v for k, v in weights_all_universe.items()}
+        w = np.where(np.isnan(w), 0.0, w)
         
         # normalize
-        w_sum = np.sum(np.abs(list(weights_all_universe.values())))
+        w_sum = np.sum(np.abs(w))
         if w_sum > 1e-8:  # else all zeros weights
-            weights_all_universe = {k: v / w_sum for k, v in weights_all_universe.items()}
+            w = w / w_sum
         
         # single symbol weight limit process
         if self.single_symbol_weight_limit < 1:
-            weights_all_universe = {k: v if v < self.single_symbol_weight_limit else self.single_symbol_weight_limit
-                                    for k, v in weights_all_universe.items()}
+            w = np.minimum(w, self.single_symbol_weight_limit)
 
-        self.weights = weights_all_universe
+        self.weights = pd.Series(w, index=universe_index)
+
+    def _get_universe_index(self):
+        """pd.Index of self.ctx.universe, created once for a universe."""
+        universe = self.ctx.universe
+        if (self._universe_index is None or self._universe_index[0] is not universe
+                or len(self._universe_index[1]) != len(universe)):
+            self._universe_index = (universe, pd.Index(universe))
+        return self._universe_index[1]
 
     def equal_weight(self):
         # discrete
-        weights = {k: 1.0 for k in self.ctx.snapshot_sub.index.values}
+        weights = pd.Series(1.0, index=self.ctx.snapshot_sub.index)
         return weights, ''
 
     def industry_neutral_equal_weight(self):
@@ -616,18 +626,15 @@ class AlphaStrategy(Strategy, model.FuncRegisterable):
         if sqrt:
             print('sqrt')
             mv = np.sqrt(mv)
-        weights = mv.to_dict()
-        return weights, ""
+        return mv, ""
 
     def index_weight(self):
         snap = self.ctx.snapshot_sub
         if 'index_weight' not in snap.columns:
             raise ValueError("index_weight is chosen,"
                              "while no [index_weight] field found in dataview.")
-        ser_index_weight = snap['index_weight']
-        ser_index_weight.fillna(0.0, inplace=True)
-        weights = ser_index_weight.to_dict()
-        return weights, ""
+        ser_index_weight = snap['index_weight'].fillna(0.0)
+        return ser_index_weight, ""
 
     def equal_index_weight(self):
         snap = self.ctx.snapshot_sub
@@ -638,7 +645,7 @@ class AlphaStrategy(Strategy, model.FuncRegisterable):
 
         wt_final = (wt_equal + wt_index) / 2
 
-        return wt_final.to_dict(), ""
+        return wt_final, ""
 
     def factor_value_weight(self):
         def long_only_weight_adjust(w):
@@ -725,12 +732,14 @@ class AlphaStrategy(Strategy, model.FuncRegisterable):
         if len(suspensions) == len(self.ctx.universe):
             raise ValueError("All suspended")  # TODO custom error
         
-        weights = {sec: w if sec not in suspensions else 0.0 for sec, w in self.weights.items()}
-        weights_sum = np.sum(np.abs(list(weights.values())))
+        weights = pd.Series(self.weights, dtype=float)
+        w = weights.values.copy()
+        w[weights.index.isin(list(suspensions))] = 0.0
+        weights_sum = np.sum(np.abs(w))
         if weights_sum > 0.0:
-            weights = {sec: w / weights_sum for sec, w in weights.items()}
+            w = w / weights_sum
         
-        self.weights = weights
+        self.weights = pd.Series(w, index=weights.index)
     
     def on_after_rebalance(self, total):
         print("Before {} re-balance: available cash all = {:9.4e}".format(self.ctx.trade_date, total))  # DEBUG
@@ -746,11 +755,11 @@ class AlphaStrategy(Strategy, model.FuncRegisterable):
 
         Parameters
         ----------
-        weights_dic : dict of {symbol: weight}
+        weights_dic : dict of {symbol: weight} or pd.Series
             Weight of each symbol.
         turnover : float
             Total turnover goal of all securities. (cash quota)
-        prices : dict of {str: float}
+        prices : dict of {str: float} or pd.Series
             {symbol: price}
         suspensions : list of str
 
@@ -760,36 +769,47 @@ class AlphaStrategy(Strategy, model.FuncRegisterable):
         cash_left : float
 
         """
-        # cash_left = 0.0
-        cash_used = 0.0
-        goals = []
-        for sec, w in weights_dic.items():
-            goal_pos = dict()
-            goal_pos['symbol'] = sec
-            
-            if sec in suspensions:
-                current_pos = self.ctx.pm.get_position(sec)
-                goal_pos['size'] = current_pos.current_size if current_pos is not None else 0
-            elif abs(w) < 1e-8:
-                # order.entrust_size = 0
-                goal_pos['size'] = 0
-            else:
-                price = prices[sec]
-                if not (np.isfinite(price) and np.isfinite(w)):
-                    raise ValueError("NaN or Inf encountered! \n"
-                                     "trade_date={}, symbol={}, price={}, weight={}".format(self.ctx.trade_date,
-                                                                                            sec, price, w))
-                shares_raw = w * turnover / price
-                # shares unit 100
-                shares = int(round(shares_raw / 100., 0)) * 100  # TODO cash may be not enough
-                # shares_left = shares_raw - shares * 100  # may be negative
-                # cash_left += shares_left * price
-                cash_used += shares * price
-                goal_pos['size'] = shares
-            
-            goals.append(goal_pos)
-        
-        cash_left = turnover - cash_used
+        weights = pd.Series(weights_dic, dtype=float)
+        symbols = weights.index.values
+        w = weights.values
+        
+        mask_suspended = weights.index.isin(list(suspensions)) if suspensions else np.zeros(len(w), dtype=bool)
+        mask_invalid = np.logical_and(~mask_suspended, ~np.isfinite(w))
+        if mask_invalid.any():
+            i = np.nonzero(mask_invalid)[0][0]
+            raise ValueError("NaN or Inf encountered! \n"
+                             "trade_date={}, symbol={}, price={}, weight={}".format(self.ctx.trade_date,
+                                                                                    symbols[i], prices.get(symbols[i], np.nan),
+                                                                                    w[i]))
+        mask_trade = np.logical_and(~mask_suspended, np.abs(w) >= 1e-8)
+        
+        symbols_trade = symbols[mask_trade]
+        w_trade = w[mask_trade]
+        if isinstance(prices, pd.Series):
+            price = prices.reindex(symbols_trade).values.astype(float)
+        else:
+            price = np.array([prices[sec] for sec in symbols_trade], dtype=float)
+        mask_invalid = ~np.logical_and(np.isfinite(price), np.isfinite(w_trade))
+        if mask_invalid.any():
+            i = np.nonzero(mask_invalid)[0][0]
+            raise ValueError("NaN or Inf encountered! \n"
+                             "trade_date={}, symbol={}, price={}, weight={}".format(self.ctx.trade_date,
+                                                                                    symbols_trade[i], price[i],
+                                                                                    w_trade[i]))
+        shares_raw = w_trade * turnover / price
+        # shares unit 100
+        shares = np.round(shares_raw / 100.) * 100  # TODO cash may be not enough
+        cash_used = np.sum(shares * price)
+        
+        # position of suspended symbols remains the same, weights of others are zero
+        sizes = np.zeros(len(w), dtype=object)
+        sizes[mask_trade] = shares.astype(np.int64).tolist()
+        for i in np.nonzero(mask_suspended)[0]:
+            current_pos = self.ctx.pm.get_position(symbols[i])
+            sizes[i] = current_pos.current_size if current_pos is not None else 0
+        
+        goals = [{'symbol': sec, 'size': size} for sec, size in zip(symbols.tolist(), sizes.tolist())]
+        cash_left = turnover - float(cash_used)
         return goals, cash_left
     
     def query_portfolio(self):
@@ -0,0 +1,270 @@
+# encoding: utf-8
+"""
+Run the same alpha backtest with many sets of parameters.
+
+The DataView is loaded once in the parent process. Worker processes are forked after that,
+so they share its memory (copy-on-write) instead of loading the hd5 file or unpickling the
+DataView again. Every run creates its own Context, AlphaTradeApi, PortfolioManager, AlphaStrategy
+and AlphaBacktestInstance, fields added by formulas in a run are only visible to that process.
+
+"""
+from __future__ import print_function
+
+import os
+import itertools
+import multiprocessing
+
+import six
+import numpy as np
+import pandas as pd
+
+from jaqs.trade import common
+from jaqs.trade import model
+from jaqs.trade.backtest import AlphaBacktestInstance, VectorizedAlphaBacktestInstance, calc_daily_value
+from jaqs.trade.portfoliomanager import PortfolioManager
+from jaqs.trade.strategy import AlphaStrategy
+from jaqs.trade.tradegateway import AlphaTradeApi
+
+
+# sweep of the running ParameterSweep.run, inherited by forked workers
+_SWEEP = None
+
+
+def expand_grid(grid):
+    """
+    Parameters
+    ----------
+    grid : dict
+        {parameter name: list of values}
+
+    Returns
+    -------
+    list of dict
+        All combinations of values, sorted by parameter name then by order of values.
+
+    """
+    names = sorted(grid.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*[list(grid[name]) for name in names])]
+
+
+def calc_performance(df_trades, df_close, init_balance, end_date=0):
+    """
+    Performance metrics of a portfolio from its trades and close prices, see calc_daily_value.
+
+    Parameters
+    ----------
+    df_trades : pd.DataFrame
+        Same format as PortfolioManager.get_trades_df.
+    df_close : pd.DataFrame
+        Close price (not adjusted), index is trade date, column is symbol.
+    init_balance : float
+    end_date : int
+        Last date to evaluate, default is last date of df_close.
+
+    Returns
+    -------
+    metrics : dict
+    ser_value : pd.Series
+        Daily total value (cash + market value) from the first trade date to end_date.
+
+    """
+    metrics = {'Number of Trades': len(df_trades)}
+    df_daily = calc_daily_value(df_trades, df_close, init_balance, end_date=end_date)
+    if not len(df_daily):
+        return metrics, pd.Series(dtype=float)
+
+    ser_value = df_daily['total']
+    ser_ret = ser_value.pct_change().dropna()
+    turnover = df_trades['fill_size'].values.astype(float) * df_trades['fill_price'].values.astype(float)
+
+    years = max(len(ser_ret), 1) * 1.0 / common.CALENDAR_CONST.TRADE_DAYS_PER_YEAR
+    total_return = ser_value.iat[-1] / init_balance - 1.0
+    cum_peak = np.maximum.accumulate(ser_value.values)
+    metrics['Final Value'] = ser_value.iat[-1]
+    metrics['Total Return (%)'] = 100 * total_return
+    metrics['Annual Return (%)'] = 100 * (np.power(1.0 + total_return, 1.0 / years) - 1.0)
+    metrics['Annual Volatility (%)'] = 100 * ser_ret.std() * np.sqrt(common.CALENDAR_CONST.TRADE_DAYS_PER_YEAR)
+    metrics['Sharpe Ratio'] = (metrics['Annual Return (%)'] / metrics['Annual Volatility (%)']
+                               if metrics['Annual Volatility (%)'] > 0 else np.nan)
+    metrics['Maximum Drawdown (%)'] = 100 * np.max(1.0 - ser_value.values / cum_peak)
+    metrics['Commission'] = df_daily['commission'].sum()
+    metrics['Turnover Ratio'] = turnover.sum() / ser_value.mean() / years
+    return metrics, ser_value
+
+
+def _run_in_worker(i):
+    return _SWEEP.run_single(i)
+
+
+class ParameterSweep(object):
+    """
+    Run AlphaBacktestInstance once for each combination of parameters of a grid.
+
+    Parameters
+    ----------
+    dataview : DataView or str
+        DataView which has been prepared, or folder path to load it from.
+    props : dict
+        Base configuration of backtest (start_date, end_date, init_balance, etc.).
+    grid : dict
+        {parameter name: list of values}. Each combination is updated to props of a run, e.g.
+        {'n_periods': [1, 2], 'position_ratio': [0.5, 1.0], 'pc_method': ['equal_weight']}.
+        Parameters used by formulas are also put in the grid.
+    strategy_factory : callable, optional
+        strategy_factory(props) returns a new AlphaStrategy with its models for a run.
+        Default is AlphaStrategy(pc_method=props['pc_method']).
+    formulas : dict, optional
+        {field name: formula}, formula is a template for str.format with parameters of a run,
+        e.g. {'ret': 'Return(close_adj, {window})'}. Fields are added to DataView before each run.
+    n_jobs : int or None, optional
+        Number of worker processes. None for number of CPUs, 1 for running in current process.
+    vectorized : bool, optional
+        Use VectorizedAlphaBacktestInstance for screening, False by default.
+
+    Attributes
+    ----------
+    params : list of dict
+        Parameters of each run, index of the list is run_id.
+    results : pd.DataFrame
+        One row for each run, columns are parameters and performance metrics.
+    trades : pd.DataFrame
+        Trades of all runs, with column run_id.
+
+    """
+    def __init__(self, dataview, props, grid, strategy_factory=None, formulas=None, n_jobs=None,
+                 vectorized=False):
+        if isinstance(dataview, six.string_types):
+            from jaqs.data import DataView
+            folder_path = dataview
+            dataview = DataView()
+            dataview.load_dataview(folder_path=folder_path)
+        self.dataview = dataview
+        self.props = props
+        self.grid = grid
+        self.strategy_factory = strategy_factory if strategy_factory is not None else self._default_strategy
+        self.formulas = formulas if formulas is not None else dict()
+        self.n_jobs = n_jobs
+        self.vectorized = vectorized
+
+        self.params = expand_grid(grid)
+        self.folder_path = None
+        self.results = None
+        self.trades = None
+
+    @staticmethod
+    def _default_strategy(props):
+        return AlphaStrategy(pc_method=props.get('pc_method', 'equal_weight'))
+
+    def _get_props(self, params):
+        props = dict(self.props)
+        props.update(params)
+        return props
+
+    def run_single(self, run_id):
+        """
+        Run backtest with parameters of one run in current process.
+
+        Parameters
+        ----------
+        run_id : int
+
+        Returns
+        -------
+        metrics : dict
+        df_trades : pd.DataFrame
+
+        """
+        params = self.params[run_id]
+        props = self._get_props(params)
+        dv = self.dataview
+        for field_name, formula in self.formulas.items():
+            dv.add_formula(field_name, formula.format(**params), is_quarterly=False)
+
+        strategy = self.strategy_factory(props)
+        pm = PortfolioManager()
+        bt = VectorizedAlphaBacktestInstance() if self.vectorized else AlphaBacktestInstance()
+        trade_api = AlphaTradeApi()
+        context = model.Context(dataview=dv, instance=bt, strategy=strategy, trade_api=trade_api, pm=pm)
+        for m in [strategy.signal_model, strategy.stock_selector, strategy.cost_model, strategy.risk_model]:
+            if m is not None:
+                m.register_context(context)
+
+        bt.init_from_config(props)
+        bt.run_alpha()
+        if self.folder_path is not None:
+            bt.save_results(folder_path=os.path.join(self.folder_path, str(run_id)))
+
+        df_trades = bt.get_trades_df()
+        metrics, _ = calc_performance(df_trades, dv.get_ts('close', start_date=dv.extended_start_date_d),
+                                      pm.init_balance, end_date=bt.end_date)
+        return metrics, df_trades
+
+    def run(self, folder_path=None):
+        """
+        Run all combinations of parameters.
+
+        Parameters
+        ----------
+        folder_path : str, optional
+            If provided, results of each run are saved to sub-folder <run_id> (same as
+            AlphaBacktestInstance.save_results), and the result table to summary.csv.
+
+        Returns
+        -------
+        pd.DataFrame
+            self.results
+
+        """
+        global _SWEEP
+
+        self.folder_path = os.path.abspath(folder_path) if folder_path is not None else None
+        n_jobs = self.n_jobs if self.n_jobs is not None else multiprocessing.cpu_count()
+        n_jobs = min(n_jobs, len(self.params))
+        run_ids = list(range(len(self.params)))
+
+        fork_context = None
+        if n_jobs > 1 and hasattr(os, 'fork'):
+            try:
+                fork_context = multiprocessing.get_context('fork')
+            except AttributeError:
+                # Python 2 always forks on POSIX
+                fork_context = multiprocessing
+
+        if fork_context is None:
+            outputs = [self.run_single(i) for i in run_ids]
+        else:
+            # build snapshot index once, so that workers share it instead of each building its own.
+            # add_formula in a worker drops it, so it is only built when no formula is added
+            dv = self.dataview
+            snapshot_before = dv._snapshot
+            if not self.formulas and dv.dates is not None and len(dv.dates):
+                dv.update_snapshot()
+            _SWEEP = self
+            pool = fork_context.Pool(processes=n_jobs)
+            try:
+                outputs = pool.map(_run_in_worker, run_ids)
+            finally:
+                pool.close()
+                pool.join()
+                _SWEEP = None
+                # the caller's DataView is left as it was
+                dv._snapshot = snapshot_before
+
+        rows = []
+        trades = []
+        for run_id, (metrics, df_trades) in zip(run_ids, outputs):
+            row = dict(self.params[run_id])
+            row.update(metrics)
+            rows.append(row)
+            df_trades = df_trades.reset_index(drop=True)
+            df_trades.insert(0, 'run_id', run_id)
+            trades.append(df_trades)
+
+        df_res = pd.DataFrame(rows, index=pd.Index(run_ids, name='run_id'))
+        param_names = sorted(self.grid.keys())
+        self.results = df_res.loc[:, param_names + [c for c in df_res.columns if c not in param_names]]
+        self.trades = pd.concat(trades, axis=0, ignore_index=True) if trades else pd.DataFrame()
+
+        if self.folder_path is not None:
+            self.results.to_csv(os.path.join(self.folder_path, 'summary.csv'))
+        return self.results
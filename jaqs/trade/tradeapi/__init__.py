@@ -8,6 +8,13 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import sys
+
 from .trade_api import TradeApi
 
 __all__ = ['TradeApi']
+
+# asyncio clients need Python 3.5+
+if sys.version_info >= (3, 5):
+    from .async_trade_api import AsyncTradeApi
+    __all__.append('AsyncTradeApi')
@@ -0,0 +1,247 @@
+# encoding: utf-8
+"""
+TradeApi for asyncio programs (Python 3.5+).
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+
+import pandas as pd
+
+from . import utils
+from .trade_api import EntrustOrder
+from jaqs.data.dataapi.jrpc_asyncio import AsyncJRpcClient
+
+
+# notification method -> class name of "obj" format
+_IND_CLASSES = {"oms.orderstatus_ind": "Order",
+                "oms.taskstatus_ind": "TaskStatus",
+                "oms.trade_ind": "Trade",
+                "oms.internal_order_ind": "QuoteOrder"}
+
+
+class AsyncTradeApi(object):
+    """
+    Same requests as TradeApi, as coroutines returning (result, msg). Order status, task status,
+    trade and internal order indications are read from an async iterator instead of callbacks.
+
+    The connection is opened by login, which must be awaited in the event loop that runs
+    all other calls. After a reconnection, login and use_strategy are done again.
+
+    Examples
+    --------
+    api = AsyncTradeApi("tcp://gw.quantos.org:8901/")
+    await api.login(username, password)
+    await api.use_strategy(strategy_id)
+    task_id, msg = await api.place_order("000025.SZ", "Buy", 57, 100)
+    async for method, data in api.indications():
+        print(method, data)
+
+    """
+    def __init__(self, addr, prod_type="jzts"):
+        self._addr = addr
+        self._remote = AsyncJRpcClient(data_format="msgpack" if prod_type == "jzts" else "msgpack_snappy")
+        self._remote.on_connected = self._on_connected
+
+        self._username = ""
+        self._password = ""
+        self._strategy_id = 0
+        self._strategy_selected = False
+        self._data_format = "default"
+
+    async def login(self, username, password, format=""):
+        if self._remote._sock is None:
+            self._remote.connect(self._addr)
+        if not await self._remote.wait_connected(timeout=3):
+            return (None, "-1,no connection")
+
+        self._username = username
+        self._password = password
+        return await self._do_login(format=format)
+
+    async def logout(self):
+        cr = await self._remote.call("jaqs.auth.logout", {})
+        return utils.extract_result(cr)
+
+    def close(self):
+        self._remote.close()
+
+    def set_data_format(self, format):
+        self._data_format = format
+
+    def set_heartbeat(self, interval, timeout):
+        self._remote.set_heartbeat_options(interval, timeout)
+
+    async def use_strategy(self, strategy_id):
+        if strategy_id:
+            self._strategy_id = strategy_id
+            return await self._do_use_strategy()
+        else:
+            cr = await self._remote.call("auth.use_strategy", {"account_id": 0})
+            r, msg = utils.extract_result(cr)
+            self._strategy_selected = r
+            return (r, msg)
+
+    def indications(self, methods=None, maxsize=0):
+        """
+        Async iterator of (method, data) of indications pushed by the trade server.
+
+        Parameters
+        ----------
+        methods : list of str, optional
+            Default is all of oms.orderstatus_ind, oms.taskstatus_ind, oms.trade_ind, oms.internal_order_ind.
+        maxsize : int
+            Max number of waiting indications, 0 for no limit.
+
+        Returns
+        -------
+        RpcStream
+            Call its close() to stop receiving.
+
+        """
+        if methods is None:
+            methods = sorted(_IND_CLASSES.keys())
+        return self._remote.stream(methods, maxsize=maxsize, convert=self._convert_ind)
+
+    async def place_order(self, security, action, price, size, algo="", algo_param={}, userdata=""):
+        rpc_params = {"security": security,
+                      "action": action,
+                      "price": price,
+                      "size": int(size),
+                      "algo": algo,
+                      "algo_param": json.dumps(algo_param),
+                      "user": self._username,
+                      "userdata": userdata}
+        return await self._call("jaqs.order.exec", rpc_params)
+
+    async def place_batch_order(self, orders, algo="", algo_param={}, userdata=""):
+        if not orders or not isinstance(orders, (list, tuple)):
+            return (None, "empty order")
+
+        if isinstance(orders[0], EntrustOrder):
+            orders = [{"security": o.security, "action": o.action, "price": o.price, "size": int(o.size)}
+                      for o in orders]
+
+        rpc_params = {"orders": orders,
+                      "algo": algo,
+                      "algo_param": json.dumps(algo_param),
+                      "user": self._username,
+                      "userdata": userdata}
+        return await self._call("oms.place_batch_order", rpc_params)
+
+    async def cancel_order(self, task_id):
+        return await self._call("jaqs.order.cancel", {"task_id": task_id})
+
+    async def goal_portfolio(self, positions, algo="", algo_param={}, userdata=""):
+        """
+        positions format:
+            [ {"security": "000001.SZ", "ref_price": 10.0, "size" : 100}, ...]
+        """
+        if isinstance(positions, pd.DataFrame):
+            positions = [{'security': security, 'ref_price': float(ref_price), 'size': int(size)}
+                         for security, ref_price, size in zip(positions.index, positions['ref_price'],
+                                                              positions['size'])]
+
+        rpc_params = {"positions": positions,
+                      "algo": algo,
+                      "algo_param": json.dumps(algo_param),
+                      "user": self._username,
+                      "userdata": userdata}
+        return await self._call("pms.goal_portfolio", rpc_params, failed=False)
+
+    async def stop_portfolio(self):
+        return await self._call("pms.stop_portfolio", {}, failed=False)
+
+    async def query_account(self, format=""):
+        return await self._query("jaqs.account.query", {}, format, "Account")
+
+    async def query_position(self, mode="all", securities="", format=""):
+        return await self._query("jaqs.position.query", {"mode": mode, "security": securities}, format, "Position")
+
+    async def query_net_position(self, mode="all", securities="", format=""):
+        return await self._query("oms.query_net_position", {"mode": mode, "security": securities}, format,
+                                 "NetPosition")
+
+    async def query_task(self, task_id=-1, format=""):
+        return await self._query("oms.query_task", {"task_id": task_id}, format, "Task")
+
+    async def query_order(self, task_id=-1, format=""):
+        return await self._query("jaqs.order.status", {"task_id": task_id}, format, "Order")
+
+    async def query_trade(self, task_id=-1, format=""):
+        return await self._query("oms.query_trade", {"task_id": task_id}, format, "Trade")
+
+    async def query_portfolio(self, format=""):
+        return await self._query("pms.query_portfolio", {}, format, "NetPosition", index_column="security")
+
+    async def query_universe(self, format=""):
+        return await self._query("oms.query_universe", {}, format, "UniverseItem")
+
+    def _get_format(self, format, default_format):
+        if format:
+            return format
+        elif self._data_format != "default":
+            return self._data_format
+        else:
+            return default_format
+
+    def _check_session(self):
+        if not self._remote.connected:
+            return (False, "no connection")
+        return (True, "")
+
+    async def _call(self, method, rpc_params, failed=None):
+        """Send request after checking session, failed is the result if there is no session."""
+        r, msg = self._check_session()
+        if not r:
+            return (failed, msg)
+
+        cr = await self._remote.call(method, rpc_params)
+        return utils.extract_result(cr)
+
+    async def _query(self, method, rpc_params, format, class_name, index_column=None):
+        r, msg = self._check_session()
+        if not r:
+            return (None, msg)
+
+        data_format = self._get_format(format, "pandas")
+        if data_format == "pandas":
+            rpc_params["format"] = "columnset"
+
+        cr = await self._remote.call(method, rpc_params)
+        return utils.extract_result(cr, index_column=index_column, data_format=data_format, class_name=class_name)
+
+    def _convert_ind(self, method, data):
+        if self._data_format == "obj":
+            data = utils.to_obj(_IND_CLASSES.get(method, "Indication"), data)
+        return method, data
+
+    async def _do_login(self, format=""):
+        if self._username and self._password:
+            rpc_params = {"username": self._username,
+                          "password": self._password}
+            cr = await self._remote.call("jaqs.auth.login", rpc_params)
+            f = self._get_format(format, "")
+            if f != "obj" and f != "":
+                f = ""
+            return utils.extract_result(cr, data_format=f, class_name="UserInfo")
+        else:
+            return (False, "-1,empty username or password")
+
+    async def _do_use_strategy(self):
+        if self._strategy_id:
+            cr = await self._remote.call("auth.use_strategy", {"account_id": self._strategy_id})
+            r, msg = utils.extract_result(cr)
+            self._strategy_selected = r
+            return (r, msg)
+        else:
+            return (False, "-1,no strategy_id was specified")
+
+    async def _on_connected(self):
+        self._strategy_selected = False
+        await self._do_login()
+        await self._do_use_strategy()
@@ -2,6 +2,7 @@
 
 from __future__ import print_function, unicode_literals
 
+import bisect
 import copy
 import time
 
@@ -656,6 +657,7 @@ class AlphaTradeApi(BaseTradeApi):
 
     def init_from_config(self, props):
         self.commission_rate = props.get('commission_rate', 0.0)
+        self._simulator.fill_model = make_fill_model(props)
         
         self.set_order_status_callback(lambda ind: self.ctx.strategy.on_order_status(ind))
         self.set_trade_callback(lambda ind: self.ctx.strategy.on_trade(ind))
@@ -831,6 +833,96 @@ class AlphaTradeApi(BaseTradeApi):
         return results
 
 
+class FillModel(object):
+    """
+    Decide how much of triggered orders is filled. Fill all remaining size.
+    
+    Attributes
+    ----------
+    needs_volume : bool
+        Whether fill size depends on bar volume.
+    
+    """
+    needs_volume = False
+    
+    def get_fill_size(self, symbols, remain_sizes, volumes):
+        """
+        Fill size of all orders triggered by a bar, computed at once.
+
+        Parameters
+        ----------
+        symbols : array-like of str
+            Symbol of each order.
+        remain_sizes : array-like of float
+            Remaining (not filled) size of each order, in order of priority.
+        volumes : array-like of float
+            Volume of the bar of each order's symbol.
+
+        Returns
+        -------
+        np.ndarray
+            Fill size of each order, 0 for not filled.
+
+        """
+        return np.asarray(remain_sizes)
+
+
+class ParticipationFillModel(FillModel):
+    """
+    Orders of a symbol can fill at most participation_rate of its bar volume in total,
+    shared in order of priority. The rest is left to later bars (days for DailyStockSimulator).
+
+    Attributes
+    ----------
+    participation_rate : float
+    lot_size : int
+        Partial fills are rounded down to multiples of lot_size, e.g. 100 for A-share stocks.
+        Filling all remaining size of an order is not rounded.
+
+    """
+    needs_volume = True
+    
+    def __init__(self, participation_rate=0.1, lot_size=1):
+        self.participation_rate = participation_rate
+        self.lot_size = lot_size
+
+    def get_fill_size(self, symbols, remain_sizes, volumes):
+        dtype = np.asarray(remain_sizes).dtype
+        remain_sizes = np.asarray(remain_sizes, dtype=float)
+        volumes = np.nan_to_num(np.asarray(volumes, dtype=float))
+        if not len(remain_sizes):
+            return remain_sizes
+        
+        # sizes of orders before each order of the same symbol
+        _, codes = np.unique(np.asarray(symbols), return_inverse=True)
+        idx = np.argsort(codes, kind='mergesort')
+        sorted_codes = codes[idx]
+        sorted_sizes = remain_sizes[idx]
+        cum_before = np.cumsum(sorted_sizes) - sorted_sizes
+        is_group_start = np.r_[True, sorted_codes[1:] != sorted_codes[:-1]]
+        group_base = np.maximum.accumulate(np.where(is_group_start, cum_before, 0.0))
+        size_before = np.empty_like(remain_sizes)
+        size_before[idx] = cum_before - group_base
+        
+        capacity = np.floor(volumes * self.participation_rate)
+        fill_size = np.clip(capacity - size_before, 0.0, remain_sizes)
+        partial = fill_size < remain_sizes
+        fill_size[partial] = np.floor(fill_size[partial] / self.lot_size) * self.lot_size
+        return fill_size.astype(dtype)
+
+
+def make_fill_model(props):
+    """
+    Create fill model from props: ParticipationFillModel if "participation_rate" is given
+    (with optional "lot_size"), else FillModel.
+    
+    """
+    participation_rate = props.get('participation_rate', None)
+    if participation_rate is None:
+        return FillModel()
+    return ParticipationFillModel(participation_rate, lot_size=props.get('lot_size', 1))
+
+
 class DailyStockSimulator(object):
     """This is not event driven!
 
@@ -838,12 +930,15 @@ class DailyStockSimulator(object):
     ----------
     __orders : list of Order
         Store orders that have not been filled.
+    fill_model : FillModel
+        Decide fill size of orders. Orders not completely filled are matched again on later days.
 
     """
     
-    def __init__(self):
+    def __init__(self, fill_model=None):
         # TODO heap is better for insertion and deletion. We only need implement search of heapq module.
         self.__orders = dict()
+        self.fill_model = FillModel() if fill_model is None else fill_model
         self.seq_gen = SequenceGenerator()
         
         self.date = 0
@@ -932,8 +1027,10 @@ class DailyStockSimulator(object):
     def match(self, price_dic, date=19700101, time=150000):
         self._validate_price(price_dic)
         
-        results = []
-        for order in self.__orders.values():
+        orders = list(self.__orders.values())
+        fill_prices = []
+        volumes = []
+        for order in orders:
             symbol = order.symbol
             symbol_dic = price_dic[symbol]
             
@@ -950,9 +1047,26 @@ class DailyStockSimulator(object):
                 fill_price = symbol_dic['close']
             else:
                 raise NotImplementedError("order class {} not support!".format(order.__class__))
-            
-            # get fill size
-            fill_size = order.entrust_size - order.fill_size
+            fill_prices.append(fill_price)
+            if 'volume' in symbol_dic:
+                volumes.append(symbol_dic['volume'])
+            elif self.fill_model.needs_volume:
+                # no volume means no capacity, the order would never be filled
+                raise ValueError("Fill model {} needs volume, but prices of {} have no volume. "
+                                 "Add field volume to data or remove participation_rate.".format(
+                                     type(self.fill_model).__name__, symbol))
+            else:
+                volumes.append(np.nan)
+        
+        # get fill size
+        fill_sizes = self.fill_model.get_fill_size([order.symbol for order in orders],
+                                                   [order.entrust_size - order.fill_size for order in orders],
+                                                   volumes).tolist()
+        
+        results = []
+        for order, fill_price, fill_size in zip(orders, fill_prices, fill_sizes):
+            if not fill_size > 0:
+                continue
             
             # create trade indication
             trade_ind = Trade(order)
@@ -967,6 +1081,8 @@ class DailyStockSimulator(object):
             order.fill_size += fill_size
             if order.fill_size == order.entrust_size:
                 order.order_status = common.ORDER_STATUS.FILLED
+            else:
+                order.order_status = common.ORDER_STATUS.ACCEPTED
                 
             order_status_ind = OrderStatusInd(order)
             
@@ -981,12 +1097,148 @@ class DailyStockSimulator(object):
 # ---------------------------------------------
 # For Event-driven Strategy
 
-class OrderBook(object):
+_MAX_NO = float('inf')
+
+
+class _PriceQueue(object):
+    """
+    Orders of one symbol sorted by (entrust_price, entrust_no).
+    
+    """
+    def __init__(self):
+        self.keys = []
+        self.orders = []
+    
+    def __len__(self):
+        return len(self.keys)
+    
+    def add(self, key, order):
+        i = bisect.bisect_right(self.keys, key)
+        self.keys.insert(i, key)
+        self.orders.insert(i, order)
+    
+    def remove(self, key):
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            del self.keys[i]
+            del self.orders[i]
+    
+    def range_le(self, price):
+        """Index range of orders with entrust_price <= price."""
+        return 0, bisect.bisect_left(self.keys, (price, _MAX_NO))
+    
+    def range_ge(self, price):
+        """Index range of orders with entrust_price >= price."""
+        return bisect.bisect_left(self.keys, (price, -1)), len(self.keys)
+    
+    def remove_finished(self, start, end):
+        """Remove finished orders within index range [start, end)."""
+        keep = [i for i in range(start, end) if not self.orders[i].is_finished]
+        if len(keep) < end - start:
+            self.keys[start: end] = [self.keys[i] for i in keep]
+            self.orders[start: end] = [self.orders[i] for i in keep]
+
+
+class _SymbolOrderBook(object):
+    """
+    Live orders of one symbol.
+    
+    A bar with range [low, high] triggers buy limit and sell stop orders with entrust_price >= low,
+    sell limit and buy stop orders with entrust_price <= high. These two groups are kept in two
+    price-sorted queues, so that only triggered orders are visited. Other orders (e.g. VWAP) are
+    visited on every bar.
+    
+    """
     def __init__(self):
+        self.ge_low = _PriceQueue()
+        self.le_high = _PriceQueue()
+        self.others = dict()
+    
+    def __len__(self):
+        return len(self.ge_low) + len(self.le_high) + len(self.others)
+    
+    def _get_queue(self, order):
+        if order.order_type == common.ORDER_TYPE.LIMIT:
+            if common.ORDER_ACTION.is_positive(order.entrust_action):
+                return self.ge_low
+            elif common.ORDER_ACTION.is_negative(order.entrust_action):
+                return self.le_high
+        elif order.order_type == common.ORDER_TYPE.STOP:
+            if common.ORDER_ACTION.is_positive(order.entrust_action):
+                return self.le_high
+            elif common.ORDER_ACTION.is_negative(order.entrust_action):
+                return self.ge_low
+        return None
+    
+    @staticmethod
+    def _get_key(order):
+        return order.entrust_price, int(order.entrust_no)
+    
+    def add(self, order):
+        queue = self._get_queue(order)
+        if queue is None:
+            self.others[order.entrust_no] = order
+        else:
+            queue.add(self._get_key(order), order)
+    
+    def remove(self, order):
+        queue = self._get_queue(order)
+        if queue is None:
+            self.others.pop(order.entrust_no, None)
+        else:
+            queue.remove(self._get_key(order))
+    
+    def triggered(self, low, high):
+        """
+        Returns
+        -------
+        orders : list of Order
+            Orders may be filled by a bar with range [low, high].
+        ranges : list of tuple
+            (queue, start, end), index ranges of these orders in queues.
+            
+        """
+        ranges = [(self.ge_low, ) + self.ge_low.range_ge(low),
+                  (self.le_high, ) + self.le_high.range_le(high)]
+        orders = list(self.others.values())
+        for queue, start, end in ranges:
+            orders.extend(queue.orders[start: end])
+        return orders, ranges
+    
+    def remove_finished(self, ranges):
+        for queue, start, end in ranges:
+            queue.remove_finished(start, end)
+        for entrust_no in [k for k, v in self.others.items() if v.is_finished]:
+            del self.others[entrust_no]
+
+
+class OrderBook(object):
+    """
+    Live orders of backtest, indexed by symbol.
+    
+    Attributes
+    ----------
+    orders : dict
+        {entrust_no: Order}
+    fill_model : FillModel
+        Decide fill size of triggered orders. Orders not completely filled are matched again on later bars.
+    
+    """
+    def __init__(self, fill_model=None):
         self.orders = dict()
+        self._books = dict()
         
         self.seq_gen = SequenceGenerator()
-        self.participation_rate = 1.0
+        self.fill_model = FillModel() if fill_model is None else fill_model
+    
+    @property
+    def participation_rate(self):
+        """Kept for compatibility, participation rate of fill_model (1.0 if fill size is not limited by volume)."""
+        return getattr(self.fill_model, 'participation_rate', 1.0)
+    
+    @participation_rate.setter
+    def participation_rate(self, value):
+        self.fill_model = ParticipationFillModel(value, lot_size=getattr(self.fill_model, 'lot_size', 1))
     
     def _next_fill_no(self):
         return str(self.seq_gen.get_next('trade_id'))
@@ -1001,6 +1253,10 @@ class OrderBook(object):
         neworder.entrust_no = entrust_no
         
         self.orders[entrust_no] = neworder
+        book = self._books.get(neworder.symbol, None)
+        if book is None:
+            book = self._books[neworder.symbol] = _SymbolOrderBook()
+        book.add(neworder)
         
         return entrust_no
     
@@ -1023,137 +1279,103 @@ class OrderBook(object):
             return self._make_trade_bar(quote)
     
     def _make_trade_bar(self, quote_dic):
+        """
+        Match orders of symbols in quote_dic. Only orders triggered by the price range of the bar
+        are visited, in the order they are added.
         
+        """
         result = []
         
-        for entrust_no, order in self.orders.items():
-            quote = quote_dic[order.symbol]
-            low = quote.low
-            high = quote.high
-            #quote_date = quote.trade_date
-            quote_date = quote.date
-            quote_time = quote.time
-            volume = quote.volume
-            
-            '''
-            if order.order_type == common.ORDER_TYPE.LIMIT:
-                if order.entrust_action == common.ORDER_ACTION.BUY and order.entrust_price >= low:
-                    trade = Trade()
-                    trade.init_from_order(order)
-                    trade.send_fill_info(order.entrust_price, order.entrust_size,
-                                         quote_date, quote_time,
-                                         self._next_fill_no())
-                    
-                    order.order_status = common.ORDER_STATUS.FILLED
-                    order.fill_size = trade.fill_size
-                    order.fill_price = trade.fill_price
-                    
-                    orderstatus_ind = OrderStatusInd()
-                    orderstatus_ind.init_from_order(order)
-                    
-                    result.append((trade, orderstatus_ind))
-                    
-                elif order.entrust_action == common.ORDER_ACTION.SELL and order.entrust_price <= high:
-                    trade = Trade()
-                    trade.init_from_order(order)
-                    trade.send_fill_info(order.entrust_price, order.entrust_size,
-                                         quote_date, quote_time,
-                                         self._next_fill_no())
-                    
-                    order.order_status = common.ORDER_STATUS.FILLED
-                    order.fill_size = trade.fill_size
-                    order.fill_price = trade.fill_price
-                    
-                    orderstatus_ind = OrderStatusInd()
-                    orderstatus_ind.init_from_order(order)
-
-                    result.append((trade, orderstatus_ind))
-            
-            elif order.order_type == common.ORDER_TYPE.STOP:
-                if order.entrust_action == common.ORDER_ACTION.BUY and order.entrust_price <= high:
-                    trade = Trade()
-                    trade.init_from_order(order)
-                    trade.send_fill_info(order.entrust_price, order.entrust_size,
-                                         quote_date, quote_time,
-                                         self._next_fill_no())
-                    
-                    order.order_status = common.ORDER_STATUS.FILLED
-                    order.fill_size = trade.fill_size
-                    order.fill_price = trade.fill_price
-                    orderstatus_ind = OrderStatusInd()
-                    orderstatus_ind.init_from_order(order)
-                    result.append((trade, orderstatus_ind))
-                
-                if order.entrust_action == common.ORDER_ACTION.SELL and order.entrust_price >= low:
-                    trade = Trade()
-                    trade.init_from_order(order)
-                    trade.send_fill_info(order.entrust_price, order.entrust_size,
-                                         quote_date, quote_time,
-                                         self._next_fill_no())
-                    
-                    order.order_status = common.ORDER_STATUS.FILLED
-                    order.fill_size = trade.fill_size
-                    order.fill_price = trade.fill_price
-                    orderstatus_ind = OrderStatusInd()
-                    orderstatus_ind.init_from_order(order)
-                    result.append((trade, orderstatus_ind))
-            '''
-            
-            entrust_price = order.entrust_price
-            entrust_size = order.entrust_size
-            
-            fill_size = 0
-            if order.order_type == common.ORDER_TYPE.LIMIT:
-                if common.ORDER_ACTION.is_positive(order.entrust_action) and entrust_price >= low:
-                    fill_price = min(entrust_price, high)
-                    # fill_size = min(entrust_size, self.participation_rate * volume)
-                    fill_size = entrust_size
-                    
-                elif common.ORDER_ACTION.is_negative(order.entrust_action) and order.entrust_price <= high:
-                    fill_price = max(entrust_price, low)
-                    # fill_size = min(entrust_size, self.participation_rate * volume)
-                    fill_size = entrust_size
-
-            elif order.order_type == common.ORDER_TYPE.STOP:
-                if common.ORDER_ACTION.is_positive(order.entrust_action) and order.entrust_price <= high:
-                    fill_price = max(entrust_price, low)
-                    # fill_size = min(entrust_size, self.participation_rate * volume)
-                    fill_size = entrust_size
-
-                if common.ORDER_ACTION.is_negative(order.entrust_action) and order.entrust_price >= low:
-                    fill_price = min(entrust_price, high)
-                    # fill_size = min(entrust_size, self.participation_rate * volume)
-                    fill_size = entrust_size
-            
-            elif order.order_type == common.ORDER_TYPE.VWAP:
-                fill_price = quote.vwap
-                fill_size = entrust_size
-
-            if not fill_size:
+        candidates = []
+        touched = []
+        for symbol, book in self._books.items():
+            quote = quote_dic.get(symbol, None)
+            if quote is None or not len(book):
                 continue
-                
-            trade_ind = Trade(order)
-            trade_ind.set_fill_info(fill_price, fill_size,
-                                    quote_date, quote_time,
-                                    self._next_fill_no(),
-                                    trade_date=quote.trade_date)
-            
-            order.fill_price = ((order.fill_price * order.fill_size + fill_size * fill_price)
-                                / (order.fill_size + fill_size))
-            order.fill_size += fill_size
-            if order.fill_size == order.entrust_size:
-                order.order_status = common.ORDER_STATUS.FILLED
-            
-            order_status_ind = OrderStatusInd(order)
-            
-            result.append((trade_ind, order_status_ind))
-            
-        self.orders = {k: v for k, v in self.orders.items() if not v.is_finished}
-
+            orders, ranges = book.triggered(quote.low, quote.high)
+            if orders:
+                candidates.extend((int(order.entrust_no), order, quote) for order in orders)
+                touched.append((book, ranges))
+        candidates.sort(key=lambda x: x[0])
+        
+        matched = []
+        for _, order, quote in candidates:
+            fill_price = self._get_fill_price_by_bar(order, quote)
+            if fill_price is not None:
+                matched.append((order, quote, fill_price))
+        
+        if self.fill_model.needs_volume:
+            for order, quote, _ in matched:
+                if isinstance(quote, BarView) and not quote.has_column('volume'):
+                    # volume of the bar would be 0, the order would never be filled
+                    raise ValueError("Fill model {} needs volume, but bars of {} have no volume. "
+                                     "Add field volume to data or remove participation_rate.".format(
+                                         type(self.fill_model).__name__, order.symbol))
+        
+        fill_sizes = self.fill_model.get_fill_size([order.symbol for order, _, _ in matched],
+                                                   [order.entrust_size - order.fill_size for order, _, _ in matched],
+                                                   [quote.volume for _, quote, _ in matched]).tolist()
+        for (order, quote, fill_price), fill_size in zip(matched, fill_sizes):
+            if fill_size > 0:
+                result.append(self._fill_order(order, fill_price, fill_size, quote))
+        
+        # remove finished orders in place, searched only among triggered orders
+        for book, ranges in touched:
+            book.remove_finished(ranges)
+        for _, order, _ in candidates:
+            if order.is_finished:
+                self.orders.pop(order.entrust_no, None)
+        
         return result
     
+    @staticmethod
+    def _get_fill_price_by_bar(order, quote):
+        """Return fill price if order is triggered by the bar, else None."""
+        low = quote.low
+        high = quote.high
+        entrust_price = order.entrust_price
+        
+        fill_price = None
+        if order.order_type == common.ORDER_TYPE.LIMIT:
+            if common.ORDER_ACTION.is_positive(order.entrust_action) and entrust_price >= low:
+                fill_price = min(entrust_price, high)
+            elif common.ORDER_ACTION.is_negative(order.entrust_action) and entrust_price <= high:
+                fill_price = max(entrust_price, low)
+
+        elif order.order_type == common.ORDER_TYPE.STOP:
+            if common.ORDER_ACTION.is_positive(order.entrust_action) and entrust_price <= high:
+                fill_price = max(entrust_price, low)
+            elif common.ORDER_ACTION.is_negative(order.entrust_action) and entrust_price >= low:
+                fill_price = min(entrust_price, high)
+        
+        elif order.order_type == common.ORDER_TYPE.VWAP:
+            fill_price = quote.vwap
+        
+        return fill_price
+    
+    def _fill_order(self, order, fill_price, fill_size, quote):
+        """Fill order and return (Trade, OrderStatusInd)."""
+        trade_ind = Trade(order)
+        trade_ind.set_fill_info(fill_price, fill_size,
+                                quote.date, quote.time,
+                                self._next_fill_no(),
+                                trade_date=quote.trade_date)
+        
+        order.fill_price = ((order.fill_price * order.fill_size + fill_size * fill_price)
+                            / (order.fill_size + fill_size))
+        order.fill_size += fill_size
+        if order.fill_size == order.entrust_size:
+            order.order_status = common.ORDER_STATUS.FILLED
+        else:
+            order.order_status = common.ORDER_STATUS.ACCEPTED
+        
+        order_status_ind = OrderStatusInd(order)
+        
+        return trade_ind, order_status_ind
+    
     def cancel_order(self, entrust_no):
         order = self.orders.pop(entrust_no)
+        self._books[order.symbol].remove(order)
         order.cancel_size = order.entrust_size - order.fill_size
         order.order_status = common.ORDER_STATUS.CANCELLED
         
@@ -1209,6 +1431,7 @@ class BacktestTradeApi(BaseTradeApi):
         self.entrust_no_task_id_map = dict()
         
         self.commission_rate = 0.0
+        self.fill_model = FillModel()
         
     def _get_next_num(self, key):
         """used to generate id for orders and trades."""
@@ -1219,13 +1442,14 @@ class BacktestTradeApi(BaseTradeApi):
     
     def init_from_config(self, props):
         self.commission_rate = props.get('commission_rate', 0.0)
+        self.fill_model = make_fill_model(props)
         
         self.set_order_status_callback(lambda ind: self.ctx.strategy.on_order_status(ind))
         self.set_trade_callback(lambda ind: self.ctx.strategy.on_trade(ind))
         self.set_task_status_callback(lambda ind: self.ctx.strategy.on_task_status(ind))
 
     def on_new_day(self, trade_date):
-        self._orderbook = OrderBook()
+        self._orderbook = OrderBook(fill_model=self.fill_model)
     
     def use_strategy(self, strategy_id):
         pass
@@ -1,11 +1,22 @@
 # encoding: utf-8
 import numpy as np
+import pandas as pd
+
+
+def _inverse_permutation(order, axis=-1):
+    """Equivalent to order.argsort(axis=axis) when order is a permutation along axis."""
+    res = np.empty_like(order)
+    idx = np.broadcast_to(np.arange(order.shape[axis]).reshape([-1 if i == axis % order.ndim else 1
+                                                                 for i in range(order.ndim)]),
+                          order.shape)
+    np.put_along_axis(res, order, idx, axis=axis)
+    return res
 
 
 def quantilize_without_nan(mat, n_quantiles=5, axis=-1):
     mask = np.isnan(mat)
     
-    rank = mat.argsort(axis=axis).argsort(axis=axis)  # int
+    rank = _inverse_permutation(mat.argsort(axis=axis), axis=axis)  # int
     
     count = np.sum(~mask, axis=axis)  # int
     divisor = count * 1. / n_quantiles  # float
@@ -19,6 +30,290 @@ def quantilize_without_nan(mat, n_quantiles=5, axis=-1):
     return res
 
 
+def _as_2d(mat):
+    mat = np.asarray(mat, dtype=float)
+    if mat.ndim == 1:
+        return mat.reshape(-1, 1)
+    return mat
+
+
+def _invalid_window_mask(mat, window):
+    """
+    True where the window ending at each row is not full or contains NaN.
+    There pandas rolling(window).apply does not call the function and gives NaN.
+
+    """
+    is_nan = np.isnan(mat)
+    n_nan = np.cumsum(is_nan, axis=0)
+    n_nan[window:] = n_nan[window:] - n_nan[:-window]
+    invalid = n_nan > 0
+    invalid[:window - 1] = True
+    return invalid
+
+
+def rolling_rank(mat, window):
+    """
+    Rank of the last value of each rolling window along axis 0.
+    
+    Parameters
+    ----------
+    mat : np.ndarray
+        shape = (n_dates, n_securities) or (n_dates, )
+    window : int
+
+    Returns
+    -------
+    res : np.ndarray
+        Same shape as mat, float. Ranks range from 1 to window.
+        Ties are ranked by position (earlier value gets smaller rank), which is the result of
+        np.argsort(np.argsort(arr))[-1] + 1 with a stable sort.
+        NaN where the window is not full or contains NaN.
+
+    """
+    shape = np.shape(mat)
+    mat = _as_2d(mat)
+    window = int(window)
+    res = np.empty(mat.shape)
+    res[:] = np.nan
+    if window > len(mat):
+        return res.reshape(shape)
+    
+    res[:] = 1.0
+    for lag in range(1, window):
+        res[lag:] += mat[:-lag] <= mat[lag:]
+    res[_invalid_window_mask(mat, window)] = np.nan
+    return res.reshape(shape)
+
+
+def rolling_weighted_sum(mat, weights):
+    """
+    Weighted sum of each rolling window along axis 0.
+    
+    Parameters
+    ----------
+    mat : np.ndarray
+        shape = (n_dates, n_securities) or (n_dates, )
+    weights : np.ndarray
+        Length of weights is window size. weights[0] is for the earliest value in the window.
+
+    Returns
+    -------
+    res : np.ndarray
+        Same shape as mat. NaN where the window is not full or contains NaN.
+
+    """
+    shape = np.shape(mat)
+    mat = _as_2d(mat)
+    weights = np.asarray(weights, dtype=float)
+    window = len(weights)
+    res = np.empty(mat.shape)
+    res[:] = np.nan
+    if window > len(mat):
+        return res.reshape(shape)
+    
+    n = len(mat) - window + 1
+    acc = np.zeros((n, mat.shape[1]))
+    for k in range(window):
+        acc += weights[k] * mat[k: k + n]
+    res[window - 1:] = acc
+    res[_invalid_window_mask(mat, window)] = np.nan
+    return res.reshape(shape)
+
+
+def rolling_product(mat, window):
+    """
+    Product of each rolling window along axis 0, multiplied from the earliest value.
+    
+    Parameters
+    ----------
+    mat : np.ndarray
+        shape = (n_dates, n_securities) or (n_dates, )
+    window : int
+
+    Returns
+    -------
+    res : np.ndarray
+        Same shape as mat. NaN where the window is not full or contains NaN.
+
+    """
+    shape = np.shape(mat)
+    mat = _as_2d(mat)
+    window = int(window)
+    res = np.empty(mat.shape)
+    res[:] = np.nan
+    if window > len(mat):
+        return res.reshape(shape)
+    
+    n = len(mat) - window + 1
+    acc = mat[:n].copy()
+    for k in range(1, window):
+        acc *= mat[k: k + n]
+    res[window - 1:] = acc
+    res[_invalid_window_mask(mat, window)] = np.nan
+    return res.reshape(shape)
+
+
+def encode_groups(mat):
+    """
+    Convert group labels (like industry codes) to integer codes.
+    
+    Parameters
+    ----------
+    mat : np.ndarray
+        Group labels of any dtype. NaN / None means no group.
+
+    Returns
+    -------
+    np.ndarray
+        Same shape as mat, dtype = int. -1 for no group.
+
+    """
+    mat = np.asarray(mat)
+    codes, _ = pd.factorize(mat.ravel())
+    return codes.reshape(mat.shape).astype(np.int64)
+
+
+def _run_bounds(is_new):
+    """For each position of a flat array divided into runs, return the first and the last position of its run."""
+    n = len(is_new)
+    pos = np.arange(n)
+    start = np.maximum.accumulate(np.where(is_new, pos, 0))
+    is_last = np.append(is_new[1:], True)
+    end = np.minimum.accumulate(np.where(is_last, pos, n - 1)[::-1])[::-1]
+    return start, end
+
+
+def _sort_cross_section(mat, groups, kind='quicksort'):
+    """
+    Sort each row of mat by (group, value). NaN values and values without group (code < 0) are put
+    last, in a segment of their own, so every other segment only contains valid values.
+    Equal values keep their order of position only if kind is a stable sort.
+
+    Returns
+    -------
+    order : np.ndarray
+        Column index of each sorted position.
+    valid : np.ndarray of bool
+        Whether the sorted position is a valid value.
+    seg_start, seg_end, tie_start, tie_end : np.ndarray
+        Flat positions of first and last element of the (row, group) segment and of the run of equal values.
+
+    """
+    invalid = np.isnan(mat)
+    order = np.argsort(mat, axis=1, kind=kind)
+    if groups is None:
+        # NaN is sorted last already
+        groups = invalid.astype(np.int64)
+    else:
+        groups = np.asarray(groups, dtype=np.int64)
+        invalid = invalid | (groups < 0)
+        groups = np.where(invalid, groups.max() + 1, groups)
+        # sort by value first, then stably by group
+        order = np.take_along_axis(order, np.argsort(np.take_along_axis(groups, order, axis=1), axis=1,
+                                                     kind='mergesort'), axis=1)
+    sorted_values = np.take_along_axis(mat, order, axis=1)
+    sorted_groups = np.take_along_axis(groups, order, axis=1)
+    valid = ~np.take_along_axis(invalid, order, axis=1)
+    
+    seg_new = np.ones(mat.shape, dtype=bool)
+    seg_new[:, 1:] = sorted_groups[:, 1:] != sorted_groups[:, :-1]
+    tie_new = seg_new.copy()
+    tie_new[:, 1:] |= sorted_values[:, 1:] != sorted_values[:, :-1]
+    
+    seg_start, seg_end = _run_bounds(seg_new.ravel())
+    tie_start, tie_end = _run_bounds(tie_new.ravel())
+    return order, valid, seg_start, seg_end, tie_start, tie_end
+
+
+def _scatter_cross_section(sorted_res, order, valid):
+    sorted_res = sorted_res.reshape(order.shape)
+    sorted_res[~valid] = np.nan
+    res = np.empty(order.shape)
+    np.put_along_axis(res, order, sorted_res, axis=1)
+    return res
+
+
+def rank_with_groups(mat, groups=None, method='min', normalize=False):
+    """
+    Rank values of each row within each group. NaN values are ignored.
+    
+    Parameters
+    ----------
+    mat : np.ndarray
+        shape = (n_dates, n_securities)
+    groups : np.ndarray or None
+        Integer group codes with the same shape as mat, see encode_groups. -1 for no group.
+        None for all securities in one group.
+    method : {'min', 'average', 'max', 'dense'}
+        How to rank equal values, same as pd.DataFrame.rank.
+    normalize : bool
+        If True, (rank - 1) / (max_rank - 1) (or / max_rank if max_rank is 1) in each group,
+        the result ranges in [0.0, 1.0].
+
+    Returns
+    -------
+    res : np.ndarray
+        Same shape as mat, float. NaN for NaN values or values without group.
+
+    """
+    mat = np.asarray(mat, dtype=float)
+    if mat.size == 0:
+        return np.empty(mat.shape) * np.nan
+    order, valid, seg_start, seg_end, tie_start, tie_end = _sort_cross_section(mat, groups)
+    
+    if method == 'min':
+        rank = tie_start - seg_start + 1.0
+    elif method == 'max':
+        rank = tie_end - seg_start + 1.0
+    elif method == 'average':
+        rank = (tie_start + tie_end) / 2.0 - seg_start + 1.0
+    elif method == 'dense':
+        n_ties = np.cumsum(tie_start == np.arange(len(tie_start)))
+        rank = (n_ties - n_ties[seg_start] + 1).astype(float)
+    else:
+        raise ValueError("method must be one of 'min', 'average', 'max', 'dense', but we have {}".format(method))
+    
+    if normalize:
+        # values are sorted in each segment, so the maximum rank is at the last position
+        dividend = rank[seg_end]
+        dividend = np.where(dividend > 1, dividend - 1, dividend)
+        rank = (rank - 1) / dividend
+    
+    return _scatter_cross_section(rank, order, valid)
+
+
+def quantilize_with_groups(mat, groups=None, n_quantiles=5):
+    """
+    Convert values of each row to the quantile number they belong to, within each group.
+    Small values get small quantile numbers, equal values are ordered by position.
+    
+    Parameters
+    ----------
+    mat : np.ndarray
+        shape = (n_dates, n_securities)
+    groups : np.ndarray or None
+        Integer group codes with the same shape as mat, see encode_groups. -1 for no group.
+        None for all securities in one group.
+    n_quantiles : int
+
+    Returns
+    -------
+    res : np.ndarray
+        Same shape as mat, float, from 1 to n_quantiles. NaN for NaN values or values without group.
+
+    """
+    mat = np.asarray(mat, dtype=float)
+    if mat.size == 0:
+        return np.empty(mat.shape) * np.nan
+    order, valid, seg_start, seg_end, tie_start, tie_end = _sort_cross_section(mat, groups, kind='mergesort')
+    
+    count = seg_end - seg_start + 1
+    divisor = count * 1. / n_quantiles
+    res = np.floor((np.arange(len(seg_start)) - seg_start) / divisor) + 1.0
+    
+    return _scatter_cross_section(res, order, valid)
+
+
 # Boolean, unsigned integer, signed integer, float, complex.
 _NUMERIC_KINDS = set('buifc')
 
@@ -70,19 +70,16 @@ def rank_with_mask(df, axis=1, mask=None, normalize=False, method='min'):
     If normalize, result will range in [0.0, 1.0]
 
     """
-    not_nan_mask = (~df.isnull())
+    values = df.values.astype(float)
+    if mask is not None:
+        if isinstance(mask, pd.DataFrame):
+            mask = mask.reindex(index=df.index, columns=df.columns).fillna(False).values
+        values = np.where(np.asarray(mask, dtype=bool), values, np.nan)
     
-    if mask is None:
-        mask = not_nan_mask
+    if axis == 0:
+        res = numeric.rank_with_groups(values.T, method=method, normalize=normalize).T
     else:
-        mask = np.logical_and(not_nan_mask, mask)
+        res = numeric.rank_with_groups(values, method=method, normalize=normalize)
     
-    rank = df[mask].rank(axis=axis, na_option='keep', method=method)
-    
-    if normalize:
-        dividend = rank.max(axis=axis)
-        SUB = 1
-        # for dividend = 1, do not subtract 1, otherwise there will be NaN
-        dividend.loc[dividend > SUB] = dividend.loc[dividend > SUB] - SUB
-        rank = rank.sub(SUB).div(dividend, axis=(1 - axis))
+    rank = pd.DataFrame(index=df.index, columns=df.columns, data=res)
     return rank
@@ -0,0 +1,58 @@
+# encoding: utf-8
+"""
+Compare the vectorized as-of engine (align / align2) with the original per-date implementation.
+
+Usage:
+    python benchmark_align.py [n_symbols] [n_years]
+
+"""
+from __future__ import print_function
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from jaqs.data.align import align, align2, align_loop, align2_loop
+
+
+def make_data(n_symbols, n_years, seed=0):
+    rng = np.random.RandomState(seed)
+    n_quarters = 4 * n_years + 8
+
+    report_date = np.array([(2008 + q // 4) * 10000 + [331, 630, 930, 1231][q % 4] for q in range(n_quarters)])
+    # announced 0 ~ 120 days after report date
+    ann = report_date.reshape(-1, 1) + rng.randint(0, 4, size=(n_quarters, n_symbols)) * 100
+    ann = ann.astype(float)
+    ann[rng.rand(n_quarters, n_symbols) < 0.05] = np.nan
+
+    symbols = ['{:06d}.SZ'.format(i) for i in range(n_symbols)]
+    df_ann = pd.DataFrame(index=report_date, columns=symbols, data=ann)
+    df_value = pd.DataFrame(index=report_date, columns=symbols, data=rng.randn(n_quarters, n_symbols))
+
+    date_arr = pd.bdate_range('20100101', periods=244 * n_years)
+    date_arr = (date_arr.year * 10000 + date_arr.month * 100 + date_arr.day).values
+    return df_value, df_ann, date_arr
+
+
+def timeit(func, *args):
+    t0 = time.time()
+    res = func(*args)
+    return res, time.time() - t0
+
+
+def run(n_symbols=800, n_years=10):
+    df_value, df_ann, date_arr = make_data(n_symbols, n_years)
+    print("Expand {:d} quarters x {:d} symbols to {:d} trade dates".format(len(df_value), n_symbols, len(date_arr)))
+
+    for name, func_new, func_old in [('align', align, align_loop), ('align2', align2, align2_loop)]:
+        res_new, t_new = timeit(func_new, df_value, df_ann, date_arr)
+        res_old, t_old = timeit(func_old, df_value, df_ann, date_arr)
+        pd.testing.assert_frame_equal(res_new, res_old)
+        print("{:8s} vectorized {:8.3f}s | loop {:8.3f}s | speedup {:6.1f}x".format(name, t_new, t_old,
+                                                                                    t_old / max(t_new, 1e-9)))
+
+
+if __name__ == "__main__":
+    args = [int(x) for x in sys.argv[1:3]]
+    run(*args)
@@ -0,0 +1,109 @@
+# encoding: utf-8
+"""
+Compare BatchEventEngine with EventEngine: throughput of a burst of market data with trade
+indications mixed in, and how long trade indications wait before they are handled.
+
+Usage:
+    python benchmark_event_engine.py [n_events] [n_symbols] [handler_us]
+
+"""
+from __future__ import print_function
+import sys
+import time
+import threading
+
+import numpy as np
+
+from jaqs.trade.event import EventEngine, BatchEventEngine, Event, EVENT_TYPE
+from jaqs.trade.event.batchengine import PRIORITY_LOW
+
+try:
+    from time import perf_counter
+except ImportError:
+    from time import time as perf_counter
+
+
+DONE = 'benchmark_done'
+
+
+def make_data(n_events, n_symbols, seed=0):
+    """One trade indication every 10 events, quotes of random symbols for the others."""
+    rng = np.random.RandomState(seed)
+    symbols = ['{:06d}.SZ'.format(i) for i in range(n_symbols)]
+    events = []
+    for i, j in enumerate(rng.randint(0, n_symbols, size=n_events)):
+        if i % 10 == 9:
+            e = Event(EVENT_TYPE.TRADE_IND)
+            e.dic = {'ind': i}
+        else:
+            e = Event(EVENT_TYPE.MARKET_DATA)
+            e.dic = {'quote': {'symbol': symbols[j], 'last': float(i)}}
+        events.append(e)
+    return events
+
+
+def timeit(engine, events, handler_us):
+    """Put events from another thread, return (number of quotes handled, seconds, waits of trade indications)."""
+    n_quotes = [0]
+    waits = []
+    done = threading.Event()
+    work = handler_us * 1e-6
+
+    def on_quote(event):
+        n_quotes[0] += 1
+        t_end = perf_counter() + work
+        while perf_counter() < t_end:
+            pass
+
+    def on_trade(event):
+        waits.append(perf_counter() - event.dic['t'])
+
+    engine.register(EVENT_TYPE.MARKET_DATA, on_quote)
+    engine.register(EVENT_TYPE.TRADE_IND, on_trade)
+    engine.register(DONE, lambda event: done.set())
+    engine.start(timer=False)
+
+    def produce():
+        for e in events:
+            if e.type_ == EVENT_TYPE.TRADE_IND:
+                e.dic['t'] = perf_counter()
+            engine.put(e)
+        engine.put(Event(DONE))
+
+    t0 = time.time()
+    producer = threading.Thread(target=produce)
+    producer.start()
+    done.wait()
+    t = time.time() - t0
+    producer.join()
+    engine.stop()
+    return n_quotes[0], t, np.array(waits)
+
+
+def run(n_events=200000, n_symbols=300, handler_us=0):
+    events = make_data(n_events, n_symbols)
+    print("Put {:d} events ({:d} symbols, 1 trade indication per 10 events), "
+          "{:d}us in each quote handler".format(n_events, n_symbols, handler_us))
+
+    batch = BatchEventEngine()
+    batch.set_priority(DONE, PRIORITY_LOW)
+    batch_coalesce = BatchEventEngine()
+    batch_coalesce.set_priority(DONE, PRIORITY_LOW)
+    batch_coalesce.set_coalesce(EVENT_TYPE.MARKET_DATA)
+
+    _, t_old, waits_old = timeit(EventEngine(), events, handler_us)
+    for name, engine in [('batch', batch), ('coalesce', batch_coalesce)]:
+        n_quotes, t_new, waits = timeit(engine, events, handler_us)
+        assert len(waits) == len(waits_old) == n_events // 10
+        print("{:8s} {:8.3f}s ({:5.2f} M events/s) | EventEngine {:8.3f}s | speedup {:6.1f}x | "
+              "{:d} quotes handled".format(name, t_new, n_events / t_new / 1e6, t_old, t_old / max(t_new, 1e-9),
+                                           n_quotes))
+        print("{:8s} trade indication wait p50 {:9.6f}s p99 {:9.6f}s | EventEngine p50 {:9.6f}s p99 {:9.6f}s".format(
+              '', np.percentile(waits, 50), np.percentile(waits, 99),
+              np.percentile(waits_old, 50), np.percentile(waits_old, 99)))
+    print(batch.latency_summary())
+
+
+if __name__ == "__main__":
+    args = [int(x) for x in sys.argv[1:4]]
+    run(*args)
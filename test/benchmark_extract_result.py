@@ -0,0 +1,78 @@
+# encoding: utf-8
+"""
+Compare decoding of a `daily`-like RPC result by extract_result with the original per-cell implementation,
+for columns sent as msgpack lists and as typed arrays (msgpack ext type).
+
+Usage:
+    python benchmark_extract_result.py [n_rows]
+
+"""
+from __future__ import print_function
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from jaqs.data.dataapi import utils, jrpc_py
+
+
+def extract_result_loop(cr):
+    """Original implementation: to_nan is applied to each cell of int64 columns."""
+    df = pd.DataFrame(cr['result'])
+    for col in df.columns:
+        if df.dtypes.loc[col] == np.int64:
+            df.loc[:, col] = df.loc[:, col].apply(utils.to_nan)
+    return df
+
+
+def make_data(n_rows, seed=0):
+    rng = np.random.RandomState(seed)
+    n_symbols = 3000
+    dates = pd.bdate_range('20100101', periods=n_rows // n_symbols + 1)
+    dates = (dates.year * 10000 + dates.month * 100 + dates.day).values
+
+    volume = rng.randint(0, 1000000, size=n_rows).astype(np.int64)
+    volume[rng.rand(n_rows) < 0.01] = utils.long_nan
+    close = 10 + rng.rand(n_rows)
+    columns = {'symbol': ['{:06d}.SZ'.format(i % n_symbols) for i in range(n_rows)],
+               'trade_date': np.repeat(dates, n_symbols)[:n_rows],
+               'open': close, 'high': close + 0.1, 'low': close - 0.1, 'close': close,
+               'volume': volume,
+               'turnover': volume.astype(float) * close}
+    cr_list = {'result': {k: v.tolist() if isinstance(v, np.ndarray) else v for k, v in columns.items()}}
+    cr_ext = {'result': {k: jrpc_py.pack_ndarray(v) if isinstance(v, np.ndarray) else v
+                         for k, v in columns.items()}}
+    return jrpc_py._pack_msgpack_snappy(cr_list), jrpc_py._pack_msgpack_snappy(cr_ext)
+
+
+def timeit(func, *args):
+    t0 = time.time()
+    res = func(*args)
+    return res, time.time() - t0
+
+
+def decode_new(payload):
+    return utils.extract_result(jrpc_py._unpack_msgpack_snappy(payload), data_format='pandas')[0]
+
+
+def decode_old(payload):
+    return extract_result_loop(jrpc_py._unpack_msgpack_snappy(payload))
+
+
+def run(n_rows=1000000):
+    payload_list, payload_ext = make_data(n_rows)
+    print("Decode {:d} rows, payload {:.1f} MB as lists, {:.1f} MB as typed arrays".format(
+        n_rows, len(payload_list) / 1e6, len(payload_ext) / 1e6))
+
+    res_old, t_old = timeit(decode_old, payload_list)
+    for name, payload in [('lists', payload_list), ('arrays', payload_ext)]:
+        res_new, t_new = timeit(decode_new, payload)
+        pd.testing.assert_frame_equal(res_new, res_old)
+        print("{:8s} vectorized {:8.3f}s ({:6.2f} M rows/s) | loop {:8.3f}s | speedup {:6.1f}x".format(
+            name, t_new, n_rows / max(t_new, 1e-9) / 1e6, t_old, t_old / max(t_new, 1e-9)))
+
+
+if __name__ == "__main__":
+    args = [int(x) for x in sys.argv[1:2]]
+    run(*args)
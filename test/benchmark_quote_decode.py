@@ -0,0 +1,105 @@
+# encoding: utf-8
+"""
+Compare decoding of jsq.quote_ind messages into quotes: the original per-field schema lookup
+followed by Quote.create_from_dict, the compiled QuoteDecoder, and QuoteBook which coalesces
+quotes of the same symbol when the consumer takes only one quote every `lag` messages.
+
+Usage:
+    python benchmark_quote_decode.py [n_quotes] [n_symbols] [lag]
+
+"""
+from __future__ import print_function
+import sys
+import time
+
+import numpy as np
+
+from jaqs.data.basic import Quote
+from jaqs.data.dataapi.quote_decoder import QuoteDecoder
+from jaqs.data.quotebook import QuoteBook
+
+
+def convert_quote_ind_loop(quote_ind, schema_id, schema, schema_map):
+    """Original DataApi._convert_quote_ind."""
+    if quote_ind['schema_id'] != schema_id:
+        return None
+
+    indicators = quote_ind['indicators']
+    values = quote_ind['values']
+
+    max_index = len(schema)
+
+    quote = {}
+    for i in range(len(indicators)):
+        if indicators[i] < max_index:
+            quote[schema_map[indicators[i]]['name']] = values[i]
+        else:
+            quote[str(indicators[i])] = values[i]
+
+    return quote
+
+
+def make_data(n_quotes, n_symbols, seed=0):
+    rng = np.random.RandomState(seed)
+    names = ['symbol'] + list(Quote().__dict__.keys())
+    schema = [{'id': i, 'name': name} for i, name in enumerate(names)]
+    symbols = ['{:06d}.SZ'.format(i) for i in range(n_symbols)]
+
+    messages = []
+    for k in rng.randint(0, n_symbols, size=n_quotes):
+        values = [symbols[k]] + rng.rand(len(names) - 1).tolist()
+        messages.append({'schema_id': 1, 'indicators': list(range(len(names))), 'values': values})
+    return schema, symbols, messages
+
+
+def timeit(func, *args):
+    t0 = time.time()
+    res = func(*args)
+    return res, time.time() - t0
+
+
+def decode_loop(schema, messages):
+    schema_map = {s['id']: s for s in schema}
+    return [Quote.create_from_dict(convert_quote_ind_loop(msg, 1, schema, schema_map)) for msg in messages]
+
+
+def decode_dict(schema, messages):
+    decoder = QuoteDecoder(1, schema)
+    return [Quote.create_from_dict(decoder.decode(msg)) for msg in messages]
+
+
+def decode_book(schema, symbols, messages, lag):
+    decoder = QuoteDecoder(1, schema)
+    book = QuoteBook()
+    quotes = []
+    for i, msg in enumerate(messages):
+        book.update(decoder, msg)
+        if i % lag == 0:
+            quote = book.pop()
+            if quote is not None:
+                quotes.append(quote)
+    quotes.extend(book.pop_all())
+    return quotes, book
+
+
+def run(n_quotes=200000, n_symbols=300, lag=1):
+    schema, symbols, messages = make_data(n_quotes, n_symbols)
+    print("Decode {:d} quotes of {:d} fields, {:d} symbols, consumer takes a quote every {:d} messages".format(
+        n_quotes, len(schema), n_symbols, lag))
+
+    res_old, t_old = timeit(decode_loop, schema, messages)
+    res_dict, t_dict = timeit(decode_dict, schema, messages)
+    (res_book, book), t_book = timeit(decode_book, schema, symbols, messages, lag)
+    assert [q.__dict__ for q in res_dict] == [q.__dict__ for q in res_old]
+    latest = {q.symbol: q.__dict__ for q in res_old}
+    assert all(book.get(symbol).to_dict() == dic for symbol, dic in latest.items())
+
+    for name, t in [('dict', t_dict), ('quotebook', t_book)]:
+        print("{:10s} compiled {:8.3f}s ({:6.2f} M quotes/s) | loop {:8.3f}s | speedup {:6.1f}x".format(
+            name, t, n_quotes / max(t, 1e-9) / 1e6, t_old, t_old / max(t, 1e-9)))
+    print("quotebook delivered {:d} quotes, {:d} coalesced".format(len(res_book), book.n_coalesced))
+
+
+if __name__ == "__main__":
+    args = [int(x) for x in sys.argv[1:4]]
+    run(*args)
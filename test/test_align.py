@@ -1,14 +1,71 @@
 # encoding: utf-8
 from __future__ import print_function
+import numpy as np
 import pandas as pd
 from jaqs.data import RemoteDataService
 from jaqs.data import Parser
 import jaqs.util as jutil
 
+from jaqs.data.align import align, align2, align_loop, align2_loop
+
 from config_path import DATA_CONFIG_PATH
 data_config = jutil.read_json(DATA_CONFIG_PATH)
 
 
+def _random_quarterly(n_quarters, n_symbols, seed=0):
+    rng = np.random.RandomState(seed)
+    ann = np.sort(rng.randint(20150101, 20180101, size=(n_quarters, n_symbols)), axis=0).astype(float)
+    # revised reports are announced again later, so ann_date is not monotonic in report date
+    mask_revised = rng.rand(n_quarters, n_symbols) < 0.2
+    ann[mask_revised] = rng.randint(20150101, 20180101, size=mask_revised.sum())
+    ann[rng.rand(n_quarters, n_symbols) < 0.1] = np.nan
+    
+    value = rng.rand(n_quarters, n_symbols)
+    value[rng.rand(n_quarters, n_symbols) < 0.1] = np.nan
+    
+    symbols = ['{:06d}.SH'.format(i) for i in range(n_symbols)]
+    df_ann = pd.DataFrame(index=np.arange(n_quarters), columns=symbols, data=ann)
+    df_value = pd.DataFrame(index=np.arange(n_quarters), columns=symbols, data=value)
+    date_arr = np.unique(rng.randint(20140101, 20180601, size=300))
+    return df_value, df_ann, date_arr
+
+
+def test_align_same_as_loop():
+    for n_quarters, n_symbols in [(1, 1), (8, 5), (20, 60)]:
+        df_value, df_ann, date_arr = _random_quarterly(n_quarters, n_symbols)
+        
+        res = align(df_value, df_ann, date_arr)
+        res_loop = align_loop(df_value, df_ann, date_arr)
+        pd.testing.assert_frame_equal(res, res_loop)
+        
+        res = align2(df_value, df_ann, date_arr)
+        res_loop = align2_loop(df_value, df_ann, date_arr)
+        pd.testing.assert_frame_equal(res, res_loop)
+
+
+def test_align_object_value():
+    df_value, df_ann, date_arr = _random_quarterly(12, 10, seed=1)
+    df_value = pd.DataFrame(index=df_value.index, columns=df_value.columns,
+                            data=np.where(df_value.values > 0.5, '480000', '210000').astype(object))
+    
+    res = align(df_value, df_ann, date_arr)
+    res_loop = align_loop(df_value, df_ann, date_arr)
+    assert res.values.dtype == np.object_
+    pd.testing.assert_frame_equal(res, res_loop)
+
+
+def test_align_revised_report():
+    # report of 20160331 is revised and announced again after report of 20160630
+    df_ann = pd.DataFrame(index=[20160331, 20160630], columns=['000001.SZ'], data=[20160901, 20160801])
+    df_value = pd.DataFrame(index=[20160331, 20160630], columns=['000001.SZ'], data=[1.0, 2.0])
+    date_arr = [20160729, 20160801, 20160901]
+    
+    res = align(df_value, df_ann, date_arr)
+    assert np.isnan(res.iat[0, 0])
+    assert res.iat[1, 0] == 2.0
+    assert res.iat[2, 0] == 2.0
+
+
 def test_align():
     # -------------------------------------------------------------------------------------
     # input and pre-process demo data
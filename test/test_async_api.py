@@ -0,0 +1,142 @@
+# encoding: utf-8
+"""
+AsyncDataApi and AsyncTradeApi against a local fake server, no data or trade server needed.
+"""
+
+from __future__ import print_function
+
+import asyncio
+
+from jaqs.data.dataapi import AsyncDataApi
+from jaqs.trade.tradeapi import AsyncTradeApi
+
+from test_jrpc import FakeServer
+
+
+_SCHEMA = [{'id': 0, 'name': 'symbol'}, {'id': 1, 'name': 'last'}, {'id': 2, 'name': 'volume'}]
+
+
+def _handler(method, params):
+    if method in ('auth.login', 'jaqs.auth.login'):
+        return {'username': params['username']}
+    elif method == 'auth.use_strategy':
+        return True
+    elif method == 'jsd.query':
+        return {'symbol': [params['symbol']] * 2, 'trade_date': [params['begin_date'], params['end_date']]}
+    elif method == 'jsq.subscribe':
+        return {'schema_id': 7, 'schema': _SCHEMA, 'sub_hash': 'abc', 'symbols': params['symbol'].split(',')}
+    elif method == 'jaqs.order.exec':
+        return 1000 + params['size']
+    elif method == 'pms.goal_portfolio':
+        return [p['security'] for p in params['positions']]
+    elif method == 'jaqs.position.query':
+        return {'security': ['600030.SH'], 'current_size': [100], 'format': [params['format']]}
+    return None
+
+
+def _run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+async def _wait_for(cond, timeout=5.0):
+    for i in range(int(timeout / 0.02)):
+        if cond():
+            return True
+        await asyncio.sleep(0.02)
+    return False
+
+
+def test_async_data_api():
+    server = FakeServer(_handler)
+
+    async def main():
+        api = AsyncDataApi(server.addr)
+        api.set_heartbeat(0.1, 0.5)
+        try:
+            r, msg = await api.login('user', 'password')
+            assert r == {'username': 'user'}
+            # login of the first connection is shared with on_connected
+            assert await _wait_for(lambda: not api._tasks)
+            assert server.received.count('auth.login') == 1
+
+            res = await asyncio.gather(*[api.daily('600030.SH', start_date=20170103, end_date=20170103 + i)
+                                         for i in range(10)])
+            assert [df['trade_date'].iat[1] for df, msg in res] == [20170103 + i for i in range(10)]
+            assert await api.daily('600030.SH', start_date=None, end_date=20170105) == (-1, "Begin date format error")
+
+            symbols, msg = await api.subscribe('600030.SH,000002.SZ')
+            assert symbols == ['600030.SH', '000002.SZ']
+
+            quotes = api.quotes()
+            server.notify('jsq.quote_ind', {'schema_id': 7, 'indicators': [0, 1, 2], 'values': ['600030.SH', 15.5, 100]})
+            server.notify('jsq.quote_ind', {'schema_id': 8, 'indicators': [0, 1], 'values': ['000002.SZ', 20.0]})
+            server.notify('jsq.quote_ind', {'schema_id': 7, 'indicators': [0, 1], 'values': ['000002.SZ', 21.0]})
+            q1 = await asyncio.wait_for(quotes.__anext__(), 5)
+            q2 = await asyncio.wait_for(quotes.__anext__(), 5)
+            assert q1 == {'symbol': '600030.SH', 'last': 15.5, 'volume': 100}
+            # quotes of other schema are skipped
+            assert q2 == {'symbol': '000002.SZ', 'last': 21.0}
+            quotes.close()
+            assert [q async for q in quotes] == []
+
+            # server stops answering heartbeats: disconnected, then login and subscribe again after it is back
+            n_login = server.received.count('auth.login')
+            server.answer_heartbeat = False
+            assert await _wait_for(lambda: not api._remote.connected)
+            assert (await api.daily('600030.SH', start_date=20170103, end_date=20170105))[1] == "no connection"
+            server.answer_heartbeat = True
+            assert await _wait_for(lambda: server.received.count('jsq.subscribe') == 2)
+            assert server.received.count('auth.login') == n_login + 1
+        finally:
+            api.close()
+
+    try:
+        _run(main())
+    finally:
+        server.close()
+
+
+def test_async_trade_api():
+    server = FakeServer(_handler)
+
+    async def main():
+        api = AsyncTradeApi(server.addr)
+        try:
+            r, msg = await api.login('user', 'password')
+            assert r == {'username': 'user'}
+            r, msg = await api.use_strategy(123)
+            assert r is True
+
+            task_ids = await asyncio.gather(*[api.place_order('600030.SH', 'Buy', 10.0, 100 * i) for i in range(5)])
+            assert [task_id for task_id, msg in task_ids] == [1000 + 100 * i for i in range(5)]
+            r, msg = await api.goal_portfolio([{'security': '600030.SH', 'ref_price': 10.0, 'size': 100}])
+            assert r == ['600030.SH']
+            df, msg = await api.query_position()
+            assert list(df['format']) == ['columnset']
+
+            api.set_data_format('obj')
+            inds = api.indications(maxsize=2)
+            for i in range(3):
+                server.notify('oms.trade_ind', {'task_id': i, 'fill_size': 100})
+            server.notify('jsq.quote_ind', {'schema_id': 7})
+            assert await _wait_for(lambda: inds.n_dropped == 1)
+            method, trade = await asyncio.wait_for(inds.__anext__(), 5)
+            assert method == 'oms.trade_ind'
+            assert (trade.task_id, trade.fill_size) == (1, 100)
+        finally:
+            api.close()
+
+    try:
+        _run(main())
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    test_async_data_api()
+    test_async_trade_api()
+    print("test passed")
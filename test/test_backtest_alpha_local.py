@@ -0,0 +1,168 @@
+# encoding: utf-8
+"""
+Alpha backtest on a DataView built from random data, no data server needed.
+"""
+
+from __future__ import print_function
+
+import numpy as np
+import pandas as pd
+
+from jaqs.data import DataView
+from jaqs.trade import (ParameterSweep, AlphaBacktestInstance, VectorizedAlphaBacktestInstance,
+                        AlphaStrategy, AlphaTradeApi, PortfolioManager, model)
+from jaqs.trade.sweep import expand_grid, calc_performance
+
+
+def _make_alpha_dataview(n_dates=80, n_symbols=12, seed=0):
+    """DataView with fields needed by AlphaBacktestInstance: close, vwap, trade_status, _limit, _daily_adjust_factor."""
+    rng = np.random.RandomState(seed)
+    dates = pd.bdate_range('20170103', periods=n_dates)
+    dates = (dates.year * 10000 + dates.month * 100 + dates.day).values
+    symbols = ['{:06d}.SZ'.format(i + 1) for i in range(n_symbols)]
+
+    close = 10 * np.cumprod(1 + 0.02 * rng.randn(n_dates, n_symbols), axis=0)
+    trade_status = np.full((n_dates, n_symbols), '交易', dtype=object)
+    trade_status[rng.rand(n_dates, n_symbols) < 0.05] = '停牌'
+    adjust_factor = np.ones((n_dates, n_symbols))
+    adjust_factor[30, 1] = 1.1
+    limit = np.zeros((n_dates, n_symbols))
+    limit[40, 2] = 0.1
+
+    dic = {'close': close,
+           'vwap': close * (1 + 0.005 * rng.randn(n_dates, n_symbols)),
+           'total_mv': close * (1 + np.arange(n_symbols)),
+           'trade_status': trade_status,
+           '_limit': limit,
+           '_daily_adjust_factor': adjust_factor,
+           'index_member': np.ones((n_dates, n_symbols))}
+    df = pd.concat({field: pd.DataFrame(index=dates, columns=symbols, data=arr) for field, arr in dic.items()},
+                   axis=1)
+    df.columns = df.columns.swaplevel()
+    df.columns.names = ['symbol', 'field']
+    df.index.name = 'trade_date'
+    df = df.sort_index(axis=1)
+
+    dv = DataView()
+    dv.start_date, dv.end_date = int(dates[5]), int(dates[-1])
+    dv.extended_start_date_d = int(dates[0])
+    dv.symbol = symbols
+    dv.fields = sorted(dic.keys())
+    dv.data_d = df
+    # the last symbol is de-listed in the middle
+    dv._data_inst = pd.DataFrame(index=pd.Index(symbols, name='symbol'),
+                                 data={'list_date': 20000101,
+                                       'delist_date': [99999999] * (n_symbols - 1) + [dates[50]],
+                                       'inst_type': 1, 'multiplier': 1})
+    return dv
+
+
+def _make_props(dv):
+    return {'start_date': dv.start_date, 'end_date': dv.end_date,
+            'period': 'day', 'n_periods': 5, 'days_delay': 0,
+            'init_balance': 1e7, 'position_ratio': 1.0, 'commission_rate': 1E-3}
+
+
+def test_expand_grid():
+    res = expand_grid({'position_ratio': [0.5, 1.0], 'n_periods': [1, 2, 3]})
+    assert len(res) == 6
+    assert res[0] == {'n_periods': 1, 'position_ratio': 0.5}
+    assert res[-1] == {'n_periods': 3, 'position_ratio': 1.0}
+
+
+def test_calc_performance():
+    dates = [20170103, 20170104, 20170105]
+    df_close = pd.DataFrame(index=dates, data={'A': [10.0, 11.0, 12.0], 'B': [5.0, np.nan, 4.0]})
+    df_trades = pd.DataFrame({'symbol': ['A', 'B', 'A'],
+                              'entrust_action': ['Buy', 'Buy', 'Sell'],
+                              'fill_price': [10.0, 5.0, 11.0],
+                              'fill_size': [100.0, 200.0, 100.0],
+                              'commission': [1.0, 1.0, 1.0],
+                              'trade_date': [20170103, 20170103, 20170104]})
+    metrics, ser_value = calc_performance(df_trades, df_close, 10000.0)
+    # day 1: cash 7998, day 2: cash 9097 + B@5 (last close), day 3: 9097 + B@4
+    np.testing.assert_allclose(ser_value.values, [9998.0, 10097.0, 9897.0])
+    assert metrics['Number of Trades'] == 3
+    assert metrics['Commission'] == 3.0
+    np.testing.assert_allclose(metrics['Maximum Drawdown (%)'], 100 * (1 - 9897.0 / 10097.0))
+
+
+def test_parameter_sweep():
+    dv = _make_alpha_dataview()
+    props = _make_props(dv)
+    grid = {'position_ratio': [0.5, 1.0], 'pc_method': ['equal_weight', 'market_value_weight']}
+
+    sweep = ParameterSweep(dv, props, grid, n_jobs=1)
+    res = sweep.run()
+    assert list(res.index) == [0, 1, 2, 3]
+    assert list(res.columns[:2]) == ['pc_method', 'position_ratio']
+    assert (res['Number of Trades'] > 0).all()
+    assert set(sweep.trades['run_id']) == {0, 1, 2, 3}
+    # same pc_method: half position gives smaller turnover and commission
+    assert res.at[0, 'Commission'] < res.at[1, 'Commission']
+
+    # forked workers give the same results
+    sweep_fork = ParameterSweep(dv, props, grid, n_jobs=2)
+    res_fork = sweep_fork.run()
+    pd.testing.assert_frame_equal(res_fork, res)
+    pd.testing.assert_frame_equal(sweep_fork.trades, sweep.trades)
+
+    # snapshot index built for forked workers is not kept in the caller's DataView
+    dv = _make_alpha_dataview()
+    ParameterSweep(dv, props, {'position_ratio': [0.5, 1.0]}, n_jobs=2).run()
+    assert dv._snapshot is None
+
+
+def _close_selector(context, user_options=None):
+    snap = context.snapshot
+    return snap['close'] > snap['close'].median()
+
+
+def _negative_close_signal(context, user_options=None):
+    return -context.snapshot_sub['close']
+
+
+def _run_alpha(instance_cls, dv, props, pc_method, selector=False):
+    signal_model, stock_selector = None, None
+    if pc_method == 'factor_value_weight':
+        signal_model = model.FactorSignalModel()
+        signal_model.add_signal(name='neg_close', func=_negative_close_signal)
+    if selector:
+        stock_selector = model.StockSelector()
+        stock_selector.add_filter(name='high_close', func=_close_selector)
+    strategy = AlphaStrategy(signal_model=signal_model, stock_selector=stock_selector, pc_method=pc_method)
+    bt = instance_cls()
+    context = model.Context(dataview=dv, instance=bt, strategy=strategy, trade_api=AlphaTradeApi(),
+                            pm=PortfolioManager())
+    for m in [signal_model, stock_selector]:
+        if m is not None:
+            m.register_context(context)
+    bt.init_from_config(props)
+    bt.run_alpha()
+    return bt
+
+
+def test_vectorized_alpha_backtest():
+    dv = _make_alpha_dataview()
+    props = _make_props(dv)
+    props['single_symbol_weight_limit'] = 0.2
+    key = ['trade_date', 'fill_time', 'symbol']
+    for pc_method, selector in [('equal_weight', False), ('market_value_weight', True),
+                                ('factor_value_weight', False)]:
+        bt = _run_alpha(AlphaBacktestInstance, dv, props, pc_method, selector=selector)
+        bt_vec = _run_alpha(VectorizedAlphaBacktestInstance, dv, props, pc_method, selector=selector)
+        
+        # orders of dividend and de-list adjustments in a loop are not fixed
+        df = bt.get_trades_df().sort_values(key).reset_index(drop=True)
+        df_vec = bt_vec.get_trades_df().sort_values(key).reset_index(drop=True)
+        pd.testing.assert_frame_equal(df_vec, df, check_exact=False, rtol=1e-9)
+        if pc_method == 'equal_weight':
+            assert set(df['task_id']) >= {'101010', '202020'}
+        
+        np.testing.assert_allclose([v for _, _, v in bt_vec.ctx.records['total_cash']],
+                                   [v for _, _, v in bt.ctx.records['total_cash']])
+        np.testing.assert_allclose(bt_vec.ctx.strategy.cash, bt.ctx.strategy.cash)
+        
+        df_daily = bt_vec.df_daily
+        np.testing.assert_allclose(df_daily['pnl'].sum() + props['init_balance'], df_daily['total'].iat[-1])
+        np.testing.assert_allclose(df_daily['commission'].sum(), df['commission'].sum())
@@ -187,6 +187,99 @@ def test_livetrade():
     do_analyze()
 
 
+def test_order_book():
+    from jaqs.data.basic import Order
+    from jaqs.trade.tradegateway import OrderBook
+
+    book = OrderBook()
+    buy, sell = common.ORDER_ACTION.BUY, common.ORDER_ACTION.SELL
+    LIMIT, STOP, VWAP = common.ORDER_TYPE.LIMIT, common.ORDER_TYPE.STOP, common.ORDER_TYPE.VWAP
+    for symbol, action, price, order_type in [('A', buy, 10.0, LIMIT), ('A', buy, 9.0, LIMIT),
+                                              ('A', sell, 11.0, LIMIT), ('A', sell, 12.0, LIMIT),
+                                              ('A', buy, 11.5, STOP), ('A', sell, 9.5, STOP),
+                                              ('B', buy, 10.0, VWAP), ('A', buy, 10.0, LIMIT)]:
+        book.add_order(Order.new_order(symbol, action, price, 100, 20170101, 93000, order_type=order_type))
+
+    bar = Bar()
+    bar.symbol, bar.date, bar.time, bar.trade_date = 'A', 20170101, 93100, 20170101
+    bar.low, bar.high, bar.vwap = 9.8, 11.2, 10.5
+
+    # symbol without quote is not matched, triggered orders are filled in the order they were added
+    results = book.make_trade({'A': bar}, common.QUOTE_TYPE.MIN)
+    assert [trade.entrust_no for trade, _ in results] == ['1', '3', '8']
+    assert [trade.fill_price for trade, _ in results] == [10.0, 11.0, 10.0]
+    assert all(ind.order_status == common.ORDER_STATUS.FILLED for _, ind in results)
+    assert sorted(book.orders.keys()) == ['2', '4', '5', '6', '7']
+
+    book.cancel_order('4')
+    bar.low, bar.high = 8.0, 13.0
+    results = book.make_trade({'A': bar}, common.QUOTE_TYPE.MIN)
+    assert [trade.entrust_no for trade, _ in results] == ['2', '5', '6']
+    assert sorted(book.orders.keys()) == ['7']
+
+
+def test_fill_model():
+    from jaqs.data.basic import Order, FixedPriceTypeOrder, BarView
+    from jaqs.trade import ParticipationFillModel
+    from jaqs.trade.tradegateway import OrderBook, DailyStockSimulator, FillModel
+
+    model_ = ParticipationFillModel(participation_rate=0.1, lot_size=100)
+    sizes = model_.get_fill_size(['A', 'B', 'A', 'A'], [300, 1000, 500, 50], [7500, 50000, 7500, 7500])
+    assert list(sizes) == [300, 1000, 400, 0]
+
+    # the rest is filled on later bars
+    book = OrderBook(fill_model=ParticipationFillModel(participation_rate=0.1))
+    book.add_order(Order.new_order('A', common.ORDER_ACTION.BUY, 10.0, 150, 20170101, 93000,
+                                   order_type=common.ORDER_TYPE.LIMIT))
+    bar = Bar()
+    bar.symbol, bar.date, bar.time, bar.trade_date = 'A', 20170101, 93100, 20170101
+    bar.low, bar.high, bar.volume = 9.0, 11.0, 1000
+    trade, ind = book.make_trade({'A': bar}, common.QUOTE_TYPE.MIN)[0]
+    assert trade.fill_size == 100 and ind.fill_size == 100
+    assert ind.order_status == common.ORDER_STATUS.ACCEPTED
+    trade, ind = book.make_trade({'A': bar}, common.QUOTE_TYPE.MIN)[0]
+    assert trade.fill_size == 50 and ind.order_status == common.ORDER_STATUS.FILLED
+    assert not book.orders
+    assert book.participation_rate == 0.1
+    
+    # bars replayed from a source without volume can not be filled by volume
+    book.add_order(Order.new_order('A', common.ORDER_ACTION.BUY, 10.0, 150, 20170101, 93000,
+                                   order_type=common.ORDER_TYPE.LIMIT))
+    bar_view = BarView({'symbol': ['A'], 'date': [20170101], 'time': [93200], 'trade_date': [20170101],
+                        'low': [9.0], 'high': [11.0]}, 0)
+    try:
+        book.make_trade({'A': bar_view}, common.QUOTE_TYPE.MIN)
+    except ValueError as e:
+        assert 'volume' in str(e)
+    else:
+        assert False
+    book.fill_model = FillModel()
+    assert book.make_trade({'A': bar_view}, common.QUOTE_TYPE.MIN)[0][0].fill_size == 150
+
+    # the rest is filled on later days
+    simulator = DailyStockSimulator(fill_model=ParticipationFillModel(participation_rate=0.5))
+    order = FixedPriceTypeOrder.new_order('A', common.ORDER_ACTION.SELL, 0.0, 300, 20170101, 0)
+    order.price_target = 'vwap'
+    simulator.add_order(order)
+    results = simulator.match({'A': {'vwap': 10.0, 'volume': 400}}, date=20170101)
+    assert results[0][0].fill_size == 200 and not simulator.match_finished
+    results = simulator.match({'A': {'vwap': 11.0, 'volume': 400}}, date=20170102)
+    assert results[0][1].fill_size == 300 and abs(results[0][1].fill_price - 31.0 / 3) < 1e-8
+    assert simulator.match_finished
+
+    # volume is required when fill size is limited by volume
+    simulator.add_order(order)
+    try:
+        simulator.match({'A': {'vwap': 10.0}}, date=20170103)
+    except ValueError as e:
+        assert 'volume' in str(e)
+    else:
+        assert False
+    simulator = DailyStockSimulator()
+    simulator.add_order(order)
+    assert simulator.match({'A': {'vwap': 10.0}}, date=20170103)[0][0].fill_size == 300
+
+
 def do_analyze():
     from jaqs.trade.analyze.analyze import TradeRecordEmptyError
     ta = ana.EventAnalyzer()
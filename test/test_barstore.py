@@ -0,0 +1,75 @@
+# encoding: utf-8
+"""
+BarStore on data written by the tests, no data server needed.
+"""
+
+from __future__ import print_function
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from jaqs.data.barstore import BarStore
+from jaqs.data.barsource import BarStoreBarSource
+
+
+def _make_bars(symbol, times, close):
+    n = len(times)
+    return pd.DataFrame({'symbol': symbol, 'code': symbol.split('.')[0], 'trade_date': 20170824, 'freq': '1M',
+                         'date': np.where(np.array(times) >= 200000, 20170823, 20170824),
+                         'time': times, 'close': close + np.arange(n, dtype=float),
+                         'volume': np.arange(n, dtype=np.int64)})
+
+
+def test_bar_store():
+    folder = '../output/tests/test_bar_store'
+    shutil.rmtree(folder, ignore_errors=True)
+
+    times = [210000, 210100, 90000, 90100, 140000]
+    df = pd.concat([_make_bars('rb1710.SHF', times, 10.0), _make_bars('000001.SZ', times[2:], 20.0)])
+    store = BarStore(folder)
+    store.write(df, 20170824, symbols=['rb1710.SHF', '000001.SZ', '600000.SH'])
+    assert store.missing_symbols(['rb1710.SHF', '600000.SH', 'cu1710.SHF'], 20170824) == ['cu1710.SHF']
+
+    # night session comes first, time range is applied in session order
+    res = store.read('rb1710.SHF', 20170824, start_time=210100, end_time=90000)
+    assert list(res['time']) == [210100, 90000]
+    assert isinstance(res['close'].base, np.memmap) or isinstance(res['close'], np.memmap)
+
+    df_read = BarStore(folder).get('rb1710.SHF,600000.SH,000001.SZ', '2017-08-24', start_time='09:00:00',
+                                   end_time='16:00:00', fields='close')
+    assert set(df_read.columns) == {'symbol', 'code', 'trade_date', 'freq', 'date', 'time', 'close'}
+    assert df_read.groupby('symbol').size().to_dict() == {'000001.SZ': 3, 'rb1710.SHF': 3}
+
+    # data of the same symbol is replaced, others are kept
+    store.write(_make_bars('000001.SZ', [93000], 30.0), 20170824)
+    df_read = store.get('rb1710.SHF,000001.SZ', 20170824)
+    assert df_read.loc[df_read['symbol'] == '000001.SZ', 'close'].tolist() == [30.0]
+    assert len(df_read) == 6
+
+    source = BarStoreBarSource(store, freq='1M')
+    assert list(source.query_trade_dates(20170801, 20170831)) == [20170824]
+    assert len(source.get_bars('rb1710.SHF', 20170824)) == 5
+
+
+def test_bar_store_rewrite_while_reading():
+    folder = '../output/tests/test_bar_store_rewrite'
+    shutil.rmtree(folder, ignore_errors=True)
+
+    times = [90000, 90100, 90200]
+    store = BarStore(folder)
+    store.write(_make_bars('rb1710.SHF', times, 10.0), 20170824)
+    view = store.read('rb1710.SHF', 20170824)
+    reader = BarStore(folder)
+    view_other = reader.read('rb1710.SHF', 20170824)
+
+    # same symbol rewritten with more rows, files mapped by views above are not changed in place
+    store.write(_make_bars('rb1710.SHF', times + [90300], 50.0), 20170824)
+    assert list(view['close']) == [10.0, 11.0, 12.0]
+    assert list(view_other['close']) == [10.0, 11.0, 12.0]
+    assert list(store.read('rb1710.SHF', 20170824)['close']) == [50.0, 51.0, 52.0, 53.0]
+    assert store.get('rb1710.SHF', 20170824)['time'].tolist() == times + [90300]
+    # no temporary files are left
+    assert sorted(os.listdir(os.path.join(folder, '1M', '20170824'))) == ['close.npy', 'date.npy', 'meta.json',
+                                                                           'time.npy', 'volume.npy']
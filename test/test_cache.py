@@ -0,0 +1,115 @@
+# encoding: utf-8
+"""
+QueryCache with a fake query function, no data server needed.
+"""
+
+from __future__ import print_function
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from jaqs.data.cache import QueryCache
+from jaqs.data.dataservice import QueryDataError
+
+
+def test_query_cache():
+    folder = '../output/tests/test_query_cache'
+    shutil.rmtree(folder, ignore_errors=True)
+    queries = []
+
+    def fetch(symbol, start_date, end_date):
+        queries.append((symbol, start_date, end_date))
+        dates = np.arange(start_date, end_date + 1)
+        symbols = symbol.split(',')
+        df = pd.DataFrame({'symbol': np.repeat(symbols, len(dates)),
+                           'trade_date': np.tile(dates, len(symbols)),
+                           'close': len(queries)})
+        return df, '0,'
+
+    cache = QueryCache(folder, refresh_days=3)
+    cache.today = 20170112
+    df, msg = cache.query('daily', fetch, 'A,B', 20170101, 20170110, date_col='trade_date')
+    assert msg == '0,' and len(df) == 20
+
+    # only missing symbol and date range are fetched
+    df, msg = cache.query('daily', fetch, 'A,B,C', 20170105, 20170115, date_col='trade_date')
+    assert queries[1:] == [('A,B', 20170111, 20170115), ('C', 20170105, 20170115)]
+    assert len(df) == 33
+    assert df.drop_duplicates(subset=['symbol', 'trade_date']).shape[0] == 33
+
+    # different params are stored separately
+    cache.query('daily', fetch, 'A', 20170101, 20170102, date_col='trade_date', params={'fields': 'open'})
+    assert len(queries) == 4
+
+    # recent dates are fetched again on a later day
+    cache.today = 20170125
+    cache.query('daily', fetch, 'A', 20170101, 20170115, date_col='trade_date')
+    assert queries[-1] == ('A', 20170110, 20170115)
+
+    # replay without network, from files
+    cache_offline = QueryCache(folder, offline=True)
+    df, msg = cache_offline.query('daily', fetch, 'A,B,C', 20170105, 20170115, date_col='trade_date')
+    assert len(queries) == 5
+    assert len(df) == 33
+    assert (df.loc[(df['symbol'] == 'A') & (df['trade_date'] >= 20170110), 'close'] == 5).all()
+    with pytest.raises(QueryDataError):
+        cache_offline.query('daily', fetch, 'D', 20170101, 20170115, date_col='trade_date')
+
+
+def test_query_cache_missing_dates():
+    folder = '../output/tests/test_query_cache_nan'
+    shutil.rmtree(folder, ignore_errors=True)
+    queries = []
+
+    def fetch(symbol, start_date, end_date):
+        queries.append((symbol, start_date, end_date))
+        return pd.DataFrame({'symbol': ['A', 'A', 'A'],
+                             'ann_date': [start_date, np.nan, end_date],
+                             'value': [1.0, 2.0, 3.0]}), '0,'
+
+    cache = QueryCache(folder, refresh_days=0)
+    cache.today = 20180101
+    df, _ = cache.query('income', fetch, 'A', 20170101, 20170331, date_col='ann_date')
+    assert df['ann_date'].tolist() == [20170101, 20170331]
+
+    # rows without date are not stored, fetching again does not add duplicates
+    df, _ = cache.query('income', fetch, 'A', 20170101, 20170630, date_col='ann_date')
+    assert queries == [('A', 20170101, 20170331), ('A', 20170401, 20170630)]
+    assert df['ann_date'].tolist() == [20170101, 20170331, 20170401, 20170630]
+    assert not cache._get_entry(cache._get_path('income', dict()))['df']['ann_date'].isnull().any()
+
+
+def test_query_cache_save_once(monkeypatch):
+    import jaqs.util as jutil
+    folder = '../output/tests/test_query_cache_save'
+    shutil.rmtree(folder, ignore_errors=True)
+    saved = []
+    save_pickle = jutil.save_pickle
+
+    def count_save(obj, path):
+        saved.append(len(obj['df']))
+        save_pickle(obj, path)
+    monkeypatch.setattr(jutil, 'save_pickle', count_save)
+
+    def fetch(symbol, start_date, end_date):
+        if 'D' in symbol.split(','):
+            return None, '-1,server error'
+        symbols = symbol.split(',')
+        return pd.DataFrame({'symbol': symbols, 'trade_date': start_date, 'close': 1.0}), '0,'
+
+    cache = QueryCache(folder, refresh_days=0)
+    cache.today = 20180101
+    cache.query('daily', fetch, 'A', 20170105, 20170110, date_col='trade_date')
+    # 3 chunks: A before and after cached range, B for the whole range
+    df, _ = cache.query('daily', fetch, 'A,B', 20170101, 20170115, date_col='trade_date')
+    assert saved == [1, 4]
+    assert len(df) == 4
+
+    # chunks fetched before a failure are kept
+    with pytest.raises(QueryDataError):
+        cache.query('daily', fetch, 'B,C,D', 20170101, 20170120, date_col='trade_date')
+    assert saved[-1] == 5
+    df, _ = QueryCache(folder, offline=True).query('daily', fetch, 'B', 20170101, 20170120, date_col='trade_date')
+    assert df['trade_date'].tolist() == [20170101, 20170116]
@@ -0,0 +1,122 @@
+# encoding: utf-8
+
+from __future__ import print_function
+
+import numpy as np
+import pandas as pd
+
+from jaqs.data.dataapi import utils, jrpc_py
+from jaqs.data.dataapi.quote_decoder import QuoteDecoder
+from jaqs.data.quotebook import QuoteBook
+from jaqs.data.basic import SlotQuote
+
+
+def _make_result():
+    return {'symbol': ['600030.SH', '000002.SZ', '600030.SH'],
+            'DATE': [20170103, 20170103, 20170104],
+            'TIME': [93000000, 145959500, 150000000],
+            'volume': [100, utils.long_nan, 300],
+            'oi': [1, 2, 3],
+            'close': [10.5, 20.1, 10.7]}
+
+
+def test_extract_result_pandas():
+    df, msg = utils.extract_result({'result': _make_result(), 'error': {'error': 0}}, data_format='pandas')
+    assert msg == '0,'
+    assert list(df.columns) == ['symbol', 'DATE', 'TIME', 'volume', 'oi', 'close']
+    assert df['symbol'].dtype == object
+    assert df['oi'].dtype == np.int64
+    assert df['volume'].dtype == np.float64
+    assert np.isnan(df['volume'].iat[1])
+    assert df['volume'].iat[2] == 300
+    
+    df, _ = utils.extract_result({'result': _make_result()}, data_format='pandas', index_column='symbol')
+    assert list(df.index) == ['600030.SH', '000002.SZ', '600030.SH']
+    assert df.index.name is None
+
+
+def test_to_datetime_index():
+    df = utils._to_dataframe(_make_result(), utils._to_datetime)
+    expected = pd.to_datetime(['2017-01-03 09:30:00', '2017-01-03 14:59:59', '2017-01-04 15:00:00'])
+    pd.testing.assert_index_equal(df.index, pd.DatetimeIndex(expected))
+    
+    df = utils._to_dataframe(_make_result(), utils._to_date)
+    pd.testing.assert_index_equal(df.index, pd.DatetimeIndex(pd.to_datetime(['2017-01-03', '2017-01-03',
+                                                                              '2017-01-04'])))
+
+
+def test_msgpack_ndarray_columns():
+    res = _make_result()
+    packed = dict(res)
+    for col in ['DATE', 'TIME', 'volume', 'oi', 'close']:
+        packed[col] = jrpc_py.pack_ndarray(np.array(res[col]))
+    
+    for pack, unpack in [(jrpc_py._pack_msgpack, jrpc_py._unpack_msgpack),
+                         (jrpc_py._pack_msgpack_snappy, jrpc_py._unpack_msgpack_snappy)]:
+        msg = unpack(pack({'id': '1', 'result': packed}))
+        assert isinstance(msg['result']['close'], np.ndarray)
+        assert msg['result']['symbol'] == res['symbol']
+        
+        df, _ = utils.extract_result(msg, data_format='pandas')
+        df_expected, _ = utils.extract_result({'result': res}, data_format='pandas')
+        pd.testing.assert_frame_equal(df, df_expected)
+
+        # decoded frames can be modified in place
+        df.loc[df.index[0], 'close'] = 3.0
+        df['volume'] += 1
+        assert df['close'].iat[0] == 3.0
+        np.testing.assert_array_equal(df['volume'].values, df_expected['volume'].values + 1)
+
+
+_SCHEMA = [{'id': 0, 'name': 'symbol'}, {'id': 1, 'name': 'last'}, {'id': 2, 'name': 'volume'},
+           {'id': 3, 'name': 'iopv'}]
+
+
+def _quote_ind(symbol, last, schema_id=7):
+    return {'schema_id': schema_id, 'indicators': [0, 1, 2, 3, 9], 'values': [symbol, last, 100, 1.5, 'x']}
+
+
+def test_quote_decoder():
+    decoder = QuoteDecoder(7, _SCHEMA)
+    assert decoder.decode(_quote_ind('600030.SH', 15.5)) == {'symbol': '600030.SH', 'last': 15.5, 'volume': 100,
+                                                              'iopv': 1.5, '9': 'x'}
+    assert decoder.decode(_quote_ind('600030.SH', 15.5, schema_id=8)) is None
+    assert decoder.get_symbol(_quote_ind('600030.SH', 15.5)) == '600030.SH'
+    
+    quote = decoder.new_quote(SlotQuote)
+    assert (quote.symbol, quote.last, quote.bidprice1) == ('', 0., 0.)
+    msg = {'schema_id': 7, 'indicators': [0, 1, 2, 3], 'values': ['600030.SH', 15.5, 100, 1.5]}
+    assert decoder.decode_into(msg, quote)
+    assert list(quote) == msg['values']
+    assert (quote.symbol, quote.last, quote.volume, quote.iopv) == ('600030.SH', 15.5, 100, 1.5)
+    assert decoder.decode_into({'schema_id': 7, 'indicators': [1, 9], 'values': [15.6, 'x']}, quote)
+    assert quote.to_dict() == {'symbol': '600030.SH', 'last': 15.6, 'volume': 100, 'iopv': 1.5, '9': 'x'}
+
+
+def test_quote_book():
+    decoder = QuoteDecoder(7, _SCHEMA)
+    book = QuoteBook()
+    assert book.update(decoder, _quote_ind('600030.SH', 15.5))
+    assert book.update(decoder, _quote_ind('000002.SZ', 20.0))
+    assert not book.update(decoder, _quote_ind('600030.SH', 15.6))
+    assert not book.update(decoder, _quote_ind('600030.SH', 15.7, schema_id=8))
+    assert (book.n_updates, book.n_coalesced, len(book)) == (3, 1, 2)
+
+    quote = book.pop()
+    assert (quote.symbol, quote.last, quote.volume) == ('600030.SH', 15.6, 100)
+    assert (quote.iopv, quote.extra) == (1.5, {'9': 'x'})
+    # taken quotes are copies
+    assert book.update(decoder, _quote_ind('600030.SH', 15.8))
+    assert quote.last == 15.6
+    assert [(q.symbol, q.last) for q in book.pop_all()] == [('000002.SZ', 20.0), ('600030.SH', 15.8)]
+    assert book.pop() is None
+    assert book.get('600030.SH').last == 15.8
+
+
+if __name__ == "__main__":
+    test_extract_result_pandas()
+    test_to_datetime_index()
+    test_msgpack_ndarray_columns()
+    test_quote_decoder()
+    test_quote_book()
+    print("test passed")
@@ -51,6 +51,82 @@ def test_bar():
     print(str(bar))
 
 
+def test_bar_replay():
+    from jaqs.data.basic import BarReplay, BarView
+    
+    df = pd.DataFrame({'symbol': ['rb1710.SHF', 'hc1710.SHF'] * 3,
+                       'date': [20170704] * 4 + [20170705] * 2,
+                       'time': [90100, 90100, 90200, 90200, 90100, 90100],
+                       'close': np.arange(6, dtype=float),
+                       'volume': np.arange(6) * 10})
+    replay = BarReplay(df.iloc[::-1], keys=('date', 'time'))
+    assert len(replay) == 3
+    assert replay.timestamps == [90100, 90200, 90100]
+    
+    time, dic = replay[1]
+    bar = dic['rb1710.SHF']
+    assert isinstance(bar, Bar) and isinstance(bar, BarView)
+    assert bar.close == 2.0 and bar.volume == 20 and bar.date == 20170704
+    assert bar.to_dict() == df.iloc[2].to_dict()
+    # attributes of Bar not in the source have default values
+    assert (bar.vwap, bar.oi) == (0., 0)
+    try:
+        bar.settle
+    except AttributeError:
+        pass
+    else:
+        assert False
+    
+    # assignment does not change the source
+    bar.close = 100.0
+    assert bar.close == 100.0
+    assert replay[1][1]['rb1710.SHF'].close == 2.0
+    
+    assert [sorted(dic.keys()) for _, dic in replay] == [['hc1710.SHF', 'rb1710.SHF']] * 3
+    assert len(BarReplay(df.iloc[:0], keys=('date', 'time'))) == 0
+
+
+def test_bar_prefetcher():
+    import time
+    import threading
+    from jaqs.data.barsource import BarPrefetcher
+    
+    loaded = []
+    main_thread = threading.current_thread()
+    
+    def load(date):
+        loaded.append((date, threading.current_thread() is main_thread))
+        if date == 4:
+            raise ValueError("no data")
+        return date * 10
+    
+    for n_ahead in [0, 2]:
+        del loaded[:]
+        res = list(BarPrefetcher(load, [1, 2, 3], n_ahead=n_ahead))
+        assert res == [(1, 10), (2, 20), (3, 30)]
+        assert all(in_main == (n_ahead == 0) for _, in_main in loaded)
+    
+    # next dates are loaded while the current one is processed
+    del loaded[:]
+    it = iter(BarPrefetcher(load, [1, 2, 3], n_ahead=1))
+    assert next(it) == (1, 10)
+    for _ in range(500):
+        if len(loaded) == 2:
+            break
+        time.sleep(0.01)
+    assert [date for date, _ in loaded] == [1, 2]
+    it.close()
+    
+    # errors of loading are raised when the date is reached
+    res = []
+    try:
+        for date, bars in BarPrefetcher(load, [3, 4, 5], n_ahead=1):
+            res.append(bars)
+    except ValueError:
+        res.append('error')
+    assert res == [30, 'error']
+
+
 def test_order_trade_task():
     from jaqs.data.basic import TradeStat, Trade, Task, TaskInd, Order, OrderStatusInd
     
@@ -1,8 +1,10 @@
 # encoding: utf-8
 
 from __future__ import print_function
+import numpy as np
+import pandas as pd
 from jaqs.data import RemoteDataService
-from jaqs.data import DataView
+from jaqs.data import DataView, EventDataView
 import jaqs.util as jutil
 
 from config_path import DATA_CONFIG_PATH
@@ -12,6 +14,263 @@ daily_path = '../output/tests/test_dataview_d'
 quarterly_path = '../output/tests/test_dataview_q'
 
 
+def _make_local_dataview(columnar=False, n_dates=60, n_symbols=8, seed=0):
+    """Build a DataView from random data, no data server needed."""
+    rng = np.random.RandomState(seed)
+    dates = pd.bdate_range('20170103', periods=n_dates)
+    dates = (dates.year * 10000 + dates.month * 100 + dates.day).values
+    symbols = ['{:06d}.SZ'.format(i + 1) for i in range(n_symbols)]
+    
+    dic = {'close': 10 + rng.rand(n_dates, n_symbols),
+           'open': 10 + rng.rand(n_dates, n_symbols),
+           'index_member': np.ones((n_dates, n_symbols)),
+           'sw1': np.array(['110000', '480000'] * (n_dates * n_symbols // 2), dtype=object).reshape(n_dates, -1)}
+    df = pd.concat({field: pd.DataFrame(index=dates, columns=symbols, data=arr) for field, arr in dic.items()},
+                   axis=1)
+    df.columns = df.columns.swaplevel()
+    df.columns.names = ['symbol', 'field']
+    df.index.name = 'trade_date'
+    df = df.sort_index(axis=1)
+    
+    dv = DataView(columnar=columnar)
+    dv.start_date, dv.end_date = dates[5], dates[-1]
+    dv.extended_start_date_d = dates[0]
+    dv.symbol = symbols
+    dv.fields = sorted(dic.keys())
+    dv.data_d = df
+    return dv
+
+
+def test_columnar_get():
+    dv = _make_local_dataview()
+    dv_col = _make_local_dataview(columnar=True)
+    date = dv.dates[10]
+    # daily data is only kept in the panel until data_d is accessed
+    assert dv_col._daily.is_empty
+    
+    pd.testing.assert_frame_equal(dv_col.get_ts('close'), dv.get_ts('close'))
+    pd.testing.assert_frame_equal(dv_col.get_ts('sw1', symbol='000002.SZ,000001.SZ', start_date=date),
+                                  dv.get_ts('sw1', symbol='000002.SZ,000001.SZ', start_date=date))
+    pd.testing.assert_frame_equal(dv_col.get(fields='open,close').sort_index(axis=1),
+                                  dv.get(fields='open,close').sort_index(axis=1))
+    pd.testing.assert_frame_equal(dv_col.get_snapshot(date, fields='close,open'),
+                                  dv.get_snapshot(date, fields='close,open'))
+    pd.testing.assert_frame_equal(dv_col.data_d, dv.data_d)
+
+
+def test_columnar_append_remove():
+    dv = _make_local_dataview()
+    dv_col = _make_local_dataview(columnar=True)
+    
+    for view in [dv, dv_col]:
+        df_spread = view.get_ts('close', start_date=view.extended_start_date_d) - \
+                    view.get_ts('open', start_date=view.extended_start_date_d)
+        view.append_df(df_spread, 'spread')
+        view.remove_field('open')
+    
+    assert 'spread' in dv_col.fields and 'open' not in dv_col.fields
+    pd.testing.assert_frame_equal(dv_col.get_ts('spread'), dv.get_ts('spread'))
+    pd.testing.assert_frame_equal(dv_col.data_d, dv.data_d)
+
+
+def test_append_many():
+    dv = _make_local_dataview()
+    df_close = dv.get_ts('close', start_date=dv.extended_start_date_d)
+    expected = dv.data_d.copy()
+
+    dic = {'close_{:d}'.format(i): df_close + i for i in range(5)}
+    dv.append_many(dic)
+    dv.remove_field('close_3,open')
+
+    # appended fields can be read before they are merged into data_d
+    pd.testing.assert_frame_equal(dv.get_ts('close_4'), (df_close + 4).loc[dv.start_date:])
+    # names of index and columns are the same as fields of data_d, whatever the appended frame has
+    dv.append_df(pd.DataFrame(df_close.values, index=df_close.index.values, columns=list(df_close.columns)), 'raw')
+    res = dv.get_ts('raw')
+    assert (res.index.name, res.columns.name) == ('trade_date', 'symbol')
+    dv.remove_field('raw')
+    assert 'close_3' not in dv.fields and 'open' not in dv.fields
+
+    for name in ['close_0', 'close_1', 'close_2', 'close_4']:
+        for sec in dv.symbol:
+            expected[(sec, name)] = dic[name][sec]
+    expected = expected.drop('open', axis=1, level='field').sort_index(axis=1)
+    pd.testing.assert_frame_equal(dv.data_d, expected)
+    pd.testing.assert_frame_equal(dv.get(fields='close_1,close'),
+                                  expected.loc[dv.start_date:, pd.IndexSlice[:, ['close_1', 'close']]])
+
+
+def test_add_formula_cache():
+    dv = _make_local_dataview()
+    dv_no_cache = _make_local_dataview()
+    dv_no_cache.expr_cache = None
+
+    formulas = {'rank_ret': 'Rank(Return(close, 5))',
+                'std_ret': 'Standardize(Return(close, 5))',
+                'spread': 'Ts_Mean(close - open, 3)'}
+    for view in [dv, dv_no_cache]:
+        for name, formula in formulas.items():
+            view.add_formula(name, formula, is_quarterly=False)
+
+    assert dv.expr_cache.hits == 1
+    for name in formulas:
+        pd.testing.assert_frame_equal(dv.get_ts(name), dv_no_cache.get_ts(name))
+
+    dv.remove_field('spread')
+    assert len(dv.expr_cache) == 0
+
+
+def test_add_formulas():
+    dv = _make_local_dataview()
+    dv_seq = _make_local_dataview()
+
+    for view in [dv, dv_seq]:
+        view.data_d.loc[:, ('000001.SZ', 'index_member')] = 0.0
+    formulas = {'score': 'Rank(spread) + Rank(ret)',
+                'spread': 'Ts_Mean(close - open, 3)',
+                'ret': 'Return(close, 5)',
+                'rank_close': 'Rank(close)',
+                'plain': 'close + 0'}
+    dv.add_formulas(formulas)
+    for name in ['spread', 'ret', 'score', 'rank_close', 'plain']:
+        dv_seq.add_formula(name, formulas[name], is_quarterly=False)
+
+    assert set(formulas.keys()) <= set(dv.custom_daily_fields)
+    pd.testing.assert_frame_equal(dv.data_d, dv_seq.data_d)
+
+    try:
+        dv.add_formulas({'a': 'b + 1', 'b': 'a * 2'})
+        assert False
+    except ValueError:
+        pass
+
+
+def test_add_formulas_parallel():
+    dv = _make_local_dataview()
+    dv_serial = _make_local_dataview()
+
+    formulas = {'ma_spread': 'Ts_Mean(close - open, 3) / Delay(close, 2)',
+                'ret': 'Return(close, 5)',
+                'rank_ret': 'Rank(ret)',
+                'std_ma': 'Standardize(ma_spread)'}
+    dv.add_formulas(formulas, n_jobs=2)
+    dv_serial.add_formulas(formulas)
+
+    pd.testing.assert_frame_equal(dv.data_d, dv_serial.data_d)
+
+
+def test_snapshot_index():
+    for columnar in [False, True]:
+        dv = _make_local_dataview(columnar=columnar)
+        date = dv.dates[5]
+
+        expected = dv.get(start_date=date, end_date=date).stack(level='symbol', dropna=False)
+        expected.index = expected.index.droplevel(level='trade_date')
+        res = dv.get_snapshot(date)
+        pd.testing.assert_frame_equal(res, expected.loc[:, res.columns], check_dtype=False, check_names=False)
+        assert res['close'].dtype == np.float64
+
+        res = dv.get_snapshot(date, symbol='000003.SZ,000001.SZ', fields='sw1,close')
+        assert list(res.index) == ['000003.SZ', '000001.SZ']
+        assert list(res.columns) == ['sw1', 'close']
+        assert dv.get_snapshot(20000101) is None
+
+        # snapshot follows changes of data
+        dv.append_df(dv.get_ts('close') * 2, 'close2')
+        res = dv.get_snapshot(date, fields='close,close2')
+        np.testing.assert_allclose(res['close2'].values, res['close'].values * 2)
+
+        snapshots = list(dv.iter_snapshots(start_date=dv.dates[3], end_date=dv.dates[6], fields='open'))
+        assert [d for d, _ in snapshots] == list(dv.dates[3:7])
+        pd.testing.assert_frame_equal(snapshots[2][1], dv.get_snapshot(date, fields='open'))
+
+    # snapshots are copies, modifying one does not change data
+    for columnar, large_memory in [(False, False), (False, True), (True, False)]:
+        dv = _make_local_dataview(columnar=columnar)
+        if large_memory:
+            dv.update_snapshot()
+        date = dv.dates[5]
+        close = dv.get_ts('close').loc[date].copy()
+        for fields in ['', 'close', 'close,sw1']:
+            snap = dv.get_snapshot(date, fields=fields)
+            snap.loc[:, 'close'] = -1.0
+            pd.testing.assert_series_equal(dv.get_ts('close').loc[date], close)
+            assert (dv.get_snapshot(date)['close'] > 0).all()
+        assert dv._snapshot is not None
+
+    # index is built at the first call, fields of different dtypes are read from data_d without copy
+    dv = _make_local_dataview()
+    assert dv._snapshot is None
+    dv.get_snapshot(dv.dates[5])
+    for field in ['close', 'sw1']:
+        block_no, _ = dv._snapshot._field_pos[field]
+        _, arr = dv._snapshot._blocks[block_no]
+        assert np.shares_memory(arr, dv.data_d[('000001.SZ', field)].values)
+
+
+class _FakeDataService(object):
+    """Return one row per symbol and trade date, fail the first query of every range in fail_ranges."""
+    def __init__(self, dates, fail_ranges=()):
+        self.dates = dates
+        self.fail_ranges = set(fail_ranges)
+        self.queries = []
+
+    def query_trade_dates(self, start_date, end_date):
+        return self.dates[(self.dates >= start_date) & (self.dates <= end_date)]
+
+    def connection_pool(self, size):
+        return [self] * size
+
+    def daily(self, symbol, start_date, end_date, fields=""):
+        self.queries.append((symbol, start_date, end_date))
+        if (start_date, end_date) in self.fail_ranges:
+            self.fail_ranges.remove((start_date, end_date))
+            return pd.DataFrame(), "-1,timeout"
+        dates = self.query_trade_dates(start_date, end_date)
+        symbols = symbol.split(',')
+        return pd.DataFrame({'symbol': np.repeat(symbols, len(dates)),
+                             'trade_date': np.tile(dates, len(symbols))}), "0,"
+
+
+def test_distributed_query():
+    dates = np.arange(20170101, 20170131)
+    symbols = ['{:06d}.SZ'.format(i) for i in range(5)]
+    ds = _FakeDataService(dates, fail_ranges=[(20170113, 20170118)])
+
+    dv = DataView()
+    dv.data_api = ds
+    dv.fetch_workers = 3
+    dv.fetch_retries = 1
+    progress = []
+    dv.progress_callback = lambda n_done, n_total: progress.append((n_done, n_total))
+
+    df, msg = dv.distributed_query('daily', ','.join(symbols), 20161225, 20170205, limit=30, fields='close')
+    assert msg == '0,'
+    assert len(df) == len(symbols) * len(dates)
+    assert df.drop_duplicates().shape == df.shape
+    # 5 symbols x 6 days per chunk, first and last chunk cover the whole queried range
+    assert len(progress) == 5 and progress[-1] == (5, 5)
+    assert len(ds.queries) == 6
+    assert sorted(q[1] for q in ds.queries)[0] == 20161225
+
+    # EventDataView queries the same way
+    edv = EventDataView()
+    edv.data_api = _FakeDataService(dates)
+    df_event, msg = edv.distributed_query('daily', ','.join(symbols), 20161225, 20170205, limit=30, fields='close')
+    assert msg == '0,'
+    pd.testing.assert_frame_equal(df_event, df)
+
+    # a chunk keeps failing
+    dv.fetch_retries = 0
+    ds.fail_ranges = {(20170113, 20170118)}
+    try:
+        dv.distributed_query('daily', ','.join(symbols), 20161225, 20170205, limit=30)
+    except Exception as e:
+        assert 'timeout' in str(e)
+    else:
+        assert False
+
+
 def test_write():
     ds = RemoteDataService()
     ds.init_from_config(data_config)
@@ -0,0 +1,128 @@
+# encoding: utf-8
+
+from __future__ import print_function
+import threading
+
+import numpy as np
+
+from jaqs.trade.event import BatchEventEngine, Histogram, Event, EVENT_TYPE
+
+
+def _quote_event(symbol, last):
+    e = Event(EVENT_TYPE.MARKET_DATA)
+    e.dic = {'quote': {'symbol': symbol, 'last': last}}
+    return e
+
+
+def _ind_event(type_, no):
+    e = Event(type_)
+    e.dic = {'ind': no}
+    return e
+
+
+def _run_engine(engine, events, n_expected):
+    """Put events before start, return (type, data) of processed events in order."""
+    res = []
+    done = threading.Event()
+
+    def handler(event):
+        res.append((event.type_, event.dic.get('quote', event.dic.get('ind'))))
+        if len(res) == n_expected:
+            done.set()
+
+    for type_ in [EVENT_TYPE.MARKET_DATA, EVENT_TYPE.TRADE_IND, EVENT_TYPE.TIMER]:
+        engine.register(type_, handler)
+    for e in events:
+        engine.put(e)
+    engine.start(timer=False)
+    assert done.wait(5)
+    engine.stop()
+    return res
+
+
+def test_histogram():
+    hist = Histogram([1, 2, 4])
+    for v in [0.5, 1, 1.5, 3, 10]:
+        hist.add(v)
+    assert hist.counts == [2, 1, 1, 1]
+    assert hist.count == 5 and hist.max == 10
+    np.testing.assert_allclose(hist.mean(), 16.0 / 5)
+    assert hist.percentile(40) == 1
+    assert hist.percentile(70) == 4
+    assert hist.percentile(100) == 10
+    assert list(hist.to_series().values) == [2, 1, 1, 1]
+
+
+def test_batch_engine_priority():
+    engine = BatchEventEngine(batch_size=2)
+    events = [_quote_event('A', i) for i in range(3)]
+    events += [Event(EVENT_TYPE.TIMER), _ind_event(EVENT_TYPE.TRADE_IND, 0), _ind_event(EVENT_TYPE.TRADE_IND, 1)]
+    res = _run_engine(engine, events, len(events))
+
+    assert [t for t, _ in res] == [EVENT_TYPE.TRADE_IND] * 2 + [EVENT_TYPE.TIMER] + [EVENT_TYPE.MARKET_DATA] * 3
+    assert [d['last'] for _, d in res[3:]] == [0, 1, 2]
+
+    stats = engine.get_stats()
+    assert (stats['n_events'], stats['n_batches'], stats['n_coalesced']) == (6, 4, 0)
+    # depth when each batch is taken: 6, 4 (after trades), 3 (after timer), 1
+    assert stats['queue_depth'].counts[:5] == [0, 1, 0, 2, 1]
+    df = engine.latency_summary()
+    assert df.loc['market_data', 'count'] == 3
+    assert set(df.index) == {'market_data', 'trade_ind', 'timer'}
+
+
+def test_batch_engine_coalesce():
+    engine = BatchEventEngine()
+    engine.set_coalesce(EVENT_TYPE.MARKET_DATA)
+    events = [_quote_event('A', 0), _quote_event('B', 0), _quote_event('A', 1),
+              _ind_event(EVENT_TYPE.TRADE_IND, 0), _quote_event('A', 2), _quote_event('B', 1)]
+    res = _run_engine(engine, events, 3)
+
+    assert res == [(EVENT_TYPE.TRADE_IND, 0),
+                   (EVENT_TYPE.MARKET_DATA, {'symbol': 'A', 'last': 2}),
+                   (EVENT_TYPE.MARKET_DATA, {'symbol': 'B', 'last': 1})]
+    assert engine.n_coalesced == 3
+    assert engine.queue_depth == 0
+
+
+def test_batch_engine_threads():
+    engine = BatchEventEngine(batch_size=16, record_stats=False)
+    engine.set_coalesce(EVENT_TYPE.MARKET_DATA)
+    latest = dict()
+    n_trades = [0]
+    done = threading.Event()
+
+    def on_quote(event):
+        quote = event.dic['quote']
+        # quotes of the same symbol are never processed out of order
+        assert quote['last'] > latest.get(quote['symbol'], -1)
+        latest[quote['symbol']] = quote['last']
+
+    def on_trade(event):
+        n_trades[0] += 1
+
+    engine.register(EVENT_TYPE.MARKET_DATA, on_quote)
+    engine.register(EVENT_TYPE.TRADE_IND, on_trade)
+    engine.register('done', lambda event: done.set())
+    engine.set_priority('done', 2)
+    engine.start(timer=False)
+
+    def produce(symbol):
+        for i in range(2000):
+            engine.put(_quote_event(symbol, i))
+            if i % 100 == 0:
+                engine.put(_ind_event(EVENT_TYPE.TRADE_IND, i))
+
+    producers = [threading.Thread(target=produce, args=(s,)) for s in 'ABC']
+    for t in producers:
+        t.start()
+    for t in producers:
+        t.join()
+    engine.put(Event('done'))
+    assert done.wait(5)
+    engine.stop()
+
+    assert latest == {'A': 1999, 'B': 1999, 'C': 1999}
+    assert n_trades[0] == 60
+    assert engine.n_events + engine.n_coalesced == 3 * 2000 + 60 + 1
+    assert len(engine.latency_summary()) == 0
@@ -0,0 +1,44 @@
+# encoding: UTF-8
+"""
+ExpressionCache on random data, no data server needed.
+"""
+
+from __future__ import print_function
+import numpy as np
+import pandas as pd
+
+from jaqs.data import Parser
+from jaqs.data.py_expression_eval import ExpressionCache
+
+
+def test_expression_cache():
+    rng = np.random.RandomState(0)
+    df_close = pd.DataFrame(10 + rng.rand(30, 6))
+    df_open = pd.DataFrame(10 + rng.rand(30, 6))
+    values = {'close': df_close, 'open': df_open}
+    
+    cache = ExpressionCache()
+    formulas = ['Rank(Return(close, 5)) + Standardize(Return(close, 5))',
+                'Ts_Mean(close - open, 3) * Ts_Mean(close - open, 3)',
+                'Mask(Return(close, 5), IsNan(open))',
+                'Standardize(Return(close, 5))']
+    for formula in formulas:
+        p = Parser()
+        p.parse(formula)
+        res_legacy = p.evaluate({k: v.copy() for k, v in values.items()})
+        p.parse(formula)
+        res_cache = p.evaluate({k: v.copy() for k, v in values.items()}, cache=cache)
+        pd.testing.assert_frame_equal(res_cache, res_legacy)
+    
+    # Return(close, 5) is computed once and shared by all formulas
+    assert cache.stats()['misses'] == 9
+    assert cache.stats()['hits'] == 4
+    
+    p = Parser()
+    p.parse('Ts_Mean(close - open, 3) * Ts_Mean(close - open, 3)')
+    root = p.compile()
+    assert root.children[0] is root.children[1]
+
+    small_cache = ExpressionCache(max_bytes=df_close.memory_usage().sum() * 2 + 1)
+    p.evaluate(values, cache=small_cache)
+    assert len(small_cache) == 2 and small_cache.evictions == 1
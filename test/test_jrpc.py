@@ -0,0 +1,173 @@
+# encoding: utf-8
+"""
+JRpcClient against a local fake server, no data server needed.
+"""
+
+from __future__ import print_function
+
+import time
+import threading
+import collections
+
+import zmq
+
+from jaqs.data.dataapi import jrpc_py
+from jaqs.data import DataApi
+
+
+class FakeServer(object):
+    """
+    ROUTER socket in a thread. Heartbeats are answered at once (unless answer_heartbeat is False),
+    other calls are answered by handler(method, params) after batch_size calls have arrived,
+    in reverse order. Messages given to notify are pushed to every client seen.
+
+    """
+    def __init__(self, handler, batch_size=1):
+        self.handler = handler
+        self.batch_size = batch_size
+        self.received = []
+        self.answer_heartbeat = True
+        self._clients = set()
+        self._outbox = collections.deque()
+        self._ctx = zmq.Context()
+        self._sock = self._ctx.socket(zmq.ROUTER)
+        self._sock.setsockopt(zmq.LINGER, 0)
+        port = self._sock.bind_to_random_port('tcp://127.0.0.1')
+        self.addr = 'tcp://127.0.0.1:{:d}'.format(port)
+        self._stop = False
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        pending = []
+        while not self._stop:
+            while self._outbox:
+                method, result = self._outbox.popleft()
+                for identity in self._clients:
+                    self._send(identity, {'jsonrpc': '2.0', 'method': method, 'result': result})
+            if not self._sock.poll(10):
+                continue
+            identity, data = self._sock.recv_multipart()
+            msg = jrpc_py._unpack_msgpack(data)
+            if msg['method'] == '.sys.heartbeat':
+                self._clients.add(identity)
+                if self.answer_heartbeat:
+                    self._reply(identity, msg['id'], msg['method'], msg['params'])
+                continue
+            self.received.append(msg['method'])
+            pending.append((identity, msg))
+            if len(pending) >= self.batch_size:
+                for identity_, msg_ in reversed(pending):
+                    self._reply(identity_, msg_['id'], msg_['method'],
+                                self.handler(msg_['method'], msg_['params']))
+                pending = []
+        self._sock.close()
+
+    def _reply(self, identity, callid, method, result):
+        self._send(identity, {'jsonrpc': '2.0', 'id': callid, 'method': method, 'result': result,
+                              'error': {'error': 0}})
+
+    def _send(self, identity, msg):
+        self._sock.send_multipart([identity, jrpc_py._pack_msgpack(msg)])
+
+    def notify(self, method, result):
+        self._outbox.append((method, result))
+
+    def close(self):
+        self._stop = True
+        self._thread.join()
+        self._ctx.term()
+
+
+def _echo(method, params):
+    return {'method': method, 'x': params['x']}
+
+
+def _connect(addr):
+    client = jrpc_py.JRpcClient()
+    client.connect(addr)
+    for i in range(50):
+        if client._connected:
+            break
+        time.sleep(0.1)
+    assert client._connected
+    return client
+
+
+def test_call():
+    server = FakeServer(_echo)
+    client = _connect(server.addr)
+    try:
+        cr = client.call('test.echo', {'x': 1})
+        assert cr['result'] == {'method': 'test.echo', 'x': 1}
+        assert cr['error'] == {'error': 0}
+        assert not client._waiter_map
+    finally:
+        client.close()
+        server.close()
+
+
+def test_pipelined_calls():
+    n = 30
+    server = FakeServer(_echo, batch_size=n)
+    client = _connect(server.addr)
+    try:
+        # the server answers only after all calls arrived, so they must be in flight at the same time
+        responses = client.call_many([('test.echo', {'x': i}) for i in range(n)], timeout=5)
+        assert [cr['result']['x'] for cr in responses] == list(range(n))
+
+        results = []
+        futures = [client.call_async('test.echo', {'x': i}, callback=results.append) for i in range(n)]
+        assert [f.result(timeout=5)['result']['x'] for f in futures] == list(range(n))
+        for i in range(50):
+            if len(results) == n:
+                break
+            time.sleep(0.1)
+        assert sorted(cr['result']['x'] for cr in results) == list(range(n))
+        assert not client._waiter_map
+
+        # no answer before batch_size calls arrived
+        cr = client.call('test.echo', {'x': 0}, timeout=0.3)
+        assert cr['error']['message'] == 'timeout'
+        assert not client._waiter_map
+    finally:
+        client.close()
+        server.close()
+
+
+def _data_handler(method, params):
+    if method == 'auth.login':
+        return {'username': params['username']}
+    elif method == 'jsd.query':
+        return {'symbol': [params['symbol']] * 2,
+                'trade_date': [params['begin_date'], params['end_date']],
+                'close': [1.0, 2.0]}
+    return {'view': [params['view']]}
+
+
+def test_data_api_call_many():
+    server = FakeServer(_data_handler)
+    api = DataApi(server.addr)
+    try:
+        r, msg = api.login('user', 'password')
+        assert r == {'username': 'user'}
+        res = api.call_many([('daily', {'symbol': '600030.SH', 'start_date': 20170103, 'end_date': 20170105}),
+                             ('daily', {'symbol': '000002.SZ', 'start_date': None, 'end_date': 20170105}),
+                             ('query', {'view': 'jz.instrumentInfo'})])
+        df, msg = res[0]
+        assert msg == '0,'
+        assert list(df['trade_date']) == [20170103, 20170105]
+        assert res[1] == (-1, "Begin date format error")
+        assert list(res[2][0]['view']) == ['jz.instrumentInfo']
+        assert server.received == ['auth.login', 'jsd.query', 'jset.query']
+    finally:
+        api.close()
+        server.close()
+
+
+if __name__ == "__main__":
+    test_call()
+    test_pipelined_calls()
+    test_data_api_call_many()
+    print("test passed")
@@ -5,6 +5,9 @@ from jaqs.trade import model
 import jaqs.util as jutil
 import random
 
+import numpy as np
+import pytest
+
 
 def test_context():
     r = random.random()
@@ -20,6 +23,68 @@ def test_context():
     assert context.storage['me'] == 1.0
 
 
+def test_portfolio_manager_columnar_ledger():
+    from jaqs.data.basic import Trade
+    from jaqs.trade import common, AlphaStrategy, AlphaTradeApi, PortfolioManager
+    
+    pm = PortfolioManager()
+    context = model.Context(strategy=AlphaStrategy(), trade_api=AlphaTradeApi(), pm=pm)
+    pm.init_from_config({'init_balance': 1e4, 'columnar_ledger': True})
+    
+    for i, (symbol, action, price, size) in enumerate([('A', common.ORDER_ACTION.BUY, 10.0, 300),
+                                                       ('B', common.ORDER_ACTION.BUY, 20.0, 100),
+                                                       ('A', common.ORDER_ACTION.SELL, 11.0, 300)]):
+        trade = Trade()
+        trade.symbol, trade.entrust_action, trade.entrust_no, trade.task_id = symbol, action, str(i), 101010
+        trade.set_fill_info(price, size, 20170104, 93000, str(i), trade_date=20170104)
+        pm._on_trade(trade)
+    
+    assert pm.holding_securities == {'B'}
+    assert not pm.positions
+    assert pm.get_pos('A') == 0 and pm.get_position('A') is None
+    assert pm.get_position('B').current_size == 100
+    assert pm.market_value({'B': 21.0}) == (2100.0, 0.0)
+    assert pm.market_value({'B': 21.0}, suspensions=['B']) == (0.0, 2100.0)
+    
+    assert len(pm.trades) == 3 and pm.trades[-1].fill_price == 11.0
+    df = pm.get_trades_df()
+    assert list(df['symbol']) == ['A', 'B', 'A']
+    assert list(df['fill_size']) == [300, 100, 300]
+    assert np.shares_memory(df['fill_price'].values, pm.trades.columns['fill_price'])
+
+
+def test_alpha_strategy_weights_order():
+    import pandas as pd
+    from jaqs.trade import AlphaStrategy, PortfolioManager
+    
+    strategy = AlphaStrategy(pc_method='market_value_weight')
+    context = model.Context(strategy=strategy, pm=PortfolioManager())
+    strategy.init_from_config({'single_symbol_weight_limit': 0.5})
+    context.universe = ['A', 'B', 'C', 'D']
+    context.snapshot = pd.DataFrame({'total_mv': [6.0, 2.0, np.nan, 2.0]}, index=['A', 'B', 'C', 'D'])
+    
+    strategy.portfolio_construction(['A', 'B', 'C'])
+    assert list(strategy.weights.index) == ['A', 'B', 'C', 'D']
+    assert np.allclose(strategy.weights.values, [0.5, 0.25, 0.0, 0.0])
+    
+    strategy.re_weight_suspension(['A'])
+    assert np.allclose(strategy.weights.values, [0.0, 1.0, 0.0, 0.0])
+    
+    goals, cash_left = strategy.generate_weights_order({'A': 0.5, 'B': 0.25, 'C': 0.25, 'D': 0.0}, 10000.0,
+                                                       {'A': 10.0, 'B': 9.0, 'C': 4.0}, suspensions=['C'])
+    assert goals == [{'symbol': 'A', 'size': 500}, {'symbol': 'B', 'size': 300},
+                     {'symbol': 'C', 'size': 0}, {'symbol': 'D', 'size': 0}]
+    assert abs(cash_left - (10000.0 - 500 * 10.0 - 300 * 9.0)) < 1e-8
+    
+    # NaN weight is not taken as zero, a NaN weight of a suspended symbol is ignored
+    for weights in [{'A': np.nan, 'B': 1.0}, {'A': 0.5, 'B': np.inf}]:
+        with pytest.raises(ValueError):
+            strategy.generate_weights_order(weights, 10000.0, {'A': 10.0, 'B': 9.0})
+    goals, _ = strategy.generate_weights_order({'A': np.nan, 'B': 1.0}, 10000.0, {'A': 10.0, 'B': 9.0},
+                                               suspensions=['A'])
+    assert goals[1] == {'symbol': 'B', 'size': 1100}
+
+
 if __name__ == "__main__":
     import time
     t_start = time.time()
@@ -120,6 +120,109 @@ def test_rank_percentile():
     #assert np.nanmean(val[res == 1].values.flatten()) < 0.11
 
 
+def _make_rolling_data(n_dates=120, n_symbols=10, seed=0):
+    rng = np.random.RandomState(seed)
+    arr = rng.rand(n_dates, n_symbols)
+    arr[rng.rand(n_dates, n_symbols) < 0.05] = np.nan
+    arr[:, 0] = np.round(arr[:, 0] * 3)  # many ties
+    return pd.DataFrame(arr)
+
+
+def test_rolling_rank():
+    df = _make_rolling_data()
+    
+    def rank_arr(arr):
+        return np.argsort(np.argsort(arr, kind='mergesort'), kind='mergesort')[-1] + 1.0
+    
+    for window in [1, 3, 10]:
+        expected = df.rolling(window).apply(rank_arr, raw=True)
+        res = jutil.rolling_rank(df.values, window)
+        np.testing.assert_array_equal(res, expected.values)
+    assert np.isnan(jutil.rolling_rank(df.values, 500)).all()
+
+
+def test_rolling_weighted_sum_product():
+    from jaqs.data import Parser
+    parser = Parser()
+    df = _make_rolling_data()
+    
+    for window in [1, 4, 9]:
+        expected = df.rolling(window).apply(parser.decay_linear_array, raw=True)
+        res = parser.decay_linear(df, window)
+        pd.testing.assert_frame_equal(res, expected)
+        
+        expected = df.rolling(window).apply(parser.decay_exp_array, args=(0.7,), raw=True)
+        res = parser.decay_exp(df, 0.7, window)
+        pd.testing.assert_frame_equal(res, expected)
+        
+        expected = df.rolling(window).apply(np.prod, raw=True)
+        res = jutil.rolling_product(df.values, window)
+        np.testing.assert_array_equal(res, expected.values)
+
+    ts = df.iloc[:, 1]
+    pd.testing.assert_series_equal(parser.ts_percentile(ts, 5),
+                                   pd.Series(jutil.rolling_rank(ts.values, 5) / 5, index=ts.index, name=ts.name))
+
+
+def _rank_with_mask_pandas(df, axis=1, mask=None, normalize=False, method='min'):
+    # the original pandas implementation of rank_with_mask
+    not_nan_mask = (~df.isnull())
+    if mask is None:
+        mask = not_nan_mask
+    else:
+        mask = np.logical_and(not_nan_mask, mask)
+    rank = df[mask].rank(axis=axis, na_option='keep', method=method)
+    if normalize:
+        dividend = rank.max(axis=axis)
+        dividend.loc[dividend > 1] = dividend.loc[dividend > 1] - 1
+        rank = rank.sub(1).div(dividend, axis=(1 - axis))
+    return rank
+
+
+def test_rank_with_mask_parity():
+    rng = np.random.RandomState(1)
+    df = pd.DataFrame(np.round(rng.rand(50, 40) * 10))
+    df[rng.rand(*df.shape) < 0.1] = np.nan
+    df.iloc[3, :] = np.nan
+    mask = pd.DataFrame(rng.rand(*df.shape) < 0.8)
+    
+    for method in ['min', 'max', 'average', 'dense']:
+        for axis in [0, 1]:
+            for normalize in [False, True]:
+                for m in [None, mask]:
+                    res = jutil.rank_with_mask(df, axis=axis, mask=m, normalize=normalize, method=method)
+                    expected = _rank_with_mask_pandas(df, axis=axis, mask=m, normalize=normalize, method=method)
+                    pd.testing.assert_frame_equal(res, expected.astype(float))
+
+
+def test_rank_quantile_with_groups():
+    rng = np.random.RandomState(2)
+    df = pd.DataFrame(np.round(rng.rand(30, 60) * 20))
+    df[rng.rand(*df.shape) < 0.1] = np.nan
+    group = pd.DataFrame(rng.choice(['110000', '480000', '610000'], size=df.shape).astype(object))
+    group[rng.rand(*df.shape) < 0.05] = np.nan
+    codes = jutil.encode_groups(group.values)
+    assert codes.min() == -1 and codes.max() == 2
+    
+    for normalize in [False, True]:
+        expected = None
+        for val in ['110000', '480000', '610000']:
+            rank = _rank_with_mask_pandas(df, mask=(group == val), normalize=normalize)
+            expected = rank if expected is None else expected.fillna(rank)
+        res = jutil.rank_with_groups(df.values, codes, normalize=normalize)
+        np.testing.assert_allclose(res, expected.values)
+    
+    # without ties, quantiles within groups are the same as quantilize each group separately
+    df = pd.DataFrame(rng.rand(*df.shape))
+    expected = np.full(df.shape, np.nan)
+    for val in ['110000', '480000', '610000']:
+        in_group = (group == val).values
+        arr = jutil.quantilize_without_nan(np.where(in_group, df.values, np.nan), n_quantiles=4, axis=1)
+        expected[in_group] = arr[in_group]
+    res = jutil.quantilize_with_groups(df.values, codes, n_quantiles=4)
+    np.testing.assert_array_equal(res, expected)
+
+
 def test_io():
     folder_relative = '../output/test/test_file_io'
     folder = jutil.join_relative_path(folder_relative)